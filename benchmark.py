@@ -0,0 +1,256 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Measures the throughput, persistence time and memory use of Horus
+
+Generates a configuration with a number of tasks, items and history data points,
+runs the agent of every task against the mock server of test/mock_server.py and
+writes the results to a JSON file, so that they can be compared between versions.
+The server runs in a process of its own, so that it doesn't take CPU time (or the
+GIL) away from the code being measured:
+
+    python benchmark.py --tasks 10 --items 1000 --history 100 --output results.json"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import collections
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from horus import load_config, save_config
+from main.agent import Agent
+from main.http_engine import HttpEngine
+from main.interfaces import Notifier
+
+class BenchmarkEngine(HttpEngine):
+    """Fetches prices from the benchmark server and records the fetch latencies"""
+
+    def __init__(self, latencies, pool_size):
+        super().__init__(pool_size=pool_size)
+        self.latencies = latencies
+
+    def fetch(self, server_url, item_id):
+        start = time.perf_counter()
+        data_point = super().fetch(server_url, item_id)
+        self.latencies.append(time.perf_counter() - start)
+
+        return data_point
+
+    def parse(self, response):
+        return int(response.text)
+
+    def compare(self, latest_data_point, history):
+        return len(history) > 0 and latest_data_point < history[-1]
+
+class CountingNotifier(Notifier):
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, item_id, latest_data_point):
+        self.count += 1
+
+    def alert(self):
+        pass
+
+def start_server(latency, jitter):
+    """Starts the mock server in a process of its own and waits until it is listening
+
+    latency (float) - the seconds the server waits before answering
+
+    jitter (float) - up to this many more seconds the server waits, at random
+
+    Returns the (process, server_url) pair"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "test", "mock_server.py")
+    process = subprocess.Popen([sys.executable, script, "0", "--latency", str(latency),
+                                "--jitter", str(jitter), "--seed", "0"],
+                               stdout=subprocess.PIPE, universal_newlines=True)
+
+    # the server prints "READY <port>" once it is listening
+    line = process.stdout.readline().split()
+
+    if len(line) != 2 or line[0] != "READY":
+        process.kill()
+        process.wait()
+        raise RuntimeError("The mock server failed to start")
+
+    return process, "127.0.0.1:" + line[1]
+
+def stop_server(process):
+    """Stops the mock server started by start_server"""
+    process.terminate()
+    process.wait()
+    process.stdout.close()
+
+def write_config(filename, server_url, tasks, items, history, workers):
+    """Writes a configuration file with synthetic tasks and histories"""
+    config = collections.OrderedDict()
+
+    for t in range(tasks):
+        task_items = collections.OrderedDict()
+
+        for i in range(items):
+            task_items["item" + str(i)] = [str(100 + (i + h) % 100) for h in range(history)]
+
+        config["TASK" + str(t)] = collections.OrderedDict([
+            ("server_url", server_url + "/task" + str(t)),
+            ("max_history_length", max(history, 1)),
+            ("workers", workers),
+            ("items", task_items)])
+
+    with open(filename, "w") as fp:
+        json.dump(config, fp)
+
+def percentile(values, fraction):
+    """Returns the nearest-rank percentile of a list of values"""
+    if len(values) == 0:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+def peak_rss():
+    """Returns the peak resident set size of the process in bytes, if known"""
+    if resource is None:
+        return None
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+def revision():
+    """Returns the git revision of the code being measured, if known"""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(tasks=10, items=100, history=10, workers=1, latency=0, jitter=0):
+    """Runs the benchmark once
+
+    tasks (int) - the number of tasks
+
+    items (int) - the number of items of every task
+
+    history (int) - the number of data points in the history of every item
+
+    workers (int) - the number of items every task fetches at the same time
+
+    latency (float) - the seconds the server waits before answering
+
+    jitter (float) - up to this many more seconds the server waits, at random
+
+    Returns a dictionary of results"""
+    server, server_url = start_server(latency, jitter)
+
+    directory = tempfile.mkdtemp()
+    config = os.path.join(directory, "config.json")
+    deserialize = lambda task, data_str: int(data_str)
+    serialize = lambda task, data_point: str(data_point)
+
+    try:
+        write_config(config, server_url, tasks, items, history, workers)
+
+        start = time.perf_counter()
+        data_stores = load_config(config, deserialize)
+        load_time = time.perf_counter() - start
+
+        latencies = []
+        notifications = 0
+
+        start = time.perf_counter()
+        for ds in data_stores:
+            engine = BenchmarkEngine(latencies, workers)
+            notifier = CountingNotifier()
+            try:
+                Agent(ds).execute(notifier, engine)
+            finally:
+                engine.close()
+            notifications += notifier.count
+        execute_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        save_config(data_stores, config, serialize)
+        save_time = time.perf_counter() - start
+
+        config_size = os.path.getsize(config)
+    finally:
+        shutil.rmtree(directory)
+        stop_server(server)
+
+    fetched = len(latencies)
+
+    return collections.OrderedDict([
+        ("items_fetched", fetched),
+        ("notifications", notifications),
+        ("items_per_second", fetched / execute_time if execute_time > 0 else None),
+        ("fetch_latency_p50", percentile(latencies, 0.5)),
+        ("fetch_latency_p99", percentile(latencies, 0.99)),
+        ("execute_time", execute_time),
+        ("load_config_time", load_time),
+        ("save_config_time", save_time),
+        ("config_size", config_size),
+        ("peak_rss", peak_rss())])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measures the performance of Horus")
+    parser.add_argument("--tasks", type=int, default=10, help="number of tasks (default: 10)")
+    parser.add_argument("--items", type=int, default=100,
+                        help="number of items of every task (default: 100)")
+    parser.add_argument("--history", type=int, default=10,
+                        help="number of history data points of every item (default: 10)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of items a task fetches at the same time (default: 1)")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="seconds the server waits before answering (default: 0)")
+    parser.add_argument("--jitter", type=float, default=0,
+                        help="up to this many more seconds the server waits (default: 0)")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="the JSON file the results are written to (default: benchmark.json)")
+    args = parser.parse_args(argv)
+
+    results = collections.OrderedDict([
+        ("revision", revision()),
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("time", time.strftime("%Y-%m-%dT%H:%M:%S%z")),
+        ("parameters", collections.OrderedDict([
+            ("tasks", args.tasks), ("items", args.items), ("history", args.history),
+            ("workers", args.workers), ("latency", args.latency),
+            ("jitter", args.jitter)])),
+        ("results", run(args.tasks, args.items, args.history, args.workers, args.latency,
+                        args.jitter))])
+
+    with open(args.output, "w") as fp:
+        json.dump(results, fp, indent=4)
+
+    print(json.dumps(results["results"], indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -16,11 +16,34 @@
 #     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
+import os
+import signal
+import stat
+import logging
+import argparse
+import tempfile
+import functools
+import contextlib
+import threading
 import collections
 
 from main.data_store import DataStore
+from main.history import RingBuffer
+from main.lazy_items import LazyItems
 from main.agent import Agent
-from main.interfaces import Engine, Notifier
+from main.scheduler import Scheduler
+from main.fetch_cache import FetchCache, cached
+from main.dispatch import Dispatcher
+from main.metrics import Metrics
+from main.circuit_breaker import CircuitBreaker
+from main.rate_limit import RateLimiter, limited
+from main.checkpoint import Checkpoint
+from main import config_reader, journal
+from main.interfaces import AsyncEngine, Engine, Notifier
+from main.registry import Registry
+
+# the plugins that tasks name in the configuration file (see main/registry.py)
+registry = Registry()
 
 ######################### CONFIGURE THE CODE BELOW #########################
 
@@ -35,7 +58,7 @@ def deserializer(task_id, data):
     Returns the data object type"""
     # if task_id == "YOUR_TASK":
     #     return YourType(data)
-    raise RuntimeError("Task name not recognized")
+    return registry.deserialize(task_id, data)
 
 
 def serializer(task_id, data):
@@ -47,7 +70,7 @@ def serializer(task_id, data):
     Returns the data object type"""
     # if task_id == "YOUR_TASK":
     #     return str(data)
-    raise RuntimeError("Task name not recognized")
+    return registry.serialize(task_id, data)
 
 def find_notifier(task_id):
     """Returns a Notifier object associated with the a task
@@ -58,8 +81,16 @@ def find_notifier(task_id):
     # if task_id == "YOUR_TASK":
     #     return YourNotifier()
     # else:
-    raise RuntimeError("Task name not recognized")
+    return registry.create(task_id, "notifier")
 
+def find_digest_notifier():
+    """Returns the Notifier that gets the alerts of every task in a single digest
+    when notifications are dispatched (see main/dispatch.py), or None to alert
+    with the notifier of each task
+
+    Returns a Notifier object or None"""
+    # return YourDigestNotifier()
+    return None
 
 def find_engine(task_id):
     """Returns an Engine object associated with the a task
@@ -70,11 +101,22 @@ def find_engine(task_id):
     # if task_id == "YOUR_TASK":
     #     return YourEngine()
     # else:
-    raise RuntimeError("Task name not recognized")
+    return registry.create(task_id, "engine")
 
 ######################### DO NOT CONFIGURE THE CODE BELOW #########################
 
-def load_config(config_filename, data_deserializer):
+def make_history(task_id, history_length, data_deserializer, serialized_history):
+    """Deserializes the history of an item into a ring buffer
+
+    Returns the history"""
+    history = [data_deserializer(task_id, k) for k in serialized_history]
+
+    if isinstance(history_length, int) and history_length > 0:
+        history = RingBuffer(history_length, history)
+
+    return history
+
+def load_config(config_filename, data_deserializer, journal_filename=None, lazy=False):
     """Loads the data store for each task
 
     config_filename (string) - the path to the configuration file
@@ -82,38 +124,91 @@ def load_config(config_filename, data_deserializer):
     data_deserializer (function(string, string)) - a function that
         deserializes data strings for each task
 
-    Returns a list of data stores"""
-    # desrialize json as ordered dictionaries (need in python version < 3.7j)
-    json_data = None
-    with open(config_filename, "r") as fp:
-        json_data = json.load(fp, object_pairs_hook = collections.OrderedDict)
-
-    stores = []
+    journal_filename (string) - the path to a journal of changes made since the
+        configuration file was saved, replayed over it if given
 
-    for task in json_data:
+    lazy (bool) - if True, the file is read in chunks and the history of an item is
+        only deserialized when it is first accessed (except for numeric tasks)
 
-        ds = DataStore(task)
+    Returns a list of data stores"""
+    stores = []
 
-        ds.keys = collections.OrderedDict()
-        ds.items = collections.OrderedDict()
+    if journal_filename is not None:
+        recover_compaction(config_filename, journal_filename)
 
-        col = json_data[task]
-        for key in col:
-            if key == "items":
-                item_pair = json_data[task][key]
-                for item in item_pair:
-                    ds.items[item] = [data_deserializer(task, k) \
-                                      for k in json_data[task][key][item]]
+    with open(config_filename, "r") as fp:
+        if lazy:
+            tasks = config_reader.iter_tasks(fp)
+        else:
+            # desrialize json as ordered dictionaries (need in python version < 3.7j)
+            tasks = json.load(fp, object_pairs_hook = collections.OrderedDict).items()
+
+        for task, col in tasks:
+
+            ds = DataStore(task)
+
+            ds.keys = collections.OrderedDict()
+
+            for key in col:
+                if key == "items":
+                    ds.serialized_items = col[key]
+                elif key == "states":
+                    ds.states = col[key]
+                else:
+                    ds.keys[key] = col[key]
+
+            registry.configure(task, ds.keys)
+
+            serialized_items = ds.serialized_items
+            if serialized_items is None:
+                serialized_items = collections.OrderedDict()
+
+            # keep the histories in ring buffers so that agents append in place
+            history_length = ds.keys.get("max_history_length")
+            load_history = functools.partial(make_history, task, history_length,
+                                             data_deserializer)
+
+            # the modules of the optional history tables are only loaded when used
+            if "history_file" in ds.keys:
+                from main.mapped_history import open_history_file
+
+                if "numeric_history" not in ds.keys:
+                    raise RuntimeError(task + ": Expected 'numeric_history' with a history file")
+
+                filename = os.path.join(os.path.dirname(os.path.abspath(config_filename)),
+                                        ds.keys["history_file"])
+                ds.items = open_history_file(filename, history_length,
+                                             ds.keys["numeric_history"],
+                                             serialized_items, load_history)
+                ds.serialized_items = None
+            elif "numeric_history" in ds.keys and isinstance(history_length, int) \
+                    and history_length > 0:
+                from main.numeric_history import NumericHistoryTable
+
+                ds.items = NumericHistoryTable(history_length, ds.keys["numeric_history"])
+                for item in serialized_items:
+                    ds.items[item] = load_history(serialized_items[item])
+            elif lazy:
+                ds.items = LazyItems(serialized_items, load_history)
             else:
-                ds.keys[key] = json_data[task][key]
+                ds.items = collections.OrderedDict()
+                for item in serialized_items:
+                    ds.items[item] = load_history(serialized_items[item])
 
-        stores.append(ds)
+            stores.append(ds)
+
+    if journal_filename is not None:
+        journal.replay(stores, journal_filename, data_deserializer)
 
     return stores
 
 def save_config(data_stores, config_filename, data_serializer):
     """Saves the data stores into a configuration file
 
+    Only the data points of modified data stores are serialized again; the others
+    are written as they were loaded or last saved. The file is replaced atomically,
+    so a crash while saving leaves the previous configuration intact.
+
     data_store (list(DataStore)) - The ordered list (by task) of data stores
 
     config_filename (string) - The path to where the  configuration should by saved
@@ -124,32 +219,514 @@ def save_config(data_stores, config_filename, data_serializer):
 
     for ds in data_stores:
 
-        serialized_items = collections.OrderedDict()
-        for i in ds.items:
-            serialized_items[i] = [data_serializer(ds.task_id, k) for k in ds.items[i]]
-
         task = collections.OrderedDict()
 
         for k in ds.keys:
             task[k] = ds.keys[k]
 
-        task["items"] = serialized_items
+        serialized_items = getattr(ds, "serialized_items", None)
+
+        if getattr(ds.items, "persistent", False):
+            # histories kept in their own file are saved by it, only the item ids
+            # are listed so that the configuration still decides the items
+            ds.items.flush()
+            task["items"] = collections.OrderedDict((i, []) for i in ds.items)
+        elif ds.modified or serialized_items is None:
+            # histories that were never deserialized are saved as they were loaded
+            get_serialized = getattr(ds.items, "get_serialized", lambda i: None)
+
+            serialized_items = collections.OrderedDict()
+            for i in ds.items:
+                serialized_items[i] = get_serialized(i)
+                if serialized_items[i] is None:
+                    serialized_items[i] = [data_serializer(ds.task_id, k) for k in ds.items[i]]
+
+            task["items"] = serialized_items
+        else:
+            task["items"] = serialized_items
+
+        states = ds.get_item_states()
+        if len(states) > 0:
+            task["states"] = states
 
         json_data[ds.task_id] = task
 
-    with open(config_filename, "w") as fp:
-        json.dump(json_data, fp, indent=4)
+    # write next to the configuration file, then move it over the old one
+    directory = os.path.dirname(os.path.abspath(config_filename))
+    fd, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fp:
+            json.dump(json_data, fp, indent=4)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        # the temporary file is only readable by its owner, keep the permissions
+        # of the file it replaces
+        if os.path.exists(config_filename):
+            os.chmod(temp_filename, stat.S_IMODE(os.stat(config_filename).st_mode))
+
+        os.replace(temp_filename, config_filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+    # the saved configuration includes every change made so far
+    for ds in data_stores:
+        ds.serialized_items = json_data[ds.task_id].get("items")
+        ds.modified = False
+        ds.pop_changes()
+
+def compact_config(data_stores, config_filename, journal_filename, data_serializer):
+    """Saves the data stores into the configuration file and empties the journal
+    of changes that was replayed over it
+
+    data_stores (list(DataStore)) - The ordered list (by task) of data stores
+
+    config_filename (string) - The path to where the configuration should by saved
+
+    journal_filename (string) - The path to the journal file
+
+    data_serializer (function(string, object)) - a function that serializes a tasks
+        data point
+
+    The journal is moved aside once the new configuration is written next to the
+    old one, and before it replaces it. From then on the compaction counts as done,
+    and recover_compaction() finishes it if the process dies before the end."""
+    if not os.path.exists(journal_filename):
+        save_config(data_stores, config_filename, data_serializer)
+        return
+
+    compacted_filename, retired_filename = compaction_filenames(config_filename,
+                                                                journal_filename)
+    save_config(data_stores, compacted_filename, data_serializer)
+    os.chmod(compacted_filename, stat.S_IMODE(os.stat(config_filename).st_mode))
+
+    os.replace(journal_filename, retired_filename)
+    os.replace(compacted_filename, config_filename)
+    os.remove(retired_filename)
+
+def compaction_filenames(config_filename, journal_filename):
+    """Returns the paths of the compacted configuration file waiting to replace the
+    configuration file, and of the journal it was compacted from"""
+    return config_filename + ".compacted", journal_filename + ".compacted"
+
+def recover_compaction(config_filename, journal_filename):
+    """Finishes or undoes a compaction that was interrupted, so that the journal is
+    never replayed over a configuration file that already holds its changes"""
+    compacted_filename, retired_filename = compaction_filenames(config_filename,
+                                                                journal_filename)
+
+    if os.path.exists(retired_filename):
+        # the compacted configuration was complete when the journal was moved aside
+        if os.path.exists(compacted_filename):
+            os.replace(compacted_filename, config_filename)
+        os.remove(retired_filename)
+    elif os.path.exists(compacted_filename):
+        # the journal is still in place, the compacted configuration may be partial
+        os.remove(compacted_filename)
+
+def save_changes(data_stores, config_filename, journal_filename, data_serializer):
+    """Appends the changes of the data stores to the journal, compacting it into the
+    configuration file once it grows larger than the configuration file itself
+
+    This keeps the time spent saving a run proportional to the number of changes,
+    while replaying the journal never costs more than loading the configuration."""
+    journal.append_changes(data_stores, journal_filename, data_serializer)
+
+    if os.path.getsize(journal_filename) > os.path.getsize(config_filename):
+        compact_config(data_stores, config_filename, journal_filename, data_serializer)
+    else:
+        # the changes are saved, but the configuration file no longer matches
+        for ds in data_stores:
+            if ds.modified:
+                ds.serialized_items = None
+                ds.modified = False
+
+def task_notifier(task_id, dispatcher=None):
+    """Returns the notifier of a task, queued on the dispatcher if one is given"""
+    if dispatcher is None:
+        return find_notifier(task_id)
+    elif dispatcher.digest is not None:
+        return dispatcher.notifier(task_id)
+    else:
+        return dispatcher.notifier(task_id, find_notifier(task_id))
+
+def execute_task(data_store, fetch_cache=None, dispatcher=None, metrics=None, breaker=None,
+                 limiter=None, checkpoint=None):
+    """Executes the agent of a single task
+
+    data_store (DataStore) - the data store of the task
+
+    fetch_cache (FetchCache) - if given, the engine fetches through this cache
+
+    dispatcher (Dispatcher) - if given, the notifications are delivered by this
+        dispatcher's worker thread
+
+    metrics (Metrics) - if given, records the timings and counts of the run
+
+    breaker (CircuitBreaker) - if given, skips the fetches from hosts that keep
+        failing
+
+    limiter (RateLimiter) - if given, paces the fetches of the engine instead of
+        its wait()
+
+    checkpoint (Checkpoint) - if given, records the items completed by the agent
+
+    Returns the updated data store"""
+    # worker processes that don't fork have a registry of their own
+    registry.configure(data_store.task_id, data_store.keys)
+
+    notifier = task_notifier(data_store.task_id, dispatcher)
+    engine = wrap_engine(find_engine(data_store.task_id), fetch_cache, limiter)
+
+    agent = Agent(data_store, metrics, breaker, checkpoint)
+    agent.execute(notifier, engine)
+
+    return data_store
+
+def execute_tasks(data_stores, use_asyncio=False, processes=None, fetch_cache=None,
+                  dispatcher=None, metrics=None, breaker=None, limiter=None,
+                  checkpoint=None):
+    """Executes the agent of every task
 
-def exec():
-    data_stores = load_config("config.json", deserializer)
+    data_stores (list(DataStore)) - the data stores of the tasks
+
+    use_asyncio (bool) - if True, all tasks run at the same time on a single event
+        loop; find_engine() may then return AsyncEngine objects as well
+
+    processes (int) - if given, the tasks are spread over a pool of that many
+        processes
+
+    fetch_cache (FetchCache) - if given, the tasks share the data points fetched
+        through this cache (see main/fetch_cache.py); AsyncEngine objects don't
+        use it
+
+    dispatcher (Dispatcher) - if given, the notifications of the tasks are
+        delivered by this dispatcher's worker thread (see main/dispatch.py)
+
+    metrics (Metrics) - if given, records the timings and counts of every task
+        (see main/metrics.py)
+
+    breaker (CircuitBreaker) - if given, the tasks skip the fetches from hosts that
+        keep failing (see main/circuit_breaker.py)
+
+    limiter (RateLimiter) - if given, the fetches to each host are paced by this
+        rate limiter instead of the engines' wait() (see main/rate_limit.py);
+        AsyncEngine objects don't use it
+
+    checkpoint (Checkpoint) - if given, the items completed by the tasks are
+        recorded in this checkpoint (see main/checkpoint.py)
+
+    Returns the updated data stores"""
+    if use_asyncio and processes:
+        raise RuntimeError("Tasks can either run on an event loop or in processes, not both")
+
+    if processes and fetch_cache is not None:
+        raise RuntimeError("Tasks running in processes can't share a fetch cache")
+
+    if processes and dispatcher is not None:
+        raise RuntimeError("Tasks running in processes can't share a dispatcher")
+
+    if processes and metrics is not None:
+        raise RuntimeError("Tasks running in processes can't share metrics")
+
+    if processes and breaker is not None:
+        raise RuntimeError("Tasks running in processes can't share a circuit breaker")
+
+    if processes and limiter is not None:
+        raise RuntimeError("Tasks running in processes can't share a rate limiter")
+
+    if processes and checkpoint is not None:
+        raise RuntimeError("Tasks running in processes can't share a checkpoint")
+
+    if processes and any(getattr(ds.items, "persistent", False) for ds in data_stores):
+        raise RuntimeError("Tasks with a history file can't run in processes")
+
+    # the modules of the asyncio mode are only loaded when used
+    if use_asyncio:
+        import asyncio
+        from main.async_agent import AsyncAgent, execute_all
+
+        agents = [AsyncAgent(ds, metrics, breaker, checkpoint) for ds in data_stores]
+        notifiers = [task_notifier(ds.task_id, dispatcher) for ds in data_stores]
+        engines = [wrap_engine(find_engine(ds.task_id), fetch_cache, limiter)
+                   for ds in data_stores]
+
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(execute_all(agents, notifiers, engines))
+        finally:
+            loop.close()
+    elif processes:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            data_stores = list(executor.map(execute_task, data_stores))
+    else:
+        for ds in data_stores:
+            execute_task(ds, fetch_cache, dispatcher, metrics, breaker, limiter, checkpoint)
+
+    return data_stores
+
+def exec(use_asyncio=False, processes=None, config_filename="config.json",
+         journal_filename=None, lazy=False, database_filename=None, fetch_cache_ttl=None,
+         dispatch=False, metrics_filename=None, max_failures=None, cool_off=300,
+         rate_limit=None, checkpoint_filename=None, checkpoint_interval=100):
+    """Executes every task and saves their updated data stores
+
+    use_asyncio (bool) - if True, all tasks run at the same time on a single event
+        loop; find_engine() may then return AsyncEngine objects as well
+
+    processes (int) - if given, the tasks are spread over a pool of that many
+        processes; the updated data stores are sent back to be saved together
+
+    config_filename (string) - the path to the configuration file
+
+    journal_filename (string) - if given, the changes of the run are appended to
+        this journal instead of rewriting the configuration file
+
+    lazy (bool) - if True, the configuration file is read in chunks and each item
+        history is only deserialized when its task gets to it
+
+    database_filename (string) - if given, the tasks are kept in this SQLite
+        database (see main/sqlite_data_store.py) instead of the configuration file
+
+    fetch_cache_ttl (float) - if given, tasks that fetch the same item from the same
+        server with the same engine share the data point for this many seconds
+
+    dispatch (bool) - if True, notifications are delivered on a background thread
+        while the next tasks run, to the digest notifier if find_digest_notifier()
+        returns one; the run ends once they are all delivered
+
+    metrics_filename (string) - if given, the timings and counts of the run are
+        written to this file, as JSON if its name ends with ".json" and in the
+        Prometheus text format otherwise
+
+    max_failures (int) - if given, fetches from a host are skipped for cool_off
+        seconds after this many consecutive failures
+
+    cool_off (float) - the number of seconds fetches from a failing host are skipped
+
+    rate_limit (float) - if given, the requests per second first sent to each host;
+        the rate then adapts to what the host tolerates, and replaces the engines'
+        wait()
+
+    checkpoint_filename (string) - if given, the completed items are written to
+        this file as the run goes; a run that dies before saving is resumed from it
+        by the next run, which skips the items already completed
+
+    checkpoint_interval (int) - the number of completed items after which the
+        checkpoint is written to disk"""
+    breaker = None if max_failures is None else CircuitBreaker(max_failures, cool_off)
+    limiter = None if rate_limit is None else RateLimiter(rate_limit, max_rate=max(100, rate_limit))
+    fetch_cache = None if fetch_cache_ttl is None else FetchCache(fetch_cache_ttl)
+    dispatcher = Dispatcher(digest=find_digest_notifier()) if dispatch else None
+    metrics = None if metrics_filename is None else Metrics()
+
+    try:
+        if database_filename is not None:
+            if processes:
+                raise RuntimeError("Tasks kept in a database can't run in processes")
+
+            if checkpoint_filename is not None:
+                raise RuntimeError("Tasks kept in a database are saved as they run, "
+                                   "they don't need a checkpoint")
+
+            from main import sqlite_data_store
+
+            connection = sqlite_data_store.connect(database_filename)
+            try:
+                with phase_timer(metrics, "load"):
+                    data_stores = sqlite_data_store.load_stores(connection, serializer,
+                                                                deserializer)
+
+                for ds in data_stores:
+                    registry.configure(ds.task_id, ds.keys)
+
+                # every history change is already written to the database
+                execute_tasks(data_stores, use_asyncio, fetch_cache=fetch_cache,
+                              dispatcher=dispatcher, metrics=metrics, breaker=breaker,
+                              limiter=limiter)
+            finally:
+                connection.close()
+            return
+
+        if processes and checkpoint_filename is not None:
+            raise RuntimeError("Tasks running in processes can't share a checkpoint")
+
+        with phase_timer(metrics, "load"):
+            data_stores = load_config(config_filename, deserializer, journal_filename, lazy)
+
+        if checkpoint_filename is None:
+            checkpoint = None
+        else:
+            checkpoint = Checkpoint(checkpoint_filename, serializer, checkpoint_interval,
+                                    [config_filename, journal_filename])
+            checkpoint.resume(data_stores, deserializer)
+
+        try:
+            data_stores = execute_tasks(data_stores, use_asyncio, processes, fetch_cache,
+                                        dispatcher, metrics, breaker, limiter, checkpoint)
+        finally:
+            # keep the completed items for the next run if this one fails
+            if checkpoint is not None:
+                checkpoint.close()
+
+        with phase_timer(metrics, "save"):
+            save_stores(data_stores, config_filename, journal_filename)
+
+        if checkpoint is not None:
+            checkpoint.finish()
+    finally:
+        # deliver the notifications that are still queued
+        if dispatcher is not None:
+            with phase_timer(metrics, "dispatch"):
+                dispatcher.close()
+
+        if metrics is not None:
+            metrics.write(metrics_filename)
+
+def wrap_engine(engine, fetch_cache=None, limiter=None):
+    """Returns an engine that paces its fetches with a rate limiter and shares them
+    through a fetch cache, if given; AsyncEngine objects are returned as they are"""
+    if isinstance(engine, AsyncEngine):
+        return engine
+
+    # cache hits don't take up the rate of the host
+    if limiter is not None:
+        engine = limited(engine, limiter)
+
+    if fetch_cache is not None:
+        engine = cached(engine, fetch_cache)
+
+    return engine
+
+def phase_timer(metrics, phase):
+    """Returns a context manager that times a phase of the run if metrics are kept"""
+    if metrics is None:
+        return contextlib.ExitStack()
+
+    return metrics.timer(phase, None)
+
+def save_stores(data_stores, config_filename, journal_filename=None):
+    """Saves the data stores if any of them changed, to the journal if one is given
+    or else to the configuration file"""
+    # nothing to save if no task changed
+    if not any(ds.modified for ds in data_stores):
+        return
+
+    if journal_filename is not None:
+        save_changes(data_stores, config_filename, journal_filename, serializer)
+    else:
+        save_config(data_stores, config_filename, serializer)
+
+def daemon(config_filename="config.json", journal_filename=None, lazy=False,
+           save_interval=60, default_interval=3600, stopped=None, dispatch=False,
+           max_failures=None, cool_off=300, rate_limit=None):
+    """Keeps the data stores in memory and executes each task on its own interval,
+    until the process is interrupted or terminated
+
+    The interval of a task is the number of seconds given by its "interval" key.
+    Each task keeps its engine between runs and gets a new notifier for every run.
+    The data stores are saved every save_interval seconds and on shutdown.
+
+    config_filename (string) - the path to the configuration file
+
+    journal_filename (string) - if given, changes are appended to this journal
+        instead of rewriting the configuration file
+
+    lazy (bool) - if True, item histories are deserialized when first used
+
+    save_interval (float) - the number of seconds between two saves
+
+    default_interval (float) - the interval of tasks that don't set one
+
+    stopped (threading.Event) - an event that stops the daemon when set; SIGINT
+        and SIGTERM set it when the daemon runs in the main thread
+
+    dispatch (bool) - if True, notifications are delivered on a background thread;
+        there is no digest since the daemon has no runs to gather
+
+    max_failures (int) - if given, fetches from a host are skipped for cool_off
+        seconds after this many consecutive failures, by every task
+
+    cool_off (float) - the number of seconds fetches from a failing host are skipped
+
+    rate_limit (float) - if given, the requests per second first sent to each host,
+        adapting to what the host tolerates instead of the engines' wait()"""
+    data_stores = load_config(config_filename, deserializer, journal_filename, lazy)
+
+    if stopped is None:
+        stopped = threading.Event()
+
+    dispatcher = Dispatcher() if dispatch else None
+    breaker = None if max_failures is None else CircuitBreaker(max_failures, cool_off)
+    limiter = None if rate_limit is None else RateLimiter(rate_limit, max_rate=max(100, rate_limit))
+
+    def run_task(ds, engine):
+        try:
+            Agent(ds, breaker=breaker).execute(task_notifier(ds.task_id, dispatcher), engine)
+        except Exception:
+            logging.getLogger("horus").exception(ds.task_id + ": Task run failed")
+
+    scheduler = Scheduler()
 
     for ds in data_stores:
-        notifier = find_notifier(ds.task_id)
-        engine = find_engine(ds.task_id)
-        agent = Agent(ds)
-        agent.execute(notifier, engine)
+        interval = Agent(ds).get_option("interval", default_interval)
+        engine = wrap_engine(find_engine(ds.task_id), None, limiter)
+        scheduler.add(interval, functools.partial(run_task, ds, engine))
+
+    scheduler.add(save_interval, lambda: save_stores(data_stores, config_filename,
+                                                     journal_filename), save_interval)
+
+    handlers = {}
+    if threading.current_thread() is threading.main_thread():
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            handlers[signum] = signal.signal(signum, lambda signum, frame: stopped.set())
+
+    try:
+        scheduler.run(stopped)
+    finally:
+        for signum in handlers:
+            signal.signal(signum, handlers[signum])
+
+        if dispatcher is not None:
+            dispatcher.close()
 
-    save_config(data_stores, "config.json", serializer)
+        save_stores(data_stores, config_filename, journal_filename)
 
 if __name__ == "__main__":
-    exec()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Monitors data on the web and notifies of changes")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and execute each task on its own interval")
+    parser.add_argument("--save-interval", type=float, default=60,
+                        help="seconds between two saves in daemon mode (default: 60)")
+    parser.add_argument("--fetch-cache-ttl", type=float,
+                        help="seconds during which tasks share the data points they fetch")
+    parser.add_argument("--dispatch", action="store_true",
+                        help="deliver notifications on a background thread")
+    parser.add_argument("--metrics", metavar="FILENAME",
+                        help="write the timings and counts of the run to this file "
+                             "(JSON if it ends with .json, Prometheus text otherwise)")
+    parser.add_argument("--max-failures", type=int,
+                        help="skip fetches from a host after this many consecutive failures")
+    parser.add_argument("--cool-off", type=float, default=300,
+                        help="seconds fetches from a failing host are skipped (default: 300)")
+    parser.add_argument("--rate-limit", type=float,
+                        help="requests per second first sent to each host, adapting to "
+                             "what the host tolerates")
+    parser.add_argument("--checkpoint", metavar="FILENAME",
+                        help="record completed items in this file, so a run that dies "
+                             "is resumed by the next one")
+    args = parser.parse_args()
+
+    if args.daemon:
+        logging.basicConfig()
+        daemon(save_interval=args.save_interval, dispatch=args.dispatch,
+               max_failures=args.max_failures, cool_off=args.cool_off,
+               rate_limit=args.rate_limit)
+    else:
+        exec(fetch_cache_ttl=args.fetch_cache_ttl, dispatch=args.dispatch,
+             metrics_filename=args.metrics, max_failures=args.max_failures,
+             cool_off=args.cool_off, rate_limit=args.rate_limit,
+             checkpoint_filename=args.checkpoint)
\ No newline at end of file
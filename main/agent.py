@@ -15,13 +15,53 @@
 #     You should have received a copy of the GNU General Public License
 #     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
 
+import time
+import logging
+import itertools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from main.interfaces import NOT_MODIFIED, implements
+from main.polling import AdaptivePolling
+from main.metrics import InstrumentedNotifier, instrumented
+from main.pipeline import Pipeline
+
 class Agent():
     """The software agent that fetches and processes price history"""
 
-    def __init__(self, data_store):
+    def __init__(self, data_store, metrics=None, breaker=None, checkpoint=None):
+        """data_store (DataStore) - the data store of the task
+
+        metrics (Metrics) - if given, records the timings and counts of the runs
+
+        breaker (CircuitBreaker) - if given, skips the fetches from hosts that keep
+            failing
+
+        checkpoint (Checkpoint) - if given, records every completed item and skips
+            the items an interrupted run already completed"""
         self.data_store = data_store
+        self.metrics = metrics
+        self.breaker = breaker
+        self.checkpoint = checkpoint
+        self.polling = None
+        self.fetch_timeout = None
+        self.deadline = None
 
-    def execute(self, notifier, engine):
+    def get_option(self, key, default):
+        """Returns an optional configuration value of the task
+
+        key (string) - the configuration key, as given in the configuration file
+
+        default (object) - the value to use when the task does not set the key"""
+        try:
+            return self.data_store.get_config_value(key)
+        except KeyError:
+            return default
+
+    def read_config(self):
+        """Reads and checks the configuration values the agent needs
+
+        Returns a (server_address, history_length, workers, batch_size) tuple"""
         # get the target server
         server_address = self.data_store.get_config_value("server_url")
 
@@ -31,30 +71,328 @@ class Agent():
         if history_length <= 0:
             raise RuntimeError(self.data_store.task_id + ": Expected history length to be positive")
 
-        # get the list of items
+        # get the number of items fetched at the same time
+        workers = self.get_option("workers", 1)
+
+        if workers <= 0:
+            raise RuntimeError(self.data_store.task_id + ": Expected worker count to be positive")
+
+        # get the number of items fetched at once by engines that implement fetch_many
+        batch_size = self.get_option("batch_size", 100)
+
+        if batch_size <= 0:
+            raise RuntimeError(self.data_store.task_id + ": Expected batch size to be positive")
+
+        # poll stable items less often, if the task asks for it
+        max_poll_interval = self.get_option("max_poll_interval", None)
+
+        if max_poll_interval is not None:
+            self.polling = AdaptivePolling(max_poll_interval)
+
+        # get the number of seconds a single fetch may take
+        self.fetch_timeout = self.get_option("fetch_timeout", None)
+
+        if self.fetch_timeout is not None and self.fetch_timeout <= 0:
+            raise RuntimeError(self.data_store.task_id + ": Expected fetch timeout to be positive")
+
+        # get the number of seconds after which no more items are fetched
+        deadline = self.get_option("deadline", None)
+
+        if deadline is not None and deadline <= 0:
+            raise RuntimeError(self.data_store.task_id + ": Expected deadline to be positive")
+
+        self.deadline = None if deadline is None else time.monotonic() + deadline
+
+        return server_address, history_length, workers, batch_size
+
+    def select_items(self):
+        """Returns the identifiers of the items to fetch on this run
+
+        With adaptive polling, the items that aren't due are skipped and their
+        count of runs to skip goes down. Items completed by an interrupted run are
+        skipped as well."""
         items = self.data_store.get_item_ids()
 
-        # for every item
-        for i in range(len(items)):
+        if self.checkpoint is not None:
+            task_id = self.data_store.task_id
+            items = [item for item in items if not self.checkpoint.is_done(task_id, item)]
 
-            item = items[i]
+        if self.polling is None:
+            return items
 
-            history = self.data_store.get_item_history(item)
+        states = self.data_store.get_item_states()
+        due = []
 
-            # fetch the latest price
-            latest = engine.fetch(server_address, item)
+        for item in items:
+            state = dict(states.get(item, {}))
 
-            # if the latest price is a drop, add it to the notifier
-            if engine.compare(latest, history):
+            if self.polling.is_due(state):
+                due.append(item)
+            else:
+                self.data_store.set_item_state(item, state)
+
+        return due
+
+    def resume_notifications(self, notifier):
+        """Adds the data points an interrupted run was to notify to the notifier"""
+        if self.checkpoint is not None:
+            for item, latest in self.checkpoint.resumed_notifications(self.data_store.task_id):
                 notifier.add(item, latest)
 
-            # append the latest price to the history
-            new_history = history + [latest]
+    def alert(self, notifier):
+        """Notifies the user of the items added to the notifier"""
+        notifier.alert()
 
-            self.data_store.set_item_history(item, new_history[-history_length:])
+        if self.checkpoint is not None:
+            self.checkpoint.alerted(self.data_store.task_id)
 
-            if i < len(items) - 1:
-                engine.wait()
+    def execute(self, notifier, engine):
+        if self.metrics is None:
+            return self.run(notifier, engine)
+
+        task_id = self.data_store.task_id
+
+        with self.metrics.timer("execute", task_id):
+            self.run(InstrumentedNotifier(notifier, self.metrics, task_id),
+                     instrumented(engine, self.metrics, task_id))
+
+    def run(self, notifier, engine):
+        """Fetches the latest data points of the task's items, records them and
+        notifies the user"""
+        server_address, history_length, workers, batch_size = self.read_config()
+
+        engine.use_states(self.data_store.get_item_states())
+
+        if self.fetch_timeout is not None:
+            # fetches run on plain threads, which can't be cancelled
+            if not implements(engine, "use_timeout"):
+                raise RuntimeError(self.data_store.task_id + ": Engine can't enforce the fetch timeout")
+
+            engine.use_timeout(self.fetch_timeout)
+
+        self.resume_notifications(notifier)
+
+        # get the list of items, grouped by the requests that fetch them
+        items = self.select_items()
+        batches = self.split(engine, items, batch_size)
+
+        if self.get_option("pipeline", False):
+            self.pipeline(notifier, engine, workers).run(server_address, batches, history_length)
+            self.alert(notifier)
+            return
+
+        if workers == 1:
+            results = self.fetch_serial(engine, server_address, batches)
+        else:
+            results = self.fetch_concurrent(engine, server_address, batches, workers)
+
+        # for every item, in the order of the configuration
+        for item, latest in results:
+            self.record(notifier, engine, item, latest, history_length)
 
         # notify the user
-        notifier.alert()
\ No newline at end of file
+        self.alert(notifier)
+
+    def pipeline(self, notifier, engine, workers):
+        """Returns the pipeline that runs the items of the task through separate
+        fetch, parse, compare, record and notify stages"""
+        # get the number of threads of the parse and compare stages
+        parse_workers = self.get_option("parse_workers", 1)
+
+        if parse_workers <= 0:
+            raise RuntimeError(self.data_store.task_id + ": Expected parse worker count to be positive")
+
+        compare_workers = self.get_option("compare_workers", 1)
+
+        if compare_workers <= 0:
+            raise RuntimeError(self.data_store.task_id + ": Expected compare worker count to be positive")
+
+        # get the number of items that may be between the fetch and record stages
+        queue_size = self.get_option("queue_size", 100)
+
+        if queue_size <= 0:
+            raise RuntimeError(self.data_store.task_id + ": Expected queue size to be positive")
+
+        return Pipeline(self, notifier, engine, workers, parse_workers, compare_workers,
+                        queue_size)
+
+    def split(self, engine, items, batch_size):
+        """Groups items into batches that are fetched with a single request
+
+        Engines that don't implement fetch_many get a batch for every item.
+
+        Returns a list of lists of item ids"""
+        if not implements(engine, "fetch_many"):
+            batch_size = 1
+
+        return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+    def check_batch(self, batch, data_points):
+        """Checks that fetch_many returned a data point for each item of a batch
+
+        Returns the data points"""
+        if len(data_points) != len(batch):
+            raise RuntimeError(self.data_store.task_id + ": Expected " + str(len(batch)) +
+                               " data points from fetch_many, got " + str(len(data_points)))
+
+        return data_points
+
+    def count(self, event, n=1):
+        """Counts an event of the task if metrics are kept"""
+        if self.metrics is not None:
+            self.metrics.count(event, self.data_store.task_id, n)
+
+    def can_fetch(self, server_address, batch):
+        """Tells if a batch may be fetched, which it may not once the deadline of the
+        task has passed or while the circuit breaker of its server is open"""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.count("skipped", len(batch))
+            return False
+
+        if self.breaker is not None and not self.breaker.allow(server_address):
+            self.count("skipped", len(batch))
+            return False
+
+        return True
+
+    def fetch_failed(self, server_address, batch):
+        """Logs the failure of a fetch; the items of the batch keep their history"""
+        logging.getLogger("horus").warning(
+            self.data_store.task_id + ": Failed to fetch " + ", ".join(str(i) for i in batch),
+            exc_info=True)
+        self.count("failed", len(batch))
+
+        if self.breaker is not None:
+            self.breaker.failed(server_address)
+
+    def fetch_succeeded(self, server_address):
+        if self.breaker is not None:
+            self.breaker.succeeded(server_address)
+
+    def fetch_batch(self, engine, server_address, batch):
+        """Fetches the latest data points of a batch of items
+
+        Returns a list of data points in the order of the batch, or None if the
+        fetch failed"""
+        try:
+            if implements(engine, "fetch_many"):
+                data_points = list(engine.fetch_many(server_address, batch))
+            else:
+                data_points = [engine.fetch(server_address, item) for item in batch]
+        except Exception:
+            self.fetch_failed(server_address, batch)
+            return None
+
+        self.fetch_succeeded(server_address)
+
+        return self.check_batch(batch, data_points)
+
+    def record(self, notifier, engine, item, latest, history_length):
+        """Compares the latest data point of an item to its history and appends it"""
+        latest = self.resolve(item, latest)
+
+        # if the latest price is a drop, add it to the notifier
+        alert = engine.compare(latest, self.data_store.get_item_history(item))
+
+        if alert:
+            notifier.add(item, latest)
+
+        self.store(item, latest, history_length, alert)
+
+    def resolve(self, item, latest, history=None):
+        """Returns the latest data point of an item, which is its last one when the
+        server says the item did not change since the last fetch
+
+        history (list) - the history of the item, if it was already read"""
+        if latest is NOT_MODIFIED:
+            if history is None:
+                history = self.data_store.get_item_history(item)
+
+            if len(history) == 0:
+                raise RuntimeError(self.data_store.task_id + ": Item '" + item +
+                                   "' was not modified but has no history")
+            latest = history[-1]
+
+        return latest
+
+    def store(self, item, latest, history_length, alert=False):
+        """Appends the latest data point of an item to its history
+
+        alert (bool) - whether the data point was added to the notifier"""
+        # the state is updated first, so that stores that write the history right
+        # away save it along with the appended data point
+        if self.polling is not None:
+            states = self.data_store.get_item_states()
+            state = states.get(item, {})
+
+            # the history as it will be once the latest data point is appended,
+            # without copying it
+            history = self.data_store.get_item_history(item)
+            dropped = max(0, len(history) + 1 - history_length)
+            self.polling.polled(state, itertools.islice(itertools.chain(history, [latest]),
+                                                        dropped, None))
+
+            if len(state) > 0:
+                states[item] = state
+            else:
+                states.pop(item, None)
+
+        self.data_store.append_item_history(item, latest, history_length)
+
+        if self.checkpoint is not None:
+            self.checkpoint.record(self.data_store, item, latest, alert)
+
+    def fetch_serial(self, engine, server_address, batches):
+        """Fetches the latest data points of every batch one after the other
+
+        Items that are skipped or fail to be fetched are left out.
+
+        Yields (item_id, latest_data_point) pairs in the order of the items"""
+        for i in range(len(batches)):
+            if not self.can_fetch(server_address, batches[i]):
+                continue
+
+            # fetch the latest prices
+            data_points = self.fetch_batch(engine, server_address, batches[i])
+
+            if data_points is not None:
+                for pair in zip(batches[i], data_points):
+                    yield pair
+
+            if i < len(batches) - 1:
+                engine.wait()
+
+    def fetch_concurrent(self, engine, server_address, batches, workers):
+        """Fetches the latest data points of the batches using a pool of worker threads
+
+        Each worker waits after its own fetches, so the engine still throttles
+        the requests of every worker. Items that are skipped or fail to be fetched
+        are left out.
+
+        Yields (item_id, latest_data_point) pairs in the order of the items"""
+
+        def fetch(i):
+            if not self.can_fetch(server_address, batches[i]):
+                return None
+
+            data_points = self.fetch_batch(engine, server_address, batches[i])
+
+            if i < len(batches) - 1:
+                engine.wait()
+
+            return data_points
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(fetch, i) for i in range(len(batches))]
+
+            try:
+                for batch, future in zip(batches, futures):
+                    data_points = future.result()
+
+                    if data_points is not None:
+                        for pair in zip(batch, data_points):
+                            yield pair
+            finally:
+                # don't start fetches nobody will look at anymore
+                for future in futures:
+                    future.cancel()
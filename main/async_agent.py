@@ -0,0 +1,147 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+
+from main.agent import Agent
+from main.interfaces import AsyncEngine, implements
+from main.metrics import InstrumentedNotifier, instrumented
+
+class EngineAdapter(AsyncEngine):
+    """Runs a synchronous Engine on an event loop
+
+    The blocking fetch() and wait() calls are handed to an executor (the loop's
+    default thread pool unless one is given), so they don't block the loop."""
+
+    wraps_engine = True
+
+    def __init__(self, engine, executor=None):
+        self.engine = engine
+        self.executor = executor
+
+    async def fetch(self, server_url, item_id):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self.engine.fetch,
+                                          server_url, item_id)
+
+    async def fetch_many(self, server_url, item_ids):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, self.engine.fetch_many,
+                                          server_url, item_ids)
+
+    def compare(self, latest_data_point, history):
+        return self.engine.compare(latest_data_point, history)
+
+    def use_states(self, states):
+        self.engine.use_states(states)
+
+    def use_timeout(self, timeout):
+        self.engine.use_timeout(timeout)
+
+    async def wait(self):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(self.executor, self.engine.wait)
+
+class AsyncAgent(Agent):
+    """The software agent that fetches and processes price history on an event loop"""
+
+    async def execute(self, notifier, engine):
+        if self.metrics is None:
+            return await self.run(notifier, engine)
+
+        task_id = self.data_store.task_id
+
+        with self.metrics.timer("execute", task_id):
+            await self.run(InstrumentedNotifier(notifier, self.metrics, task_id),
+                           instrumented(engine, self.metrics, task_id))
+
+    async def run(self, notifier, engine):
+        server_address, history_length, workers, batch_size = self.read_config()
+
+        self.resume_notifications(notifier)
+
+        # get the list of items, grouped by the requests that fetch them
+        items = self.select_items()
+        batches = self.split(engine, items, batch_size)
+        batched = implements(engine, "fetch_many")
+
+        if not isinstance(engine, AsyncEngine):
+            engine = EngineAdapter(engine)
+
+        engine.use_states(self.data_store.get_item_states())
+
+        if self.fetch_timeout is not None:
+            engine.use_timeout(self.fetch_timeout)
+
+        # at most 'workers' batches of the task are fetched at the same time
+        semaphore = asyncio.Semaphore(workers)
+
+        async def fetch(i):
+            async with semaphore:
+                if not self.can_fetch(server_address, batches[i]):
+                    return None
+
+                try:
+                    if batched:
+                        data_points = list(await asyncio.wait_for(
+                            engine.fetch_many(server_address, batches[i]), self.fetch_timeout))
+                    else:
+                        # an await in a comprehension needs Python 3.6
+                        data_points = []
+                        for item in batches[i]:
+                            data_points.append(await asyncio.wait_for(
+                                engine.fetch(server_address, item), self.fetch_timeout))
+                except Exception:
+                    self.fetch_failed(server_address, batches[i])
+                    data_points = None
+                else:
+                    self.fetch_succeeded(server_address)
+                    self.check_batch(batches[i], data_points)
+
+                if i < len(batches) - 1:
+                    await engine.wait()
+
+                return data_points
+
+        fetches = [asyncio.ensure_future(fetch(i)) for i in range(len(batches))]
+
+        try:
+            results = await asyncio.gather(*fetches)
+        finally:
+            # don't leave fetches running after a failure
+            for f in fetches:
+                f.cancel()
+
+        # for every item, in the order of the configuration
+        # items that were skipped or failed to be fetched keep their history
+        for batch, data_points in zip(batches, results):
+            if data_points is not None:
+                for item, latest in zip(batch, data_points):
+                    self.record(notifier, engine, item, latest, history_length)
+
+        # notify the user
+        self.alert(notifier)
+
+async def execute_all(agents, notifiers, engines):
+    """Executes several agents concurrently on the current event loop
+
+    agents (list(AsyncAgent)) - the agents to execute
+
+    notifiers (list(Notifier)) - the notifier of each agent
+
+    engines (list(Engine or AsyncEngine)) - the engine of each agent"""
+    await asyncio.gather(*[a.execute(n, e) for a, n, e in zip(agents, notifiers, engines)])
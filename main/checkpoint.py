@@ -0,0 +1,257 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The progress checkpoint of a run
+
+While the tasks run, every item whose latest data point is recorded is appended
+to a checkpoint file, one JSON record per line. If the run dies before the data
+stores are saved, the next run replays the checkpoint over the loaded stores and
+skips the items it already completed. The items of the tasks that didn't get to
+alert their notifier are notified by the next run instead. The checkpoint is
+removed once the stores are saved.
+
+The first line of the checkpoint records the inode, size and modification time of
+the files the stores were loaded from, so a checkpoint left behind by a run that did
+save its stores (and crashed just before removing the checkpoint) isn't applied
+twice."""
+
+import collections
+import json
+import os
+import threading
+
+from main.journal import drop_incomplete_line
+
+def fingerprint(filenames):
+    """Returns the [filename, inode, size, modification time] of each of the files
+    that exist, which changes whenever one of them is saved"""
+    result = []
+
+    for filename in filenames:
+        if filename is not None and os.path.exists(filename):
+            stat = os.stat(filename)
+            result.append([filename, stat.st_ino, stat.st_size, stat.st_mtime_ns])
+
+    return result
+
+class Checkpoint():
+    """The journal of the items completed by a run, written as they complete"""
+
+    def __init__(self, filename, data_serializer, interval=100, sources=()):
+        """filename (string) - the path to the checkpoint file
+
+        data_serializer (function(string, object)) - a function that serializes a
+            tasks data point
+
+        interval (int) - the number of completed items after which the checkpoint is
+            written to disk; at most that many items are fetched again after a crash
+
+        sources (list(string)) - the files the data stores are loaded from"""
+        if interval <= 0:
+            raise RuntimeError("Expected checkpoint interval to be positive")
+
+        self.filename = filename
+        self.data_serializer = data_serializer
+        self.interval = interval
+        self.fingerprint = fingerprint(sources)
+
+        # task_id -> set of the item ids completed by the run
+        self.done = collections.defaultdict(set)
+
+        # task_id -> list of the (item_id, data_point) pairs to notify, resumed
+        # from the interrupted run
+        self.notifications = collections.defaultdict(list)
+
+        self.lock = threading.Lock()
+        self.pending = []
+        self.fp = None
+
+    def resume(self, data_stores, data_deserializer):
+        """Applies the checkpoint left behind by an interrupted run to the data stores
+        loaded from the same files, and opens the checkpoint for this run
+
+        Records of unknown tasks or items are skipped, as is a last line left
+        incomplete by a crash, which is then removed from the file. Histories kept
+        in their own file already hold their data points, only the item state is
+        restored.
+
+        data_stores (list(DataStore)) - the data stores to update
+
+        data_deserializer (function(string, string)) - a function that
+            deserializes data strings for each task
+
+        Returns the number of items resumed"""
+        count = 0
+
+        if os.path.exists(self.filename):
+            with open(self.filename, "r") as fp:
+                lines = fp.readlines()
+
+            if len(lines) > 0 and self.is_current(lines[0]):
+                count = self.replay(data_stores, lines[1:], data_deserializer)
+            else:
+                # the stores were saved since, the checkpoint is stale
+                os.remove(self.filename)
+
+        # the records of this run must not run into a line left incomplete by a crash
+        drop_incomplete_line(self.filename)
+        self.fp = open(self.filename, "a")
+
+        if self.fp.tell() == 0:
+            self.fp.write(json.dumps({"fingerprint": self.fingerprint}) + "\n")
+            self.sync()
+
+        return count
+
+    def is_current(self, header):
+        """Tells if a checkpoint header belongs to the files the stores were loaded from"""
+        try:
+            return json.loads(header).get("fingerprint") == self.fingerprint
+        except ValueError:
+            return False
+
+    def replay(self, data_stores, lines, data_deserializer):
+        stores = {ds.task_id: ds for ds in data_stores}
+        item_ids = {ds.task_id: set(ds.get_item_ids()) for ds in data_stores}
+        count = 0
+
+        for n in range(len(lines)):
+            try:
+                record = json.loads(lines[n])
+            except ValueError:
+                if n == len(lines) - 1:
+                    break
+                raise RuntimeError(self.filename + ": Corrupt record on line " + str(n + 2))
+
+            ds = stores.get(record["task"])
+
+            if ds is not None and record.get("alerted", False):
+                # the task notified its items before the run died
+                self.notifications.pop(ds.task_id, None)
+                continue
+
+            item_id = record["item"]
+
+            if ds is None or item_id not in item_ids[ds.task_id] or \
+                    item_id in self.done[ds.task_id]:
+                continue
+
+            data_point = data_deserializer(ds.task_id, record["append"])
+
+            if not getattr(ds.items, "persistent", False):
+                ds.append_item_history(item_id, data_point,
+                                       ds.get_config_value("max_history_length"))
+
+            ds.set_item_state(item_id, record.get("state", {}))
+
+            if record.get("notify", False):
+                self.notifications[ds.task_id].append((item_id, data_point))
+            self.done[ds.task_id].add(item_id)
+            count += 1
+
+        return count
+
+    def is_done(self, task_id, item_id):
+        """Tells if an interrupted run already completed an item"""
+        return item_id in self.done[task_id]
+
+    def resumed_notifications(self, task_id):
+        """Returns the (item_id, data_point) pairs of a task that the interrupted run
+        was to notify"""
+        return list(self.notifications[task_id])
+
+    def record(self, data_store, item_id, data_point, notify=False):
+        """Adds an item whose latest data point was appended to its history
+
+        data_store (DataStore) - the data store of the item's task
+
+        item_id (string) - the id of the item
+
+        data_point (object) - the appended data point
+
+        notify (bool) - whether the data point was added to the notifier"""
+        record = collections.OrderedDict()
+        record["task"] = data_store.task_id
+        record["item"] = item_id
+        record["append"] = self.data_serializer(data_store.task_id, data_point)
+
+        if notify:
+            record["notify"] = True
+
+        state = data_store.get_item_states().get(item_id)
+
+        if state:
+            record["state"] = state
+
+        self.append(record)
+
+    def alerted(self, task_id):
+        """Adds a task whose notifier alerted the items it was given
+
+        task_id (string) - the id of the task"""
+        record = collections.OrderedDict()
+        record["task"] = task_id
+        record["alerted"] = True
+
+        self.append(record)
+
+    def append(self, record):
+        line = json.dumps(record) + "\n"
+
+        with self.lock:
+            self.pending.append(line)
+
+            if len(self.pending) >= self.interval:
+                self.write()
+
+    def flush(self):
+        """Writes the items completed so far to disk"""
+        with self.lock:
+            self.write()
+
+    def write(self):
+        if len(self.pending) == 0 or self.fp is None:
+            return
+
+        self.fp.write("".join(self.pending))
+        self.pending = []
+        self.sync()
+
+    def sync(self):
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+
+    def close(self):
+        """Writes the items completed so far and closes the checkpoint, which the
+        next run resumes from"""
+        self.flush()
+
+        if self.fp is not None:
+            self.fp.close()
+            self.fp = None
+
+    def finish(self):
+        """Removes the checkpoint once the data stores are saved"""
+        with self.lock:
+            self.pending = []
+
+            if self.fp is not None:
+                self.fp.close()
+                self.fp = None
+
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
@@ -0,0 +1,101 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import logging
+import threading
+import urllib.parse
+
+def host_of(server_url):
+    """Returns the host (and port) of a server url, which may lack a scheme"""
+    if "://" not in server_url:
+        server_url = "http://" + server_url
+
+    return urllib.parse.urlsplit(server_url).netloc
+
+class CircuitBreaker():
+    """Stops fetching from hosts that keep failing
+
+    After max_failures consecutive failed fetches from a host, the breaker of the
+    host opens and fetches from it are skipped for cool_off seconds. A single fetch
+    is then let through: the breaker closes again if it succeeds, and stays open for
+    another cool_off seconds if it fails. The breaker may be shared by the agents
+    of several tasks, and by their worker threads."""
+
+    def __init__(self, max_failures, cool_off, clock=time.monotonic):
+        """max_failures (int) - the number of consecutive failures that open the breaker
+            of a host
+
+        cool_off (float) - the number of seconds fetches to an open host are skipped
+
+        clock (function()) - returns the current time in seconds"""
+        if max_failures <= 0:
+            raise RuntimeError("Expected the number of failures to be positive")
+
+        self.max_failures = max_failures
+        self.cool_off = cool_off
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        # host -> [consecutive failures, time until which fetches are skipped]
+        self.hosts = {}
+
+    def allow(self, server_url):
+        """Tells if a fetch from a server may go ahead"""
+        with self.lock:
+            state = self.hosts.get(host_of(server_url))
+
+            if state is None or state[0] < self.max_failures:
+                return True
+
+            now = self.clock()
+
+            if now < state[1]:
+                return False
+
+            # let a single trial fetch through until its outcome is known
+            state[1] = now + self.cool_off
+            return True
+
+    def succeeded(self, server_url):
+        """Closes the breaker of a server after a successful fetch"""
+        with self.lock:
+            self.hosts.pop(host_of(server_url), None)
+
+    def failed(self, server_url):
+        """Counts a failed fetch from a server, opening its breaker after too many"""
+        host = host_of(server_url)
+
+        with self.lock:
+            state = self.hosts.setdefault(host, [0, 0])
+            state[0] += 1
+
+            if state[0] >= self.max_failures:
+                state[1] = self.clock() + self.cool_off
+
+                if state[0] == self.max_failures:
+                    logging.getLogger("horus").warning(
+                        "Skipping fetches from " + host + " for " + str(self.cool_off) +
+                        " seconds after " + str(state[0]) + " failures")
+
+    def is_open(self, server_url):
+        """Tells if fetches from a server are being skipped"""
+        with self.lock:
+            state = self.hosts.get(host_of(server_url))
+
+            return state is not None and state[0] >= self.max_failures and \
+                self.clock() < state[1]
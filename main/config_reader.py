@@ -0,0 +1,132 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The streaming configuration file reader
+
+Reads the tasks of a configuration file one at a time, decoding each item's
+history on its own, so that the whole file never has to be held in memory as a
+single parsed document."""
+
+import collections
+import json
+
+class StreamReader():
+    """Reads the JSON values of a file one at a time, in chunks"""
+
+    def __init__(self, fp, chunk_size=65536):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder(object_pairs_hook=collections.OrderedDict)
+
+    def fill(self):
+        """Reads the next chunk of the file, dropping what was already consumed"""
+        chunk = self.fp.read(self.chunk_size)
+
+        if len(chunk) == 0:
+            self.eof = True
+        else:
+            self.buffer = self.buffer[self.position:] + chunk
+            self.position = 0
+
+    def peek(self):
+        """Skips whitespace and returns the next character, or "" at the end of the file"""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position].isspace():
+                self.position += 1
+
+            if self.position < len(self.buffer) or self.eof:
+                return self.buffer[self.position:self.position + 1]
+
+            self.fill()
+
+    def expect(self, character):
+        """Consumes the next character, which has to be the given one"""
+        if self.peek() != character:
+            raise ValueError("Expected '" + character + "' at offset " + str(self.position) +
+                             " of the configuration file chunk")
+        self.position += 1
+
+    def value(self):
+        """Decodes and returns the JSON value at the current position"""
+        while True:
+            self.peek()
+
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+
+                # a number at the end of the buffer might continue in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.position = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+
+            self.fill()
+
+    def members(self):
+        """Iterates over the keys of the object at the current position
+
+        The caller has to consume the value of each key (with value() or members())
+        before asking for the next key."""
+        self.expect("{")
+
+        if self.peek() == "}":
+            self.position += 1
+            return
+
+        while True:
+            key = self.value()
+            self.expect(":")
+
+            yield key
+
+            if self.peek() == ",":
+                self.position += 1
+            else:
+                self.expect("}")
+                return
+
+def iter_tasks(fp, chunk_size=65536):
+    """Iterates over the tasks of a configuration file
+
+    fp (file) - the opened configuration file
+
+    chunk_size (int) - the number of characters read from the file at once
+
+    Yields (task_id, task) pairs, where task is an ordered dictionary of the values
+    of the task, as json.load would return it"""
+    reader = StreamReader(fp, chunk_size)
+
+    for task_id in reader.members():
+        task = collections.OrderedDict()
+
+        for key in reader.members():
+            if key == "items":
+                items = collections.OrderedDict()
+
+                for item in reader.members():
+                    items[item] = reader.value()
+
+                task[key] = items
+            else:
+                task[key] = reader.value()
+
+        yield task_id, task
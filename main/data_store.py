@@ -15,6 +15,8 @@
 #     You should have received a copy of the GNU General Public License
 #     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
 
+import collections
+
 class DataStore:
     """"Contains the data storage (in memory) of a single task"""
 
@@ -23,14 +25,25 @@ class DataStore:
         self.task_id = task_id
         self.modified = False
 
+        # the (item_id, kind, value) changes made since the store was last saved,
+        # where kind is "append" (value is a data point), "set" (a history) or
+        # "state" (no value, the item state changed)
+        self.changes = []
+
         # members that will be filled in by the configuration loader;
         # initialized to None for now
         self.items = None
         self.keys = None
+        self.states = None
+
+        # the serialized items as last loaded or saved, reused by the saver
+        # while the store isn't modified
+        self.serialized_items = None
 
     def __eq__(self, other):
         return self.task_id == other.task_id and self.items == other.items and \
-               self.keys == other.keys
+               self.keys == other.keys and \
+               self.get_item_states() == other.get_item_states()
 
     def get_config_value(self, key):
         if key in self.keys:
@@ -58,6 +71,60 @@ class DataStore:
 
             self.items[item_id] = history
             self.modified = True
+            self.changes.append((item_id, "set", list(history)))
         else:
             raise KeyError("Item '" + item_id + "' not found for task '" +
-                           self.task_id + "'")
\ No newline at end of file
+                           self.task_id + "'")
+
+    def append_item_history(self, item_id, data_point, max_length):
+        """Appends a data point to the history of an item, keeping only the newest
+        max_length data points
+
+        Histories kept in a ring buffer of that capacity are appended to in place;
+        any other history is replaced through set_item_history()."""
+        history = self.get_item_history(item_id)
+
+        if getattr(history, "maxlen", None) == max_length:
+
+            # quick check that data types don't change
+            if len(history) > 0:
+                assert type(history[-1]) == type(data_point)
+
+            history.append(data_point)
+            self.modified = True
+            self.changes.append((item_id, "append", data_point))
+        else:
+            self.set_item_history(item_id, (list(history) + [data_point])[-max_length:])
+
+    def pop_changes(self):
+        """Returns the changes made to the item histories since the last call, as a
+        list of (item_id, kind, value) tuples, where kind is either "append" (value is
+        the appended data point), "set" (value is the new history) or "state" (only
+        the item state changed)"""
+        changes = self.changes
+        self.changes = []
+
+        return changes
+
+    def get_item_states(self):
+        """Returns the states that engines keep for the items of the task between
+        runs, as a dictionary (item_id -> dict) that is modified in place"""
+        if getattr(self, "states", None) is None:
+            self.states = collections.OrderedDict()
+
+        return self.states
+
+    def set_item_state(self, item_id, state):
+        """Replaces the state of an item, removing it if the state is empty"""
+        if self.items is not None and item_id not in self.items:
+            raise KeyError("Item '" + item_id + "' not found for task '" +
+                           self.task_id + "'")
+
+        if len(state) > 0:
+            self.get_item_states()[item_id] = state
+        else:
+            self.get_item_states().pop(item_id, None)
+
+        self.modified = True
+        self.changes.append((item_id, "state", None))
+
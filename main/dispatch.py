@@ -0,0 +1,119 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import queue
+import logging
+import threading
+
+from main.interfaces import Notifier
+
+class Dispatcher():
+    """Delivers the notifications of the tasks on a background thread
+
+    Agents get QueuedNotifier objects whose add() and alert() calls are queued and
+    replayed in order on a single worker thread, so slow deliveries don't hold up
+    the next task and the notifiers are never called from two threads at once.
+
+    With a digest notifier, the data points added by every task go to the digest
+    instead, and it alerts once when the dispatcher is closed."""
+
+    def __init__(self, max_queued=1000, digest=None):
+        """max_queued (int) - the number of calls that may wait for the worker; agents
+            block once that many are queued
+
+        digest (Notifier) - if given, gets the data points of every task, with item
+            ids given as (task_id, item_id) pairs"""
+        if max_queued <= 0:
+            raise RuntimeError("Expected the notification queue size to be positive")
+
+        self.queue = queue.Queue(max_queued)
+        self.digest = digest
+        self.closed = False
+        self.thread = threading.Thread(target=self.run, name="horus-dispatch", daemon=True)
+        self.thread.start()
+
+    def notifier(self, task_id, notifier=None):
+        """Returns a notifier that queues its calls for a task
+
+        task_id (string) - the identifier of the task
+
+        notifier (Notifier) - the notifier the calls are delivered to; not needed
+            with a digest"""
+        if self.digest is None and notifier is None:
+            raise RuntimeError(task_id + ": Expected a notifier to dispatch to")
+
+        return QueuedNotifier(self, task_id, notifier)
+
+    def put(self, function, *args):
+        """Queues a call for the worker thread, waiting for room in the queue"""
+        if self.closed:
+            raise RuntimeError("Notification dispatcher is closed")
+
+        self.queue.put((function, args))
+
+    def run(self):
+        while True:
+            call = self.queue.get()
+
+            if call is None:
+                break
+
+            function, args = call
+
+            # a failed delivery doesn't stop the ones after it
+            try:
+                function(*args)
+            except Exception:
+                logging.getLogger("horus").exception("Notification failed")
+
+    def close(self):
+        """Sends the digest, if any, and waits until every queued call is delivered"""
+        if self.closed:
+            return
+
+        if self.digest is not None:
+            self.put(self.digest.alert)
+
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class QueuedNotifier(Notifier):
+    """The notifier a Dispatcher gives to the agent of a task"""
+
+    def __init__(self, dispatcher, task_id, notifier):
+        self.dispatcher = dispatcher
+        self.task_id = task_id
+        self.notifier = notifier
+
+    def add(self, item_id, latest_data_point):
+        if self.dispatcher.digest is not None:
+            self.dispatcher.put(self.dispatcher.digest.add, (self.task_id, item_id),
+                                latest_data_point)
+        else:
+            self.dispatcher.put(self.notifier.add, item_id, latest_data_point)
+
+    def alert(self):
+        # the digest alerts once for every task
+        if self.dispatcher.digest is None:
+            self.dispatcher.put(self.notifier.alert)
@@ -0,0 +1,181 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+from concurrent.futures import Future
+from main.interfaces import Engine, NOT_MODIFIED, implements, innermost
+
+class FetchCache():
+    """A cache of fetched data points shared by the agents of a run
+
+    Data points are kept for a number of seconds after they are fetched. When
+    several agents ask for the same data point at the same time, only the first
+    one fetches it and the others wait for its result."""
+
+    def __init__(self, ttl, clock=time.monotonic):
+        """ttl (float) - the number of seconds a fetched data point is reused
+
+        clock (function()) - returns the current time in seconds"""
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+
+    def get(self, keys, fetch):
+        """Returns the data points of several keys, fetching the ones that aren't
+        cached or being fetched already with a single call
+
+        keys (list(object)) - the hashable keys of the data points
+
+        fetch (function(list(object))) - fetches the data points of a list of keys,
+            returning them in the same order
+
+        Returns a (data_points, fetched) pair, where fetched tells for each key if
+        its data point was fetched by this call"""
+        data_points = [None] * len(keys)
+        fetched_keys = [False] * len(keys)
+        owned = []
+        waiting = []
+
+        with self.lock:
+            now = self.clock()
+
+            for i in range(len(keys)):
+                entry = self.entries.get(keys[i])
+
+                if entry is not None and entry[0] > now:
+                    data_points[i] = entry[1]
+                elif keys[i] in self.pending:
+                    waiting.append((i, self.pending[keys[i]]))
+                else:
+                    future = Future()
+                    self.pending[keys[i]] = future
+                    owned.append((i, future))
+
+        if len(owned) > 0:
+            try:
+                fetched = list(fetch([keys[i] for i, future in owned]))
+
+                if len(fetched) != len(owned):
+                    raise RuntimeError("Expected " + str(len(owned)) + " fetched data points, got " +
+                                       str(len(fetched)))
+            except BaseException as e:
+                with self.lock:
+                    for i, future in owned:
+                        del self.pending[keys[i]]
+
+                for i, future in owned:
+                    future.set_exception(e)
+                raise
+
+            with self.lock:
+                expiry = self.clock() + self.ttl
+
+                for (i, future), data_point in zip(owned, fetched):
+                    self.entries[keys[i]] = (expiry, data_point)
+                    del self.pending[keys[i]]
+
+            for (i, future), data_point in zip(owned, fetched):
+                future.set_result(data_point)
+                data_points[i] = data_point
+                fetched_keys[i] = True
+
+        # fetches started by other agents
+        for i, future in waiting:
+            data_points[i] = future.result()
+
+        return data_points, fetched_keys
+
+class CachedEngine(Engine):
+    """Fetches the data points of an engine through a FetchCache
+
+    Data points are cached by the engine's fetch function, server url and item,
+    so engines of different tasks share them as long as they fetch the same way.
+    The engine only waits after fetches that made a request.
+
+    NOT_MODIFIED only holds for the task whose validators were sent, so another
+    task that gets it from the cache fetches the item itself."""
+
+    wraps_engine = True
+
+    def __init__(self, engine, cache):
+        self.engine = engine
+        self.cache = cache
+        self.local = threading.local()
+
+    def key(self, server_url, item_id):
+        # engines wrapped by others, e.g. a rate limiter, are told apart by their own class
+        return (type(innermost(self.engine)).fetch, server_url, item_id)
+
+    def fetch(self, server_url, item_id):
+        data_points, fetched = self.cache.get(
+            [self.key(server_url, item_id)],
+            lambda keys: [self.engine.fetch(server_url, item_id)])
+        self.local.fetched = fetched[0]
+
+        if data_points[0] is NOT_MODIFIED and not fetched[0]:
+            self.local.fetched = True
+            return self.engine.fetch(server_url, item_id)
+
+        return data_points[0]
+
+    def compare(self, latest_data_point, history):
+        return self.engine.compare(latest_data_point, history)
+
+    def use_states(self, states):
+        self.engine.use_states(states)
+
+    def use_timeout(self, timeout):
+        self.engine.use_timeout(timeout)
+
+    def wait(self):
+        if getattr(self.local, "fetched", True):
+            self.engine.wait()
+
+class CachedBatchEngine(CachedEngine):
+    """Fetches the data points of an engine that implements fetch_many through a
+    FetchCache; only the items that aren't cached are asked for"""
+
+    def key(self, server_url, item_id):
+        return (type(innermost(self.engine)).fetch_many, server_url, item_id)
+
+    def fetch_many(self, server_url, item_ids):
+        data_points, fetched = self.cache.get(
+            [self.key(server_url, i) for i in item_ids],
+            lambda keys: self.engine.fetch_many(server_url, [k[2] for k in keys]))
+        self.local.fetched = any(fetched)
+
+        stale = [i for i in range(len(item_ids))
+                 if data_points[i] is NOT_MODIFIED and not fetched[i]]
+
+        if len(stale) > 0:
+            self.local.fetched = True
+            refetched = self.engine.fetch_many(server_url, [item_ids[i] for i in stale])
+            for i, data_point in zip(stale, refetched):
+                data_points[i] = data_point
+
+        return data_points
+
+def cached(engine, cache):
+    """Returns an engine that fetches the data points of an engine through a cache"""
+    if implements(engine, "fetch_many"):
+        return CachedBatchEngine(engine, cache)
+    else:
+        return CachedEngine(engine, cache)
@@ -0,0 +1,92 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+class RingBuffer():
+    """A fixed capacity history of data points, from oldest to newest
+
+    Appending to a full buffer overwrites the oldest data point in place, so the
+    history of an item never has to be copied to add a data point. The buffer can
+    be indexed, iterated and compared like the list it replaces."""
+
+    def __init__(self, capacity, data_points=()):
+        """capacity (int) - the maximum number of data points kept
+
+        data_points (iterable(object)) - the initial data points, from oldest to
+                                         newest; only the newest capacity are kept"""
+        if capacity <= 0:
+            raise RuntimeError("Expected history capacity to be positive")
+
+        self.maxlen = capacity
+        self.slots = [None] * capacity
+        self.start = 0
+        self.length = 0
+
+        for data_point in data_points:
+            self.append(data_point)
+
+    def get_slot(self, position):
+        return self.slots[position]
+
+    def set_slot(self, position, data_point):
+        self.slots[position] = data_point
+
+    def append(self, data_point):
+        """Adds a data point as the newest one, dropping the oldest if the buffer is full"""
+        end = (self.start + self.length) % self.maxlen
+        self.set_slot(end, data_point)
+
+        if self.length < self.maxlen:
+            self.length += 1
+        else:
+            self.start = (self.start + 1) % self.maxlen
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self)[index]
+
+        if index < 0:
+            index += self.length
+
+        if index < 0 or index >= self.length:
+            raise IndexError("history index out of range")
+
+        return self.get_slot((self.start + index) % self.maxlen)
+
+    def __iter__(self):
+        start, length = self.start, self.length
+        for i in range(length):
+            yield self.get_slot((start + i) % self.maxlen)
+
+    def __eq__(self, other):
+        try:
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        except TypeError:
+            return NotImplemented
+
+    __hash__ = None
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + repr(list(self)) + ", maxlen=" + str(self.maxlen) + ")"
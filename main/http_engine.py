@@ -0,0 +1,165 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import threading
+import time
+
+import requests
+
+from requests.adapters import HTTPAdapter
+from main.interfaces import Engine, NOT_MODIFIED
+from main.rate_limit import Throttled, parse_retry_after
+
+class HttpEngine(Engine):
+    """An engine that fetches item data points over HTTP
+
+    The engine keeps one pooled, keep-alive session per server url for as long as
+    it lives, so consecutive fetches reuse their connections instead of opening a
+    new one per item. Subclasses only implement parse() and compare().
+
+    The ETag and Last-Modified validators of each item are kept in the item states
+    of the task, so later runs make conditional requests; when the server answers
+    "304 Not Modified" the response is not parsed and the last data point is reused."""
+
+    def __init__(self, pool_size=10, connect_timeout=5, read_timeout=30, delay=0,
+                 conditional=True):
+        """pool_size (int) - the number of connections kept open per server url;
+                             should be at least the task's number of workers
+
+        connect_timeout (float) - seconds to wait for a connection to be opened
+
+        read_timeout (float) - seconds to wait for the server to send data
+
+        delay (float) - seconds to sleep in wait(), between fetched items
+
+        conditional (bool) - whether to make conditional requests with the
+                             validators of previous responses"""
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self.delay = delay
+        self.conditional = conditional
+        self.states = None
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def get_session(self, server_url):
+        """Returns the session used for a server url, opening it on first use"""
+        with self.lock:
+            session = self.sessions.get(server_url)
+
+            if session is None:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[server_url] = session
+
+        return session
+
+    def close(self):
+        """Closes the connections of every session"""
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+    def url(self, server_url, item_id):
+        """Returns the url of an item
+
+        By default the item identifier is appended as a path to the server url,
+        which is assumed to be a http url if no scheme is given."""
+        if "://" not in server_url:
+            server_url = "http://" + server_url
+
+        return server_url.rstrip("/") + "/" + str(item_id)
+
+    def use_states(self, states):
+        self.states = states
+
+    def use_timeout(self, timeout):
+        self.timeout = (min(self.timeout[0], timeout), min(self.timeout[1], timeout))
+
+    def fetch(self, server_url, item_id):
+        raw = self.fetch_raw(server_url, item_id)
+
+        if raw is NOT_MODIFIED:
+            return raw
+
+        return self.parse_raw(item_id, raw)
+
+    def fetch_raw(self, server_url, item_id):
+        conditional = self.conditional and self.states is not None
+        headers = {}
+
+        if conditional:
+            state = self.states.get(item_id, {})
+
+            if "etag" in state:
+                headers["If-None-Match"] = state["etag"]
+            if "last_modified" in state:
+                headers["If-Modified-Since"] = state["last_modified"]
+
+        response = self.get_session(server_url).get(self.url(server_url, item_id),
+                                                    headers=headers, timeout=self.timeout)
+
+        if response.status_code == 304 and len(headers) > 0:
+            return NOT_MODIFIED
+
+        # let a rate limiter slow down (see main/rate_limit.py)
+        if response.status_code in (429, 503):
+            raise Throttled(self.url(server_url, item_id) + ": " + str(response.status_code),
+                            parse_retry_after(response.headers.get("Retry-After")))
+
+        response.raise_for_status()
+
+        return response
+
+    def parse_raw(self, item_id, response):
+        # the validators are only kept once the response is known to be usable
+        data_point = self.parse(response)
+
+        if self.conditional and self.states is not None:
+            self.update_validators(item_id, response)
+
+        return data_point
+
+    def update_validators(self, item_id, response):
+        """Keeps the cache validators of a response in the state of its item"""
+        state = self.states.get(item_id, {})
+
+        for key, header in (("etag", "ETag"), ("last_modified", "Last-Modified")):
+            if header in response.headers:
+                state[key] = response.headers[header]
+            else:
+                state.pop(key, None)
+
+        if len(state) > 0:
+            self.states[item_id] = state
+        else:
+            self.states.pop(item_id, None)
+
+    def parse(self, response):
+        """Function called to turn the response of a server into a data point
+
+        response (requests.Response) - the successful response to the item's request
+
+        Returns the latest data point"""
+        raise NotImplementedError
+
+    def wait(self):
+        if self.delay > 0:
+            time.sleep(self.delay)
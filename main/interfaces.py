@@ -15,6 +15,19 @@
 #     You should have received a copy of the GNU General Public License
 #     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
 
+class NotModified():
+    """The type of NOT_MODIFIED, the data point an engine returns when the server
+    reports that an item did not change since it was last fetched. The agent then
+    reuses the last data point of the item's history instead."""
+
+    def __repr__(self):
+        return "NOT_MODIFIED"
+
+    def __reduce__(self):
+        return "NOT_MODIFIED"
+
+NOT_MODIFIED = NotModified()
+
 class Notifier():
     """The notifier interface
 
@@ -42,7 +55,10 @@ class Engine():
     """The engine interface
 
     This interface is used by the agent to fetch prices, compare the latest
-    prices, and even to wait between requests"""
+    prices, and even to wait between requests.
+
+    When a task sets "workers" above 1, fetch() and wait() are called from several
+    threads at the same time, so they should not share unprotected state."""
 
     def __init__(self):
         pass
@@ -59,6 +75,46 @@ class Engine():
         Returns the latest data point"""
         raise NotImplementedError
 
+    def fetch_many(self, server_url, item_ids):
+        """Optional function called to fetch the latest data points of several items
+        with a single request, for servers that have bulk endpoints. When an engine
+        implements it, the agent calls it instead of fetch() with up to the task's
+        "batch_size" items at once, and calls wait() between batches.
+
+        server_url (string) - the url of the resource to get, as given in
+                              the configuration file
+
+        item_ids (list(object)) - the identifiers of the items to fetch
+
+        Returns a list with the latest data point of each item, in the same order"""
+        raise NotImplementedError
+
+    def fetch_raw(self, server_url, item_id):
+        """Optional function that only does the network part of fetch(), for engines
+        that spend a noticeable time parsing. When an engine implements it along
+        with parse_raw(), the agent of a task with "pipeline" set fetches and parses
+        items on separate threads (see main/pipeline.py).
+
+        server_url (string) - the url of the resource to get, as given in
+                              the configuration file
+
+        item_id (object) - the identifier of the item to fetch
+
+        Returns the raw response that parse_raw() turns into the latest data point,
+        or NOT_MODIFIED"""
+        raise NotImplementedError
+
+    def parse_raw(self, item_id, raw):
+        """Optional function that turns what fetch_raw() returned for an item into
+        its latest data point (see fetch_raw)
+
+        item_id (object) - the identifier of the item
+
+        raw (object) - the raw response
+
+        Returns the latest data point"""
+        raise NotImplementedError
+
     def compare(self, latest_data_point, history):
         """Function called to compare the latest data point of an item to its history
 
@@ -70,7 +126,112 @@ class Engine():
         Returns True if the user should be notified of the latest data point"""
         raise NotImplementedError
 
+    def use_states(self, states):
+        """Function called once before any item is fetched, with the item states of
+        the task. Engines may keep small JSON serializable values per item in it
+        (e.g. cache validators) that are saved along with the item histories.
+
+        states (dict(string, dict)) - the state of each item, by item identifier"""
+        pass
+
+    def use_timeout(self, timeout):
+        """Function called once before any item is fetched when the task sets a
+        "fetch_timeout". Engines that can should then give up on fetches that take
+        longer, by raising an exception. The Agent refuses to run such tasks with
+        engines that don't override it.
+
+        timeout (float) - the number of seconds a fetch may take"""
+        pass
+
     def wait(self):
         """Function called between each item fetched from a url, for things such as
         waiting between requests"""
         raise NotImplementedError
+
+
+class AsyncEngine():
+    """The asynchronous engine interface
+
+    The asyncio counterpart of Engine, used by the AsyncAgent so that the requests
+    of every task can be in flight on a single event loop. Synchronous engines
+    are run through an EngineAdapter instead."""
+
+    def __init__(self):
+        pass
+
+    async def fetch(self, server_url, item_id):
+        """Coroutine called to fetch the latest item data point from a server
+
+        server_url (string) - the url of the resource to get, as given in
+                              the configuration file
+
+        item_id (object) - the identifier of the item whose data point passes
+                           the comparison,as given in the configuration file
+
+        Returns the latest data point"""
+        raise NotImplementedError
+
+    async def fetch_many(self, server_url, item_ids):
+        """Optional coroutine called to fetch the latest data points of several items
+        with a single request (see Engine.fetch_many)
+
+        Returns a list with the latest data point of each item, in the same order"""
+        raise NotImplementedError
+
+    def compare(self, latest_data_point, history):
+        """Function called to compare the latest data point of an item to its history
+
+        latest_data_point (object) - the latest data point
+
+        history (list(object)) - the known history of item's data points, from oldest
+                                 to newest
+
+        Returns True if the user should be notified of the latest data point"""
+        raise NotImplementedError
+
+    def use_states(self, states):
+        """Function called once before any item is fetched, with the item states of
+        the task (see Engine.use_states)"""
+        pass
+
+    def use_timeout(self, timeout):
+        """Function called once before any item is fetched when the task sets a
+        "fetch_timeout"; the AsyncAgent already cancels fetches that take longer
+        (see Engine.use_timeout)"""
+        pass
+
+    async def wait(self):
+        """Coroutine called between each item fetched from a url, for things such as
+        waiting between requests (e.g. with asyncio.sleep)"""
+        raise NotImplementedError
+
+def implements(engine, function_name):
+    """Checks if an engine overrides an optional function of its interface
+
+    engine (Engine or AsyncEngine) - the engine to check
+
+    function_name (string) - the name of the function, e.g. "fetch_many"
+
+    Engines that wrap another engine (and set wraps_engine) only implement the
+    functions that the engine they wrap implements as well.
+
+    Returns True if the engine's class provides its own version of the function"""
+    for interface in (Engine, AsyncEngine):
+        if isinstance(engine, interface):
+            if getattr(type(engine), function_name) is getattr(interface, function_name):
+                return False
+
+            if getattr(type(engine), "wraps_engine", False):
+                return implements(engine.engine, function_name)
+
+            return True
+
+    return False
+
+def innermost(engine):
+    """Returns the engine that an engine wrapping other engines (and setting
+    wraps_engine) ends up calling, or the engine itself if it wraps none"""
+    while getattr(type(engine), "wraps_engine", False):
+        engine = engine.engine
+
+    return engine
@@ -0,0 +1,171 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The append-only journal of data store changes
+
+Instead of rewriting the whole configuration file after every run, the changes
+of a run are appended to a journal file, one JSON record per line. Loading the
+configuration replays the journal over it, and compaction writes everything back
+into the configuration file and starts a new journal."""
+
+import collections
+import json
+import os
+
+def drop_incomplete_line(filename, chunk_size=4096):
+    """Truncates a file of JSON lines to the end of its last complete line, so that
+    the records appended next don't run into a line left incomplete by a crash
+
+    filename (string) - the path to the file; a missing file is left alone
+
+    Returns the number of bytes dropped"""
+    if not os.path.exists(filename):
+        return 0
+
+    with open(filename, "rb+") as fp:
+        size = fp.seek(0, os.SEEK_END)
+        end = size
+
+        # look for the last newline from the end of the file
+        while end > 0:
+            start = max(0, end - chunk_size)
+            fp.seek(start)
+            newline = fp.read(end - start).rfind(b"\n")
+
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+
+        if end < size:
+            fp.truncate(end)
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    return size - end
+
+def append_changes(data_stores, journal_filename, data_serializer):
+    """Appends the changes made to the data stores since they were last saved
+
+    data_stores (list(DataStore)) - the data stores whose changes are saved
+
+    journal_filename (string) - the path to the journal file
+
+    data_serializer (function(string, object)) - a function that serializes a tasks
+        data point
+
+    Returns the number of records written"""
+    count = 0
+
+    drop_incomplete_line(journal_filename)
+
+    with open(journal_filename, "a") as fp:
+        for ds in data_stores:
+            states = ds.get_item_states()
+
+            for item_id, kind, value in ds.pop_changes():
+                record = collections.OrderedDict()
+                record["task"] = ds.task_id
+                record["item"] = item_id
+
+                # histories kept in their own file are saved by it, only the
+                # item state is recorded
+                if getattr(ds.items, "persistent", False) or kind == "state":
+                    pass
+                elif kind == "append":
+                    record["append"] = data_serializer(ds.task_id, value)
+                else:
+                    record["set"] = [data_serializer(ds.task_id, k) for k in value]
+
+                # the item state is written as a whole after each change
+                if item_id in states:
+                    record["state"] = states[item_id]
+
+                fp.write(json.dumps(record) + "\n")
+                count += 1
+
+        fp.flush()
+        os.fsync(fp.fileno())
+
+    return count
+
+def replay(data_stores, journal_filename, data_deserializer):
+    """Applies the changes recorded in a journal to the data stores loaded from the
+    configuration file it belongs to
+
+    Records of unknown tasks or items (e.g. removed from the configuration since)
+    are skipped, as is a last line left incomplete by a crash.
+
+    data_stores (list(DataStore)) - the data stores to update
+
+    journal_filename (string) - the path to the journal file; a missing file
+        is an empty journal
+
+    data_deserializer (function(string, string)) - a function that
+        deserializes data strings for each task
+
+    Returns the number of records applied"""
+    if not os.path.exists(journal_filename):
+        return 0
+
+    stores = {ds.task_id: ds for ds in data_stores}
+    item_ids = {ds.task_id: set(ds.get_item_ids()) for ds in data_stores}
+    count = 0
+    replayed = set()
+
+    with open(journal_filename, "r") as fp:
+        lines = fp.readlines()
+
+    for n in range(len(lines)):
+        try:
+            record = json.loads(lines[n])
+        except ValueError:
+            if n == len(lines) - 1:
+                break
+            raise RuntimeError(journal_filename + ": Corrupt record on line " + str(n + 1))
+
+        ds = stores.get(record["task"])
+        item_id = record["item"]
+
+        if ds is None or item_id not in item_ids[ds.task_id]:
+            continue
+
+        if "append" in record:
+            ds.append_item_history(item_id, data_deserializer(ds.task_id, record["append"]),
+                                   ds.get_config_value("max_history_length"))
+        elif "set" in record:
+            ds.set_item_history(item_id, [data_deserializer(ds.task_id, k)
+                                          for k in record["set"]])
+
+        if "state" in record:
+            ds.get_item_states()[item_id] = record["state"]
+        else:
+            ds.get_item_states().pop(item_id, None)
+
+        replayed.add(ds.task_id)
+        count += 1
+
+    # the replayed changes are already saved in the journal, but the configuration
+    # file no longer matches the stores they were applied to
+    for ds in data_stores:
+        ds.pop_changes()
+
+        if ds.task_id in replayed:
+            ds.serialized_items = None
+            ds.modified = False
+
+    return count
@@ -0,0 +1,70 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections.abc
+
+class LazyItems(collections.abc.MutableMapping):
+    """The item histories of a task, deserialized only when they are first accessed
+
+    Until then each history is kept as the list of strings it was loaded as, which
+    can also be saved again as it is."""
+
+    def __init__(self, serialized_items, load_history):
+        """serialized_items (dict(string, list(string))) - the serialized history of
+                                                          each item, in order
+
+        load_history (function(list(string))) - a function that deserializes a
+                                                 serialized history"""
+        self.serialized_items = serialized_items
+        self.load_history = load_history
+        self.histories = {}
+
+    def get_serialized(self, item_id):
+        """Returns the serialized history of an item, or None if it has been
+        deserialized (and so may have changed) since it was loaded"""
+        if item_id in self.histories:
+            return None
+
+        return self.serialized_items[item_id]
+
+    def __getitem__(self, item_id):
+        if item_id not in self.histories:
+            self.histories[item_id] = self.load_history(self.serialized_items[item_id])
+
+        return self.histories[item_id]
+
+    def __setitem__(self, item_id, history):
+        if item_id not in self.serialized_items:
+            self.serialized_items[item_id] = None
+
+        self.histories[item_id] = history
+
+    def __delitem__(self, item_id):
+        del self.serialized_items[item_id]
+        self.histories.pop(item_id, None)
+
+    def __contains__(self, item_id):
+        return item_id in self.serialized_items
+
+    def __iter__(self):
+        return iter(self.serialized_items)
+
+    def __len__(self):
+        return len(self.serialized_items)
+
+    def __repr__(self):
+        return "LazyItems(" + repr(list(self.serialized_items)) + ")"
@@ -0,0 +1,215 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The memory-mapped binary history file of numeric tasks
+
+The file holds a NumericHistoryTable as it is laid out in memory:
+
+    header      - magic, version, history capacity, item count, numeric type and
+                  the length of the item identifiers block, padded to 8 bytes
+    identifiers - the item identifiers, as a UTF-8 JSON list padded to 8 bytes
+    starts      - the ring buffer start of each item, as 64-bit integers
+    lengths     - the history length of each item, as 64-bit integers
+    data points - capacity doubles per item, one row after the other
+
+Opening it only maps the file, and the operating system loads the pages of the
+items the agent actually visits."""
+
+import collections
+import json
+import mmap
+import os
+import stat
+import struct
+import tempfile
+
+from main.numeric_history import NumericHistoryTable, NUMERIC_TYPES
+
+MAGIC = b"HORUSHST"
+VERSION = 2
+HEADER = struct.Struct("<8sIII8sQ")
+
+# the size of the header once padded, so that the arrays after it are aligned;
+# files of version 1 have no padding and are rewritten when opened
+HEADER_SIZES = {1: HEADER.size, 2: HEADER.size + (-HEADER.size % 8)}
+
+def write_history_file(filename, table):
+    """Writes a numeric history table to a binary history file
+
+    The file is replaced atomically, as it may be the only copy of the histories.
+
+    filename (string) - the path to the file, replaced if it exists
+
+    table (NumericHistoryTable) - the histories to write"""
+    identifiers = json.dumps(list(table)).encode("utf-8")
+    identifiers += b" " * (-len(identifiers) % 8)
+
+    # write next to the file, then move it over the old one
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            fp.write(HEADER.pack(MAGIC, VERSION, table.capacity, len(table),
+                                 table.numeric_type.encode("ascii"), len(identifiers)))
+            fp.write(b"\0" * (HEADER_SIZES[VERSION] - HEADER.size))
+            fp.write(identifiers)
+
+            for item in table:
+                fp.write(struct.pack("<q", 0))
+            for item in table:
+                fp.write(struct.pack("<q", len(table[item])))
+            for item in table:
+                row = list(table[item])
+                values = [table.encode(k) for k in row] + [0.0] * (table.capacity - len(row))
+                fp.write(struct.pack("<" + str(table.capacity) + "d", *values))
+
+            fp.flush()
+            os.fsync(fp.fileno())
+
+        if os.path.exists(filename):
+            os.chmod(temp_filename, stat.S_IMODE(os.stat(filename).st_mode))
+
+        os.replace(temp_filename, filename)
+    except BaseException:
+        os.remove(temp_filename)
+        raise
+
+def read_history_file(filename):
+    """Reads a whole binary history file into a NumericHistoryTable in memory
+
+    Returns the table"""
+    mapped = MappedHistoryTable(filename)
+    try:
+        table = NumericHistoryTable(mapped.capacity, mapped.numeric_type)
+        for item in mapped:
+            table[item] = list(mapped[item])
+    finally:
+        mapped.close()
+
+    return table
+
+class MappedHistoryTable(NumericHistoryTable):
+    """A NumericHistoryTable kept in a memory-mapped binary history file
+
+    Changes to the histories are written to the mapped file directly; flush() makes
+    sure they reach the disk. The file has a fixed set of items, so items can't be
+    added or removed (rewrite the file with write_history_file instead)."""
+
+    # the histories are saved by the file itself rather than the configuration
+    persistent = True
+
+    def __init__(self, filename):
+        """filename (string) - the path to the binary history file"""
+        self.filename = filename
+        self.fp = open(filename, "r+b")
+        self.map = mmap.mmap(self.fp.fileno(), 0)
+
+        magic, version, capacity, count, numeric_type, identifiers_length = \
+            HEADER.unpack_from(self.map, 0)
+        numeric_type = numeric_type.rstrip(b"\0").decode("ascii")
+
+        if magic != MAGIC or version not in HEADER_SIZES or numeric_type not in NUMERIC_TYPES:
+            self.close()
+            raise RuntimeError(filename + ": Not a binary history file")
+
+        self.version = version
+        self.capacity = capacity
+        self.numeric_type = numeric_type
+
+        offset = HEADER_SIZES[version]
+        identifiers = json.loads(self.map[offset:offset + identifiers_length].decode("utf-8"))
+        self.rows = collections.OrderedDict((identifiers[i], i) for i in range(count))
+
+        offset += identifiers_length
+        view = memoryview(self.map)
+        self.starts = view[offset:offset + 8 * count].cast("q")
+        offset += 8 * count
+        self.lengths = view[offset:offset + 8 * count].cast("q")
+        offset += 8 * count
+        self.data_points = view[offset:offset + 8 * count * capacity].cast("d")
+        view.release()
+
+    def __setitem__(self, item_id, history):
+        if item_id not in self.rows:
+            raise KeyError("Item '" + item_id + "' not found in " + self.filename)
+
+        super().__setitem__(item_id, history)
+
+    def __delitem__(self, item_id):
+        raise RuntimeError("Items can't be removed from " + self.filename)
+
+    def flush(self):
+        """Writes the changed pages of the file to the disk"""
+        self.map.flush()
+
+    def close(self):
+        """Unmaps and closes the file"""
+        for name in ("starts", "lengths", "data_points"):
+            if name in self.__dict__:
+                getattr(self, name).release()
+                delattr(self, name)
+
+        self.map.close()
+        self.fp.close()
+
+    def __repr__(self):
+        return "MappedHistoryTable(" + repr(self.filename) + ")"
+
+def open_history_file(filename, capacity, numeric_type, serialized_items, load_history):
+    """Opens the binary history file of a task
+
+    The file is (re)written first if it doesn't exist yet, if it has an older
+    version, if its capacity or type no longer match the task, or if its items
+    aren't those listed in the configuration. The configuration decides which items the file holds, while the
+    histories already in the file take precedence over those in the configuration.
+
+    filename (string) - the path to the binary history file
+
+    capacity (int) - the maximum history length of the task
+
+    numeric_type (string) - the type of the data points of the task
+
+    serialized_items (dict(string, list(string))) - the serialized histories of
+        the items listed in the configuration
+
+    load_history (function(list(string))) - a function that deserializes a
+        serialized history
+
+    Returns a MappedHistoryTable"""
+    table = NumericHistoryTable(capacity, numeric_type)
+
+    if os.path.exists(filename):
+        mapped = MappedHistoryTable(filename)
+
+        if mapped.version == VERSION and mapped.capacity == capacity and \
+                mapped.numeric_type == numeric_type and \
+                list(mapped) == list(serialized_items):
+            return mapped
+
+        for item in serialized_items:
+            if item in mapped:
+                table[item] = list(mapped[item])
+            else:
+                table[item] = load_history(serialized_items[item])
+        mapped.close()
+    else:
+        for item in serialized_items:
+            table[item] = load_history(serialized_items[item])
+
+    write_history_file(filename, table)
+
+    return MappedHistoryTable(filename)
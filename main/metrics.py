@@ -0,0 +1,287 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import json
+import time
+import threading
+import collections
+
+from main.interfaces import AsyncEngine, Engine, Notifier, NOT_MODIFIED, implements
+
+class Metrics():
+    """Collects the timings, counts and errors of agent runs
+
+    Timings are kept as summaries (count, total and maximum seconds) of each phase
+    of a task: "execute" for a whole run, "fetch", "compare", "wait", "add" and
+    "alert" for the calls to the engine and notifier, and any phase timed by the
+    caller (e.g. "load" and "save" in horus.py). Events are counters such as
+    "items", "not_modified", "notifications" and "errors"."""
+
+    def __init__(self, clock=time.perf_counter):
+        """clock (function()) - returns the current time in seconds"""
+        self.clock = clock
+        self.lock = threading.Lock()
+
+        # (phase, task_id) -> [count, total seconds, maximum seconds]
+        self.timings = collections.OrderedDict()
+
+        # (event, task_id) -> count
+        self.events = collections.OrderedDict()
+
+    def observe(self, phase, task_id, seconds):
+        """Records the duration of a phase"""
+        with self.lock:
+            timing = self.timings.get((phase, task_id))
+
+            if timing is None:
+                self.timings[(phase, task_id)] = [1, seconds, seconds]
+            else:
+                timing[0] += 1
+                timing[1] += seconds
+                timing[2] = max(timing[2], seconds)
+
+    def count(self, event, task_id, n=1):
+        """Adds to the count of an event"""
+        with self.lock:
+            self.events[(event, task_id)] = self.events.get((event, task_id), 0) + n
+
+    def timer(self, phase, task_id):
+        """Returns a context manager that records the duration of a phase, and counts
+        an error if it raises"""
+        return Timer(self, phase, task_id)
+
+    def to_json(self):
+        """Returns the metrics as a JSON serializable dictionary"""
+        with self.lock:
+            return collections.OrderedDict([
+                ("timings", [collections.OrderedDict([
+                    ("phase", phase), ("task", task_id), ("count", timing[0]),
+                    ("seconds", timing[1]), ("max_seconds", timing[2])])
+                    for (phase, task_id), timing in self.timings.items()]),
+                ("events", [collections.OrderedDict([
+                    ("event", event), ("task", task_id), ("count", count)])
+                    for (event, task_id), count in self.events.items()])])
+
+    def to_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format"""
+        lines = []
+
+        with self.lock:
+            lines.append("# HELP horus_phase_seconds Seconds spent in each phase of the agent runs")
+            lines.append("# TYPE horus_phase_seconds summary")
+            for (phase, task_id), timing in self.timings.items():
+                labels = format_labels(phase=phase, task=task_id)
+                lines.append("horus_phase_seconds_count" + labels + " " + repr(timing[0]))
+                lines.append("horus_phase_seconds_sum" + labels + " " + repr(timing[1]))
+
+            lines.append("# HELP horus_phase_max_seconds Longest single call of each phase")
+            lines.append("# TYPE horus_phase_max_seconds gauge")
+            for (phase, task_id), timing in self.timings.items():
+                lines.append("horus_phase_max_seconds" + format_labels(phase=phase, task=task_id) +
+                             " " + repr(timing[2]))
+
+            lines.append("# HELP horus_events_total Events of the agent runs")
+            lines.append("# TYPE horus_events_total counter")
+            for (event, task_id), count in self.events.items():
+                lines.append("horus_events_total" + format_labels(event=event, task=task_id) +
+                             " " + repr(count))
+
+        return "\n".join(lines) + "\n"
+
+    def write(self, filename):
+        """Writes the metrics to a file, as JSON if its name ends with ".json" and in
+        the Prometheus text format otherwise
+
+        The file is replaced atomically, so that collectors reading it never see
+        half of it. The temporary file is created with the usual permissions, as
+        the collector may run as another user."""
+        temp_filename = filename + ".tmp"
+
+        try:
+            with open(temp_filename, "w") as fp:
+                if filename.endswith(".json"):
+                    json.dump(self.to_json(), fp, indent=4)
+                else:
+                    fp.write(self.to_prometheus())
+
+            os.replace(temp_filename, filename)
+        except BaseException:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+
+def format_labels(**labels):
+    """Returns the Prometheus labels of a sample, leaving out those that are None"""
+    pairs = []
+
+    for name in sorted(labels):
+        if labels[name] is not None:
+            value = str(labels[name]).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+            pairs.append(name + '="' + value + '"')
+
+    return "{" + ",".join(pairs) + "}"
+
+class Timer():
+    """The context manager returned by Metrics.timer()"""
+
+    def __init__(self, metrics, phase, task_id):
+        self.metrics = metrics
+        self.phase = phase
+        self.task_id = task_id
+
+    def __enter__(self):
+        self.start = self.metrics.clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.observe(self.phase, self.task_id, self.metrics.clock() - self.start)
+
+        if exc_type is not None:
+            self.metrics.count("errors", self.task_id)
+            self.metrics.count(self.phase + "_errors", self.task_id)
+
+def count_fetched(metrics, task_id, data_points):
+    """Counts the fetched items of a task and those that were not modified"""
+    metrics.count("items", task_id, len(data_points))
+
+    not_modified = sum(1 for d in data_points if d is NOT_MODIFIED)
+    if not_modified > 0:
+        metrics.count("not_modified", task_id, not_modified)
+
+class InstrumentedNotifier(Notifier):
+    """Records the calls to the notifier of a task"""
+
+    def __init__(self, notifier, metrics, task_id):
+        self.notifier = notifier
+        self.metrics = metrics
+        self.task_id = task_id
+
+    def add(self, item_id, latest_data_point):
+        self.metrics.count("notifications", self.task_id)
+        with self.metrics.timer("add", self.task_id):
+            self.notifier.add(item_id, latest_data_point)
+
+    def alert(self):
+        with self.metrics.timer("alert", self.task_id):
+            self.notifier.alert()
+
+class InstrumentedEngine(Engine):
+    """Records the calls to the engine of a task"""
+
+    wraps_engine = True
+
+    def __init__(self, engine, metrics, task_id):
+        self.engine = engine
+        self.metrics = metrics
+        self.task_id = task_id
+
+    def fetch(self, server_url, item_id):
+        with self.metrics.timer("fetch", self.task_id):
+            data_point = self.engine.fetch(server_url, item_id)
+
+        count_fetched(self.metrics, self.task_id, [data_point])
+        return data_point
+
+    def fetch_raw(self, server_url, item_id):
+        with self.metrics.timer("fetch", self.task_id):
+            raw = self.engine.fetch_raw(server_url, item_id)
+
+        count_fetched(self.metrics, self.task_id, [raw])
+        return raw
+
+    def parse_raw(self, item_id, raw):
+        with self.metrics.timer("parse", self.task_id):
+            return self.engine.parse_raw(item_id, raw)
+
+    def compare(self, latest_data_point, history):
+        with self.metrics.timer("compare", self.task_id):
+            return self.engine.compare(latest_data_point, history)
+
+    def use_states(self, states):
+        self.engine.use_states(states)
+
+    def use_timeout(self, timeout):
+        self.engine.use_timeout(timeout)
+
+    def wait(self):
+        with self.metrics.timer("wait", self.task_id):
+            self.engine.wait()
+
+class InstrumentedBatchEngine(InstrumentedEngine):
+    """Records the calls to the engine of a task that implements fetch_many"""
+
+    def fetch_many(self, server_url, item_ids):
+        with self.metrics.timer("fetch_many", self.task_id):
+            data_points = list(self.engine.fetch_many(server_url, item_ids))
+
+        count_fetched(self.metrics, self.task_id, data_points)
+        return data_points
+
+class InstrumentedAsyncEngine(AsyncEngine):
+    """Records the calls to the asynchronous engine of a task"""
+
+    wraps_engine = True
+
+    def __init__(self, engine, metrics, task_id):
+        self.engine = engine
+        self.metrics = metrics
+        self.task_id = task_id
+
+    async def fetch(self, server_url, item_id):
+        with self.metrics.timer("fetch", self.task_id):
+            data_point = await self.engine.fetch(server_url, item_id)
+
+        count_fetched(self.metrics, self.task_id, [data_point])
+        return data_point
+
+    def compare(self, latest_data_point, history):
+        with self.metrics.timer("compare", self.task_id):
+            return self.engine.compare(latest_data_point, history)
+
+    def use_states(self, states):
+        self.engine.use_states(states)
+
+    def use_timeout(self, timeout):
+        self.engine.use_timeout(timeout)
+
+    async def wait(self):
+        with self.metrics.timer("wait", self.task_id):
+            await self.engine.wait()
+
+class InstrumentedAsyncBatchEngine(InstrumentedAsyncEngine):
+    """Records the calls to the asynchronous engine of a task that implements
+    fetch_many"""
+
+    async def fetch_many(self, server_url, item_ids):
+        with self.metrics.timer("fetch_many", self.task_id):
+            data_points = list(await self.engine.fetch_many(server_url, item_ids))
+
+        count_fetched(self.metrics, self.task_id, data_points)
+        return data_points
+
+def instrumented(engine, metrics, task_id):
+    """Returns an engine that records the calls to an engine (or AsyncEngine)"""
+    if isinstance(engine, AsyncEngine):
+        if implements(engine, "fetch_many"):
+            return InstrumentedAsyncBatchEngine(engine, metrics, task_id)
+        else:
+            return InstrumentedAsyncEngine(engine, metrics, task_id)
+    elif implements(engine, "fetch_many"):
+        return InstrumentedBatchEngine(engine, metrics, task_id)
+    else:
+        return InstrumentedEngine(engine, metrics, task_id)
@@ -0,0 +1,154 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import array
+import collections
+import collections.abc
+
+from decimal import Decimal
+from main.history import RingBuffer
+
+def decode_decimal(value):
+    # the shortest representation of the double gives back the original decimal
+    # as long as it had at most 15 significant digits, without its trailing zeros
+    return Decimal(repr(value))
+
+# the types of numeric data points a table can hold, with the functions that
+# turn them into doubles and back
+NUMERIC_TYPES = {
+    "float": (float, float),
+    "int": (float, int),
+    "decimal": (float, decode_decimal),
+}
+
+class NumericHistory(RingBuffer):
+    """The history of a single item, as a view of a row of a NumericHistoryTable"""
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+        self.maxlen = table.capacity
+        self.offset = row * table.capacity
+
+    @property
+    def start(self):
+        return self.table.starts[self.row]
+
+    @start.setter
+    def start(self, value):
+        self.table.starts[self.row] = value
+
+    @property
+    def length(self):
+        return self.table.lengths[self.row]
+
+    @length.setter
+    def length(self, value):
+        self.table.lengths[self.row] = value
+
+    def get_slot(self, position):
+        return self.table.decode(self.table.data_points[self.offset + position])
+
+    def set_slot(self, position, data_point):
+        self.table.data_points[self.offset + position] = self.table.encode(data_point)
+
+class NumericHistoryTable(collections.abc.MutableMapping):
+    """Keeps the numeric histories of the items of a task in a contiguous array of
+    doubles, with a row for every item and a column for every history slot
+
+    Each data point takes 8 bytes instead of a boxed Python object. The table maps
+    item identifiers to NumericHistory views, so it can stand in for the items
+    dictionary of a DataStore."""
+
+    def __init__(self, capacity, numeric_type="float"):
+        """capacity (int) - the maximum history length of every item
+
+        numeric_type (string) - the type of the data points: "float", "int" (up to
+                                2**53) or "decimal" (with at most 15 significant
+                                digits, whose trailing zeros are dropped)"""
+        if capacity <= 0:
+            raise RuntimeError("Expected history capacity to be positive")
+
+        if numeric_type not in NUMERIC_TYPES:
+            raise RuntimeError("Numeric type '" + str(numeric_type) + "' not recognized")
+
+        self.capacity = capacity
+        self.numeric_type = numeric_type
+        self.rows = collections.OrderedDict()
+        self.data_points = array.array("d")
+        self.starts = array.array("l")
+        self.lengths = array.array("l")
+
+    def encode(self, data_point):
+        """Returns the double that holds a data point
+
+        Data points that a double can't hold exactly, such as decimals with more
+        than 15 significant digits or integers above 2**53, raise a RuntimeError.
+        Decimals only keep their value, so Decimal("10.50") comes back as
+        Decimal("10.5")."""
+        value = NUMERIC_TYPES[self.numeric_type][0](data_point)
+
+        # NaN never equals itself but is kept as it is
+        if value == value and self.decode(value) != data_point:
+            raise RuntimeError("Data point " + str(data_point) + " can't be kept exactly as a " +
+                               self.numeric_type + " in a numeric history")
+
+        return value
+
+    def decode(self, value):
+        return NUMERIC_TYPES[self.numeric_type][1](value)
+
+    def __getitem__(self, item_id):
+        return NumericHistory(self, self.rows[item_id])
+
+    def __setitem__(self, item_id, history):
+        # copy the data points first, in case the history is a view of this row
+        data_points = list(history)[-self.capacity:]
+
+        if item_id not in self.rows:
+            self.rows[item_id] = len(self.rows)
+            self.data_points.extend([0.0] * self.capacity)
+            self.starts.append(0)
+            self.lengths.append(0)
+
+        row = NumericHistory(self, self.rows[item_id])
+        row.start = 0
+        row.length = 0
+
+        for data_point in data_points:
+            row.append(data_point)
+
+    def __delitem__(self, item_id):
+        row = self.rows.pop(item_id)
+
+        del self.data_points[row * self.capacity:(row + 1) * self.capacity]
+        del self.starts[row]
+        del self.lengths[row]
+
+        # the rows after the deleted one moved up
+        for item in self.rows:
+            if self.rows[item] > row:
+                self.rows[item] -= 1
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __repr__(self):
+        return "NumericHistoryTable(" + repr(dict(self.items())) + ")"
@@ -0,0 +1,326 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import queue
+import logging
+import threading
+
+from main.interfaces import NOT_MODIFIED, implements
+
+# the value of an item that was skipped or failed, which keeps its history
+SKIPPED = object()
+
+# the end of the items of a stage
+STOP = object()
+
+class Cancelled(Exception):
+    """Raised in the threads of a pipeline when it stops early"""
+    pass
+
+class Failed():
+    """The value of an item whose compare stage raised an exception, raised again
+    by the record stage"""
+
+    def __init__(self, error):
+        self.error = error
+
+class Pipeline():
+    """Runs the items of a task through separate stages, connected by bounded queues
+
+    The "fetch" stage runs on the task's workers, and the "parse" and "compare"
+    stages on their own threads, so that waiting on the network, parsing and
+    comparing overlap. The "record" stage appends the data points to the histories
+    on the calling thread and the "notify" stage adds them to the notifier on a
+    thread of its own; both keep the order of the items. The calling thread also
+    feeds the batches to the fetch stage along with the histories of their items,
+    so that only it uses the data store (SQLite connections can't be shared by
+    threads).
+
+    Items are only parsed in their own stage for engines that implement fetch_raw()
+    and parse_raw(); other engines parse as part of their fetch. At most window
+    items are between the fetch and record stages at any time, so a slow stage
+    holds up the ones before it instead of piling up items."""
+
+    def __init__(self, agent, notifier, engine, fetch_workers, parse_workers,
+                 compare_workers, window):
+        """agent (Agent) - the agent of the task, whose data store is updated
+
+        notifier (Notifier) - the notifier of the task
+
+        engine (Engine) - the engine of the task
+
+        fetch_workers (int) - the number of threads fetching items
+
+        parse_workers (int) - the number of threads parsing raw responses
+
+        compare_workers (int) - the number of threads comparing data points to the
+            item histories
+
+        window (int) - the most items between the fetch and record stages"""
+        self.agent = agent
+        self.notifier = notifier
+        self.engine = engine
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.compare_workers = compare_workers
+        self.window = window
+        self.raw = implements(engine, "fetch_raw") and implements(engine, "parse_raw")
+        self.cancelled = threading.Event()
+        self.threads = []
+        self.errors = []
+
+    def put(self, q, value):
+        """Puts a value on a queue, waiting for room unless the pipeline stops"""
+        while True:
+            if self.cancelled.is_set():
+                raise Cancelled()
+            try:
+                q.put(value, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def get(self, q):
+        """Gets a value from a queue, waiting for one unless the pipeline stops"""
+        while True:
+            if self.cancelled.is_set():
+                raise Cancelled()
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+    def spawn(self, name, workers, work, stop=None):
+        """Starts the threads of a stage, which all call work(); once they are done,
+        the last one calls stop() to tell the next stage. An exception stops the
+        whole pipeline and is raised again by run()."""
+        remaining = [workers]
+        lock = threading.Lock()
+
+        def run():
+            try:
+                work()
+
+                # the last thread of the stage tells the next stage it is done
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+
+                if last and stop is not None:
+                    stop()
+            except Cancelled:
+                pass
+            except Exception as e:
+                self.errors.append(e)
+                self.cancelled.set()
+
+        for i in range(workers):
+            thread = threading.Thread(target=run, name="horus-" + name, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stage(self, inbox, outbox, function, indexed=False):
+        """Returns the work of a stage that applies a function to the values of
+        (index, item_id, value) tuples, passing skipped items on as they are; an
+        indexed function is passed the index as well"""
+
+        def work():
+            while True:
+                entry = self.get(inbox)
+
+                if entry is STOP:
+                    # let the other threads of the stage see it too
+                    self.put(inbox, STOP)
+                    return
+
+                index, item, value = entry
+
+                if value is not SKIPPED and not isinstance(value, Failed):
+                    try:
+                        if indexed:
+                            value = function(index, item, value)
+                        else:
+                            value = function(item, value)
+                    except Exception as e:
+                        value = Failed(e)
+
+                self.put(outbox, (index, item, value))
+
+        return work
+
+    def run(self, server_address, batches, history_length):
+        """Fetches, parses, compares, records and notifies every item of the batches"""
+        agent = self.agent
+        engine = self.engine
+
+        feed = queue.Queue()
+        fetched = queue.Queue(self.window)
+        parsed = queue.Queue(self.window)
+        compared = queue.Queue(self.window)
+        notifications = queue.Queue(self.window)
+
+        # the index of the first item of every batch
+        offsets = [0]
+        for batch in batches:
+            offsets.append(offsets[-1] + len(batch))
+
+        # the histories of the items between the feed and record stages, by index
+        histories = {}
+
+        def fetch():
+            while True:
+                i = self.get(feed)
+
+                if i is STOP:
+                    feed.put(STOP)
+                    return
+
+                batch = batches[i]
+
+                if not agent.can_fetch(server_address, batch):
+                    data_points = None
+                elif self.raw:
+                    data_points = self.fetch_raw(batch, server_address)
+                else:
+                    data_points = agent.fetch_batch(engine, server_address, batch)
+
+                if data_points is None:
+                    data_points = [SKIPPED] * len(batch)
+
+                for j in range(len(batch)):
+                    self.put(fetched, (offsets[i] + j, batch[j], data_points[j]))
+
+                if i < len(batches) - 1 and not all(d is SKIPPED for d in data_points):
+                    engine.wait()
+
+        def parse(item, raw):
+            if not self.raw or raw is NOT_MODIFIED:
+                return raw
+
+            try:
+                return engine.parse_raw(item, raw)
+            except Exception:
+                logging.getLogger("horus").warning(
+                    agent.data_store.task_id + ": Failed to parse " + str(item), exc_info=True)
+                agent.count("failed")
+                return SKIPPED
+
+        def compare(index, item, latest):
+            if latest is SKIPPED:
+                return latest
+
+            history = histories[index]
+            latest = agent.resolve(item, latest, history)
+            return latest, engine.compare(latest, history)
+
+        def notify():
+            while True:
+                entry = self.get(notifications)
+
+                if entry is STOP:
+                    return
+
+                self.notifier.add(entry[0], entry[1])
+
+        self.spawn("fetch", self.fetch_workers, fetch, lambda: self.put(fetched, STOP))
+        self.spawn("parse", self.parse_workers, self.stage(fetched, parsed, parse),
+                   lambda: self.put(parsed, STOP))
+        self.spawn("compare", self.compare_workers, self.stage(parsed, compared, compare, True),
+                   lambda: self.put(compared, STOP))
+        self.spawn("notify", 1, notify)
+
+        try:
+            self.record(batches, offsets, histories, feed, compared, notifications,
+                        history_length)
+            self.put(notifications, STOP)
+
+            for thread in self.threads:
+                thread.join()
+        except Cancelled:
+            pass
+        finally:
+            # stop the threads that are still waiting
+            self.cancelled.set()
+
+        if len(self.errors) > 0:
+            raise self.errors[0]
+
+    def fetch_raw(self, batch, server_address):
+        """Fetches the raw responses of a batch, or returns None if it failed"""
+        try:
+            raw = [self.engine.fetch_raw(server_address, item) for item in batch]
+        except Exception:
+            self.agent.fetch_failed(server_address, batch)
+            return None
+
+        self.agent.fetch_succeeded(server_address)
+        return raw
+
+    def record(self, batches, offsets, histories, feed, compared, notifications,
+               history_length):
+        """Feeds the batches to the fetch stage as they fit in the window, appends
+        the compared data points to the histories in the order of the items, and
+        passes those to notify on to the notify stage"""
+        data_store = self.agent.data_store
+        pending = {}
+        next_index = 0
+        next_batch = 0
+
+        # the room left in the window; it fits the largest batch so that the first
+        # items can always be recorded
+        room = max([self.window] + [len(b) for b in batches])
+
+        if len(batches) == 0:
+            feed.put(STOP)
+
+        while True:
+            while next_batch < len(batches) and len(batches[next_batch]) <= room:
+                batch = batches[next_batch]
+                room -= len(batch)
+
+                for j in range(len(batch)):
+                    histories[offsets[next_batch] + j] = data_store.get_item_history(batch[j])
+
+                feed.put(next_batch)
+                next_batch += 1
+
+                if next_batch == len(batches):
+                    feed.put(STOP)
+
+            entry = self.get(compared)
+
+            if entry is STOP:
+                break
+
+            pending[entry[0]] = entry
+
+            while next_index in pending:
+                index, item, value = pending.pop(next_index)
+                del histories[index]
+                next_index += 1
+
+                if isinstance(value, Failed):
+                    raise value.error
+
+                if value is not SKIPPED:
+                    latest, alert = value
+                    self.agent.store(item, latest, history_length, alert)
+
+                    if alert:
+                        self.put(notifications, (item, latest))
+
+                room += 1
@@ -0,0 +1,86 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+class AdaptivePolling():
+    """Decides how often to poll each item from how often its history changes
+
+    An item whose history changed between a fraction f of its consecutive data
+    points is polled about every 1/f runs, so volatile items are polled on every
+    run and items that never change only every max_interval runs. The number of
+    runs left to skip is kept in the item's state."""
+
+    def __init__(self, max_interval):
+        """max_interval (int) - the most runs between two polls of an item"""
+        if max_interval <= 0:
+            raise RuntimeError("Expected maximum polling interval to be positive")
+
+        self.max_interval = max_interval
+
+    def interval(self, history):
+        """Returns the number of runs until an item with the given history is polled again
+
+        history (iterable(object)) - the item's data points, which are only iterated
+            once, so they need not be copied into a list"""
+        pairs = -1
+        changes = 0
+        previous = None
+
+        for data_point in history:
+            if pairs >= 0 and data_point != previous:
+                changes += 1
+            previous = data_point
+            pairs += 1
+
+        # not enough history to tell, keep polling
+        if pairs <= 0:
+            return 1
+
+        if changes == 0:
+            return self.max_interval
+
+        return max(1, min(self.max_interval, pairs // changes))
+
+    def is_due(self, state):
+        """Checks if an item is polled on this run, counting down its skipped runs
+
+        state (dict) - the item's state, updated in place
+
+        Returns True if the item should be polled"""
+        skip = state.get("skip", 0)
+
+        if skip <= 0:
+            return True
+
+        if skip == 1:
+            del state["skip"]
+        else:
+            state["skip"] = skip - 1
+
+        return False
+
+    def polled(self, state, history):
+        """Schedules the next poll of an item that was just polled
+
+        state (dict) - the item's state, updated in place
+
+        history (iterable(object)) - the item's history, including the latest data point"""
+        skip = self.interval(history) - 1
+
+        if skip > 0:
+            state["skip"] = skip
+        else:
+            state.pop("skip", None)
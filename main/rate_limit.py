@@ -0,0 +1,248 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import threading
+
+from main.circuit_breaker import host_of
+from main.interfaces import Engine, implements
+
+class Throttled(RuntimeError):
+    """Raised by engines when a server asks them to slow down (e.g. with HTTP 429)
+
+    retry_after (float) - the number of seconds the server asked to wait, if any"""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def parse_retry_after(value, now=None):
+    """Returns the number of seconds of a Retry-After header, given either as a
+    number of seconds or as a HTTP date, or None if it can't be read"""
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    # only HTTP dates need the email module, which is slow to import
+    import email.utils
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    if date is None:
+        return None
+
+    return max(0.0, date.timestamp() - (time.time() if now is None else now))
+
+class HostLimiter():
+    """Paces the requests to a single host with a token bucket and a limit on the
+    requests in flight
+
+    Both the rate and the concurrency limit grow additively with every successful
+    request and are halved when the host throttles (AIMD), so they settle around
+    the highest load the host tolerates. A Retry-After delay holds every request
+    to the host until it is over."""
+
+    def __init__(self, rate, min_rate, max_rate, max_concurrency, max_wait,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.concurrency = 1.0
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.clock = clock
+        self.tokens = 1.0
+        self.updated = clock()
+        self.in_flight = 0
+        self.blocked_until = 0
+        self.condition = threading.Condition()
+
+    def refill(self, now):
+        # allow bursts of up to a second of requests
+        self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Waits until a request may be sent to the host
+
+        Raises Throttled if the host asked to wait longer than max_wait seconds"""
+        with self.condition:
+            while True:
+                now = self.clock()
+                self.refill(now)
+
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+
+                    if delay > self.max_wait:
+                        raise Throttled("Server asked to wait " + str(round(delay)) +
+                                        " seconds", delay)
+                elif self.in_flight >= int(self.concurrency):
+                    delay = None
+                elif self.tokens < 1:
+                    delay = (1 - self.tokens) / self.rate
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+
+                self.condition.wait(delay)
+
+    def release(self, succeeded, throttled=False, retry_after=None):
+        """Ends a request, adjusting the rate and concurrency to its outcome
+
+        succeeded (bool) - whether the request succeeded; failures that aren't
+            throttling leave the limits as they are
+
+        throttled (bool) - whether the host asked to slow down
+
+        retry_after (float) - the seconds the host asked to wait, if any"""
+        with self.condition:
+            self.in_flight -= 1
+
+            if throttled:
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.concurrency = max(1.0, self.concurrency / 2)
+                self.tokens = min(self.tokens, 0.0)
+
+                if retry_after is not None:
+                    self.blocked_until = max(self.blocked_until, self.clock() + retry_after)
+            elif succeeded:
+                self.rate = min(self.max_rate, self.rate + 1 / max(1.0, self.rate))
+                self.concurrency = min(self.max_concurrency,
+                                       self.concurrency + 1 / self.concurrency)
+
+            self.condition.notify_all()
+
+class RateLimiter():
+    """Keeps a HostLimiter for every host, shared by the tasks that fetch from it"""
+
+    def __init__(self, rate=1, min_rate=0.1, max_rate=100, max_concurrency=16, max_wait=60,
+                 clock=time.monotonic):
+        """rate (float) - the requests per second first sent to a host
+
+        min_rate (float) - the lowest rate a throttling host is slowed down to
+
+        max_rate (float) - the highest rate a host is sped up to
+
+        max_concurrency (int) - the most requests in flight to a host
+
+        max_wait (float) - the longest Retry-After delay that is waited for; items
+            asked to wait longer fail instead
+
+        clock (function()) - returns the current time in seconds"""
+        if rate <= 0 or min_rate <= 0 or max_rate < rate:
+            raise RuntimeError("Expected positive rates, with the rate below the maximum")
+
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.clock = clock
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def host(self, server_url):
+        """Returns the limiter of the host of a server url"""
+        host = host_of(server_url)
+
+        with self.lock:
+            limiter = self.hosts.get(host)
+
+            if limiter is None:
+                limiter = HostLimiter(self.rate, self.min_rate, self.max_rate,
+                                      self.max_concurrency, self.max_wait, self.clock)
+                self.hosts[host] = limiter
+
+        return limiter
+
+class RateLimitedEngine(Engine):
+    """Paces the fetches of an engine with a RateLimiter instead of its wait()
+
+    Fetches that the server throttles are retried, after its Retry-After delay."""
+
+    wraps_engine = True
+
+    def __init__(self, engine, limiter, retries=2):
+        self.engine = engine
+        self.limiter = limiter
+        self.retries = retries
+
+    def call(self, server_url, function, *args):
+        """Calls a fetch function once the host of the server allows it"""
+        host = self.limiter.host(server_url)
+
+        for attempt in range(self.retries + 1):
+            host.acquire()
+
+            try:
+                result = function(*args)
+            except Throttled as e:
+                host.release(False, True, e.retry_after)
+
+                if attempt == self.retries:
+                    raise
+                continue
+            except BaseException:
+                host.release(False)
+                raise
+
+            host.release(True)
+            return result
+
+    def fetch(self, server_url, item_id):
+        return self.call(server_url, self.engine.fetch, server_url, item_id)
+
+    def fetch_raw(self, server_url, item_id):
+        return self.call(server_url, self.engine.fetch_raw, server_url, item_id)
+
+    def parse_raw(self, item_id, raw):
+        return self.engine.parse_raw(item_id, raw)
+
+    def compare(self, latest_data_point, history):
+        return self.engine.compare(latest_data_point, history)
+
+    def use_states(self, states):
+        self.engine.use_states(states)
+
+    def use_timeout(self, timeout):
+        self.engine.use_timeout(timeout)
+
+    def wait(self):
+        # the limiter paces the requests
+        pass
+
+class RateLimitedBatchEngine(RateLimitedEngine):
+    """Paces the fetches of an engine that implements fetch_many"""
+
+    def fetch_many(self, server_url, item_ids):
+        return self.call(server_url, self.engine.fetch_many, server_url, item_ids)
+
+def limited(engine, limiter):
+    """Returns an engine that paces the fetches of an engine with a rate limiter"""
+    if implements(engine, "fetch_many"):
+        return RateLimitedBatchEngine(engine, limiter)
+    else:
+        return RateLimitedEngine(engine, limiter)
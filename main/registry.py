@@ -0,0 +1,155 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import builtins
+import importlib
+import threading
+
+# the entry point group searched for the plugins of each kind
+GROUPS = {"engine": "horus.engines", "notifier": "horus.notifiers", "codec": "horus.codecs"}
+
+def find_entry_point(group, name):
+    """Returns the object of an installed entry point, or None if there is none"""
+    try:
+        from importlib import metadata
+    except ImportError:
+        metadata = None
+
+    if metadata is not None:
+        entry_points = metadata.entry_points()
+
+        if hasattr(entry_points, "select"):
+            matches = entry_points.select(group=group, name=name)
+        else:
+            matches = [e for e in entry_points.get(group, ()) if e.name == name]
+    else:
+        import pkg_resources
+        matches = pkg_resources.iter_entry_points(group, name)
+
+    for entry_point in matches:
+        return entry_point.load()
+
+    return None
+
+def load_plugin(name, group):
+    """Imports the object a plugin name refers to
+
+    name (string) - either a dotted path ("package.module.Name"), a module and an
+        attribute path separated by a colon ("package.module:Outer.Name"), or the
+        name of an entry point of the group; names that are neither can be builtins
+        such as "int"
+
+    group (string) - the entry point group of the plugin kind
+
+    Returns the object"""
+    if ":" in name:
+        module_name, attributes = name.split(":", 1)
+    elif "." in name:
+        module_name, attributes = name.rsplit(".", 1)
+    else:
+        plugin = find_entry_point(group, name)
+
+        if plugin is None:
+            plugin = getattr(builtins, name, None)
+
+        if plugin is None:
+            raise RuntimeError("Plugin '" + name + "' not found in entry points '" + group + "'")
+
+        return plugin
+
+    plugin = importlib.import_module(module_name)
+
+    for attribute in attributes.split("."):
+        if not hasattr(plugin, attribute):
+            raise RuntimeError("Plugin '" + name + "' not found")
+        plugin = getattr(plugin, attribute)
+
+    return plugin
+
+class Registry():
+    """Finds the engine, notifier and codec of each task from its configuration
+
+    A task names its plugins with its "engine", "notifier" and "codec" keys, and can
+    pass keyword arguments to the engine and notifier with the "engine_options" and
+    "notifier_options" keys. Plugins are only imported when a task first uses them,
+    and each one is imported once.
+
+    A codec is either an object with serialize(data) and deserialize(string)
+    functions, or a type such as "decimal.Decimal" that is called to deserialize
+    and serialized with str()."""
+
+    def __init__(self):
+        self.tasks = {}
+
+        # (kind, name) -> plugin, as the same name may be an entry point of
+        # several groups
+        self.plugins = {}
+        self.codecs = {}
+        self.lock = threading.Lock()
+
+    def configure(self, task_id, keys):
+        """Remembers the plugin names of a task without importing them
+
+        keys (dict) - the configuration keys of the task"""
+        with self.lock:
+            self.tasks[task_id] = keys
+            self.codecs.pop(task_id, None)
+
+    def has(self, task_id, kind):
+        """Tells if a task names a plugin of a kind ("engine", "notifier" or "codec")"""
+        return kind in self.tasks.get(task_id, {})
+
+    def plugin(self, task_id, kind):
+        """Returns the object a task names for a plugin kind, importing it if needed"""
+        if not self.has(task_id, kind):
+            raise RuntimeError(task_id + ": No " + kind + " configured")
+
+        name = self.tasks[task_id][kind]
+
+        with self.lock:
+            if (kind, name) not in self.plugins:
+                self.plugins[(kind, name)] = load_plugin(name, GROUPS[kind])
+
+            return self.plugins[(kind, name)]
+
+    def create(self, task_id, kind):
+        """Returns a new engine or notifier for a task"""
+        options = self.tasks.get(task_id, {}).get(kind + "_options", {})
+
+        return self.plugin(task_id, kind)(**options)
+
+    def codec(self, task_id):
+        """Returns the (serialize, deserialize) functions of a task"""
+        codec = self.codecs.get(task_id)
+
+        if codec is None:
+            plugin = self.plugin(task_id, "codec")
+
+            if hasattr(plugin, "serialize") and hasattr(plugin, "deserialize"):
+                codec = (plugin.serialize, plugin.deserialize)
+            else:
+                codec = (str, plugin)
+
+            self.codecs[task_id] = codec
+
+        return codec
+
+    def serialize(self, task_id, data):
+        return self.codec(task_id)[0](data)
+
+    def deserialize(self, task_id, data):
+        return self.codec(task_id)[1](data)
@@ -0,0 +1,74 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import heapq
+import itertools
+import time
+
+class Scheduler():
+    """Runs functions repeatedly, each on its own interval"""
+
+    def __init__(self, clock=time.monotonic):
+        """clock (function()) - returns the current time in seconds"""
+        self.clock = clock
+        self.queue = []
+        self.counter = itertools.count()
+
+    def add(self, interval, function, delay=0):
+        """Schedules a function to be called every interval seconds
+
+        interval (float) - the number of seconds between the starts of two calls
+
+        function (function()) - the function to call
+
+        delay (float) - the number of seconds before the first call"""
+        if interval <= 0:
+            raise RuntimeError("Expected scheduling interval to be positive")
+
+        heapq.heappush(self.queue, (self.clock() + delay, next(self.counter), interval, function))
+
+    def run_pending(self):
+        """Calls every function that is due, then schedules its next call
+
+        A call that runs late is not repeated to catch up; the next one is
+        scheduled an interval after the time it was due, or an interval after now
+        if that time has already passed.
+
+        Returns the number of seconds until the next function is due"""
+        while len(self.queue) > 0 and self.queue[0][0] <= self.clock():
+            due, n, interval, function = heapq.heappop(self.queue)
+
+            try:
+                function()
+            finally:
+                due += interval
+                if due <= self.clock():
+                    due = self.clock() + interval
+
+                heapq.heappush(self.queue, (due, next(self.counter), interval, function))
+
+        if len(self.queue) == 0:
+            return None
+
+        return max(0, self.queue[0][0] - self.clock())
+
+    def run(self, stopped):
+        """Calls the functions when they are due until an event is set
+
+        stopped (threading.Event) - the event that stops the scheduler"""
+        while not stopped.is_set():
+            stopped.wait(self.run_pending())
@@ -0,0 +1,196 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import collections
+import json
+import sqlite3
+
+from main.data_store import DataStore
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    keys TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    task_id TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    history TEXT NOT NULL,
+    state TEXT,
+    PRIMARY KEY (task_id, item_id)
+);
+CREATE INDEX IF NOT EXISTS items_by_position ON items (task_id, position);
+"""
+
+def connect(database_filename):
+    """Opens a database of data stores, creating its tables if needed
+
+    database_filename (string) - the path to the SQLite database file
+
+    Returns the sqlite3 connection"""
+    connection = sqlite3.connect(database_filename)
+    connection.executescript(SCHEMA)
+
+    return connection
+
+def import_config(connection, config_filename):
+    """Copies the tasks of a configuration file into a database, replacing the tasks
+    with the same identifiers. Data points are copied as they are serialized.
+
+    connection (sqlite3.Connection) - the database connection
+
+    config_filename (string) - the path to the configuration file"""
+    with open(config_filename, "r") as fp:
+        json_data = json.load(fp, object_pairs_hook=collections.OrderedDict)
+
+    with connection:
+        for task_position, task in enumerate(json_data):
+            col = json_data[task]
+            keys = collections.OrderedDict((k, col[k]) for k in col
+                                           if k not in ("items", "states"))
+            items = col.get("items", {})
+            states = col.get("states", {})
+
+            connection.execute("DELETE FROM items WHERE task_id = ?", (task,))
+            connection.execute("INSERT OR REPLACE INTO tasks VALUES (?, ?, ?)",
+                               (task, task_position, json.dumps(keys)))
+
+            for position, item in enumerate(items):
+                state = json.dumps(states[item]) if item in states else None
+                connection.execute("INSERT INTO items VALUES (?, ?, ?, ?, ?)",
+                                   (task, item, position, json.dumps(items[item]), state))
+
+def load_stores(connection, data_serializer, data_deserializer):
+    """Returns a data store for each task of a database, in order"""
+    rows = connection.execute("SELECT task_id FROM tasks ORDER BY position").fetchall()
+
+    return [SqliteDataStore(connection, row[0], data_serializer, data_deserializer)
+            for row in rows]
+
+class SqliteDataStore(DataStore):
+    """Contains the data storage of a single task, kept in a SQLite database
+
+    Item histories are read from the database when they are first asked for, and
+    every change to an item's history is written in its own transaction, so a run
+    only touches the rows of the items it uses and nothing needs to be saved at the
+    end of a run."""
+
+    def __init__(self, connection, task_id, data_serializer, data_deserializer):
+        """connection (sqlite3.Connection) - the database connection
+
+        task_id (string) - the task identifier
+
+        data_serializer (function(string, object)) - a function that serializes
+            a data point of the task
+
+        data_deserializer (function(string, string)) - a function that
+            deserializes a data string of the task"""
+        super().__init__(task_id)
+
+        self.connection = connection
+        self.data_serializer = data_serializer
+        self.data_deserializer = data_deserializer
+        self.histories = {}
+
+        row = connection.execute("SELECT keys FROM tasks WHERE task_id = ?",
+                                 (task_id,)).fetchone()
+
+        if row is None:
+            raise KeyError("Task '" + task_id + "' not found in the database")
+
+        self.keys = json.loads(row[0], object_pairs_hook=collections.OrderedDict)
+
+    def __eq__(self, other):
+        if self.task_id != other.task_id or self.keys != other.keys or \
+                self.get_item_ids() != other.get_item_ids() or \
+                self.get_item_states() != other.get_item_states():
+            return False
+
+        return all(self.get_item_history(i) == other.get_item_history(i)
+                   for i in self.get_item_ids())
+
+    def get_item_ids(self):
+        rows = self.connection.execute("SELECT item_id FROM items WHERE task_id = ? "
+                                       "ORDER BY position", (self.task_id,))
+        return [row[0] for row in rows]
+
+    def get_item_history(self, item_id):
+        if item_id not in self.histories:
+            row = self.connection.execute("SELECT history FROM items WHERE task_id = ? "
+                                          "AND item_id = ?", (self.task_id, item_id)).fetchone()
+
+            if row is None:
+                raise KeyError("Item '" + item_id + "' not found for task '" +
+                               self.task_id + "'")
+
+            self.histories[item_id] = [self.data_deserializer(self.task_id, k)
+                                       for k in json.loads(row[0])]
+
+        return self.histories[item_id]
+
+    def set_item_history(self, item_id, history):
+        old_history = self.get_item_history(item_id)
+
+        # quick check that data types don't change
+        if len(old_history) > 0 and len(history) > 0:
+            assert type(old_history[-1]) == type(history[-1])
+
+        history = list(history)
+        serialized = json.dumps([self.data_serializer(self.task_id, k) for k in history])
+
+        # the item state changes along with its history (e.g. cache validators)
+        state = self.get_item_states().get(item_id)
+        if state is not None:
+            state = json.dumps(state)
+
+        with self.connection:
+            self.connection.execute("UPDATE items SET history = ?, state = ? "
+                                    "WHERE task_id = ? AND item_id = ?",
+                                    (serialized, state, self.task_id, item_id))
+
+        self.histories[item_id] = history
+        self.modified = True
+
+    def set_item_state(self, item_id, state):
+        serialized = json.dumps(state) if len(state) > 0 else None
+
+        with self.connection:
+            cursor = self.connection.execute("UPDATE items SET state = ? "
+                                             "WHERE task_id = ? AND item_id = ?",
+                                             (serialized, self.task_id, item_id))
+
+        if cursor.rowcount == 0:
+            raise KeyError("Item '" + item_id + "' not found for task '" +
+                           self.task_id + "'")
+
+        if len(state) > 0:
+            self.get_item_states()[item_id] = state
+        else:
+            self.get_item_states().pop(item_id, None)
+
+        self.modified = True
+
+    def get_item_states(self):
+        if self.states is None:
+            rows = self.connection.execute("SELECT item_id, state FROM items WHERE task_id = ? "
+                                           "AND state IS NOT NULL ORDER BY position",
+                                           (self.task_id,))
+            self.states = collections.OrderedDict((row[0], json.loads(row[1])) for row in rows)
+
+        return self.states
@@ -0,0 +1,55 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+"""The data stores, engines and notifiers shared by the tests of the agents"""
+
+from main.data_store import DataStore
+from main.http_engine import HttpEngine
+from main.interfaces import Notifier
+
+def make_store(items, history=(200,), data_store=None, **keys):
+    """Returns the data store of a task named "TEST" on localhost
+
+    items (list(string)) - the ids of the task's items
+
+    history (list(object)) - the history every item starts with
+
+    data_store (DataStore) - if given, the data store to fill in instead of a new one
+
+    keys - the configuration keys of the task, besides its server and history length"""
+    data_store = DataStore("TEST") if data_store is None else data_store
+    data_store.keys = {"server_url": "localhost", "max_history_length": 2}
+    data_store.keys.update(keys)
+    data_store.items = {item: list(history) for item in items}
+    return data_store
+
+class PriceEngine(HttpEngine):
+    """Fetches integer prices over HTTP and never notifies"""
+
+    def parse(self, response):
+        return int(response.text)
+
+    def compare(self, latest_data_point, history):
+        return False
+
+class SilentNotifier(Notifier):
+
+    def add(self, item_id, latest_data_point):
+        pass
+
+    def alert(self):
+        pass
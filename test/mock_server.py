@@ -0,0 +1,251 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+"""The mock server for end to end and load tests
+
+Serves item payloads from a directory or makes them up for any item path, with a
+configurable latency, jitter, error rate, rate limit and ETag validation. The
+server runs on a pool of threads, and is ready as soon as start() returns.
+
+Run as a script, it prints "READY <port>" once it is listening."""
+
+import os
+import sys
+import time
+import random
+import hashlib
+import argparse
+import threading
+import collections
+import http.server
+import socketserver
+
+class ThreadingServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients that hang up early, such as fetches that timed out, are no errors
+        # of the server
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+
+        super().handle_error(request, client_address)
+
+def make_payload(path):
+    """Returns the default payload of an item path, a price between 100 and 199"""
+    return str(100 + sum(path.encode()) % 100)
+
+class MockServer():
+    """A threaded HTTP server that answers requests for any item"""
+
+    def __init__(self, address="127.0.0.1", port=0, directory=None, payload=make_payload,
+                 latency=0, jitter=0, error_rate=0, rate_limit=None, retry_after=1,
+                 etags=True, seed=None):
+        """address (string) - the address to listen on
+
+        port (int) - the port to listen on, or 0 for any free port
+
+        directory (string) - if given, item paths are files of this directory, and
+            the server answers 404 for missing ones
+
+        payload (function(string)) - otherwise, returns the payload of an item path
+
+        latency (float) - seconds to wait before answering a request
+
+        jitter (float) - up to this many more seconds to wait, at random
+
+        error_rate (float) - the fraction of requests answered with 500
+
+        rate_limit (int) - if given, the number of requests answered every second;
+            the others get 429 with a Retry-After header
+
+        retry_after (int) - the seconds sent in the Retry-After header
+
+        etags (bool) - whether responses carry an ETag and requests with a matching
+            If-None-Match get 304
+
+        seed (int) - the seed of the random errors and jitter"""
+        self.address = address
+        self.port = port
+        self.directory = directory
+        self.payload = payload
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.etags = etags
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.server = None
+        self.thread = None
+
+        # the number of responses sent with each status code
+        self.statuses = collections.Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.window = (0, 0)
+
+    @property
+    def url(self):
+        """The server url, as set in the configuration of tasks"""
+        return self.address + ":" + str(self.port)
+
+    def start(self):
+        """Starts answering requests on a background thread; the server is ready
+        once this returns"""
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                server.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingServer((self.address, self.port), Handler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        return self
+
+    def stop(self):
+        """Stops the server and closes its socket"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def limited(self):
+        """Tells if a request goes over the rate limit of the current second"""
+        if self.rate_limit is None:
+            return False
+
+        second = int(time.monotonic())
+        start, count = self.window
+
+        if start != second:
+            start, count = second, 0
+
+        self.window = (start, count + 1)
+
+        return count >= self.rate_limit
+
+    def read(self, path):
+        """Returns the payload of a path, or None if there is none; paths that lead
+        out of the directory have none"""
+        if self.directory is None:
+            return self.payload(path)
+
+        directory = os.path.realpath(self.directory)
+        filename = os.path.realpath(os.path.join(directory, path.lstrip("/")))
+
+        if os.path.commonpath([directory, filename]) != directory or \
+                not os.path.isfile(filename):
+            return None
+
+        with open(filename) as fp:
+            return fp.read()
+
+    def handle(self, request):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+            limited = self.limited()
+
+        status = 500
+
+        try:
+            if delay > 0:
+                time.sleep(delay)
+
+            headers = {}
+            body = None
+
+            if limited:
+                status = 429
+                headers["Retry-After"] = str(self.retry_after)
+            elif failed:
+                status = 500
+            else:
+                body = self.read(request.path)
+
+                if body is None:
+                    status = 404
+                else:
+                    status = 200
+
+                    if self.etags:
+                        etag = '"' + hashlib.sha1(body.encode()).hexdigest()[:16] + '"'
+                        headers["ETag"] = etag
+
+                        if request.headers.get("If-None-Match") == etag:
+                            status = 304
+                            body = None
+
+            data = b"" if body is None else body.encode()
+
+            request.send_response(status)
+            for name in headers:
+                request.send_header(name, headers[name])
+            request.send_header("Content-Type", "text/plain")
+            if status != 304:
+                request.send_header("Content-Length", str(len(data)))
+            request.end_headers()
+            request.wfile.write(data)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+                self.statuses[status] += 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the mock server")
+    parser.add_argument("port", type=int, nargs="?", default=8000)
+    parser.add_argument("--directory", help="serve the files of this directory")
+    parser.add_argument("--latency", type=float, default=0)
+    parser.add_argument("--jitter", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--rate-limit", type=int)
+    parser.add_argument("--seed", type=int, help="the seed of the random errors and jitter")
+    args = parser.parse_args(argv)
+
+    server = MockServer(port=args.port, directory=args.directory, latency=args.latency,
+                        jitter=args.jitter, error_rate=args.error_rate,
+                        rate_limit=args.rate_limit, seed=args.seed).start()
+
+    print("READY " + str(server.port))
+    sys.stdout.flush()
+
+    try:
+        server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -16,7 +16,6 @@
 #     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
 
 import unittest
-import subprocess
 import requests
 import os
 import time
@@ -25,6 +24,7 @@ from horus import load_config, save_config
 from decimal import Decimal
 from main.agent import Agent
 from main.interfaces import Notifier, Engine
+from test.mock_server import MockServer
 
 
 class TestNotifier(Notifier):
@@ -91,23 +91,14 @@ class TestDummyServerMultipleStores(unittest.TestCase):
     """Tests the fetching of multiple items from multiple data stores from the server."""
 
     def setUp(self):
-        # start the first mock http server
-        command = ["python", "./test/dummy_server.py", "9000"]
-        self.process1 = subprocess.Popen(command)
-
-        # start the second mock http server
-        command = ["python", "./test/dummy_server.py", "9001"]
-        self.process2 = subprocess.Popen(command)
-
-        # wait till dummy servers stabilize
-        time.sleep(5)
+        # start the mock http servers; they are ready once started
+        self.server1 = MockServer(port=9000, directory="./test/files").start()
+        self.server2 = MockServer(port=9001, directory="./test/files").start()
 
     def tearDown(self):
         # shutdown the HTTP servers
-        self.process1.terminate()
-        self.process1.wait()
-        self.process2.terminate()
-        self.process2.wait()
+        self.server1.stop()
+        self.server2.stop()
 
     def test_execution(self):
         """Tests the execution of the system by reading a configuration file, fetching
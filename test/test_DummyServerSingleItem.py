@@ -16,7 +16,6 @@
 #     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
 
 import unittest
-import subprocess
 import requests
 import time
 
@@ -24,6 +23,7 @@ from decimal import Decimal
 from main.data_store import DataStore
 from main.interfaces import Notifier, Engine
 from main.agent import Agent
+from test.mock_server import MockServer
 
 
 class TestDummyServerSingleItem(unittest.TestCase):
@@ -90,17 +90,12 @@ class TestDummyServerSingleItem(unittest.TestCase):
             time.sleep(5)
 
     def setUp(self):
-        # start the mock http server
-        command = ["python", "./test/dummy_server.py"]
-        self.process = subprocess.Popen(command)
-
-        # wait till dummy server stabilizes
-        time.sleep(5)
+        # start the mock http server; it is ready once started
+        self.server = MockServer(port=8000, directory="./test/files").start()
 
     def tearDown(self):
         # shutdown the HTTP server
-        self.process.terminate()
-        self.process.wait()
+        self.server.stop()
 
     def test_execution(self):
         """This end to end test starts a mock server, requests an item from it
@@ -20,7 +20,7 @@ import time
 
 from decimal import Decimal
 from main.data_store import DataStore
-from main.interfaces import Notifier, Engine
+from main.interfaces import Notifier, Engine, NOT_MODIFIED
 from main.agent import Agent
 
 class TestAgent(unittest.TestCase):
@@ -254,6 +254,156 @@ class TestAgent(unittest.TestCase):
         self.assertTrue(notifier.notified)
         self.assertTrue(len(notifier.messages) == 0)
 
+    def test_not_modified_reuses_last_data_point(self):
+        """Tests that an item the server reports as not modified repeats its last data point"""
+
+        class LocalEngine(self.TestEngine):
+
+            def fetch(self, server_url, item_id):
+                return NOT_MODIFIED
+
+        notifier = self.TestNotifier()
+        data_store = self.FakeDataStore()
+        agent = Agent(data_store)
+
+        agent.execute(notifier, LocalEngine())
+
+        self.assertEqual(data_store.get_item_history("item1.html"), [Decimal(500), Decimal(500)])
+        self.assertEqual(len(notifier.messages), 0)
+
+    def test_concurrent_items_keep_order(self):
+        """Tests that fetching items with several workers gives the same results as
+        fetching them one after the other"""
+
+        item_ids = ["item" + str(i) + ".html" for i in range(8)]
+
+        class LocalDataStore(self.FakeDataStore):
+
+            def __init__(self):
+                self.modified = False
+                self.histories = {i: [Decimal(500)] for i in item_ids}
+
+            def get_config_value(self, key):
+                if key == "workers":
+                    return 4
+                else:
+                    return super().get_config_value(key)
+
+            def get_item_ids(self):
+                return list(item_ids)
+
+            def get_item_history(self, id):
+                return self.histories[id]
+
+            def set_item_history(self, key, history):
+                self.modified = True
+                self.histories[key] = history
+
+        class LocalEngine(self.TestEngine):
+
+            def fetch(self, server_url, item_id):
+                # finish the first items last
+                index = item_ids.index(item_id)
+                time.sleep(0.01 * (len(item_ids) - index))
+                return Decimal(400 + index * 20)
+
+            def wait(self):
+                pass
+
+        notifier = self.TestNotifier()
+        data_store = LocalDataStore()
+        agent = Agent(data_store)
+
+        agent.execute(notifier, LocalEngine())
+
+        for i in range(len(item_ids)):
+            history = data_store.get_item_history(item_ids[i])
+            self.assertEqual(history, [Decimal(500), Decimal(400 + i * 20)])
+
+        # only the prices below 500 are drops, in the order of the items
+        expected = ["item id '" + item_ids[i] + "' price dropped to " + str(400 + i * 20)
+                    for i in range(5)]
+        self.assertEqual(notifier.messages, expected)
+        self.assertTrue(notifier.notified)
+
+    def test_batch_fetch(self):
+        """Tests that engines implementing fetch_many get batches of items"""
+
+        item_ids = ["item" + str(i) + ".html" for i in range(7)]
+
+        class LocalDataStore(self.FakeDataStore):
+
+            def __init__(self, batch_size):
+                super().__init__()
+                self.batch_size = batch_size
+                self.histories = {i: [Decimal(500)] for i in item_ids}
+
+            def get_config_value(self, key):
+                if key == "batch_size":
+                    return self.batch_size
+                else:
+                    return super().get_config_value(key)
+
+            def get_item_ids(self):
+                return list(item_ids)
+
+            def get_item_history(self, id):
+                return self.histories[id]
+
+            def set_item_history(self, key, history):
+                self.modified = True
+                self.histories[key] = history
+
+        class LocalEngine(self.TestEngine):
+
+            def __init__(self):
+                self.batches = []
+                self.waits = 0
+
+            def fetch(self, server_url, item_id):
+                assert False
+
+            def fetch_many(self, server_url, item_ids):
+                self.batches.append(item_ids)
+                return [Decimal(item_ids.index(i) + 1) for i in item_ids]
+
+            def wait(self):
+                self.waits += 1
+
+        engine = LocalEngine()
+        data_store = LocalDataStore(3)
+
+        Agent(data_store).execute(self.TestNotifier(), engine)
+
+        self.assertEqual(engine.batches, [item_ids[0:3], item_ids[3:6], item_ids[6:7]])
+        self.assertEqual(engine.waits, 2)
+        self.assertEqual(data_store.get_item_history("item4.html"), [Decimal(500), Decimal(2)])
+
+        # a batch engine has to return a data point for every item
+        class ShortEngine(LocalEngine):
+
+            def fetch_many(self, server_url, item_ids):
+                return []
+
+        with self.assertRaises(RuntimeError):
+            Agent(LocalDataStore(3)).execute(self.TestNotifier(), ShortEngine())
+
+    def test_invalid_worker_count(self):
+        """Tests what happens if the agent is given an invalid number of workers"""
+
+        class LocalDataStore(self.FakeDataStore):
+
+            def get_config_value(self, key):
+                if key == "workers":
+                    return 0
+                else:
+                    return super().get_config_value(key)
+
+        agent = Agent(LocalDataStore())
+
+        with self.assertRaises(RuntimeError):
+            agent.execute(self.TestNotifier(), self.TestEngine())
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,167 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import asyncio
+import time
+
+from decimal import Decimal
+from main.data_store import DataStore
+from main.interfaces import Notifier, Engine, AsyncEngine
+from main.async_agent import AsyncAgent, EngineAdapter, execute_all
+
+class TestAsyncAgent(unittest.TestCase):
+    """Tests the asynchronous agent class"""
+
+    class FakeDataStore(DataStore):
+        def __init__(self, task_id="ASYNC_AGENT_TEST", workers=1):
+            self.task_id = task_id
+            self.workers = workers
+            self.histories = {"item1.html": [Decimal(500)], "item2.html": [Decimal(1000)]}
+            self.modified = False
+
+        def get_config_value(self, key):
+            if key == "server_url":
+                return "localhost"
+            elif key == "max_history_length":
+                return 2
+            elif key == "workers":
+                return self.workers
+            else:
+                raise KeyError("Configuration value '" + key + "' not mocked")
+
+        def get_item_ids(self):
+            return ["item1.html", "item2.html"]
+
+        def get_item_history(self, id):
+            return self.histories[id]
+
+        def set_item_history(self, key, history):
+            self.modified = True
+            self.histories[key] = history
+
+    class TestAsyncEngine(AsyncEngine):
+
+        def __init__(self):
+            self.waits = 0
+
+        async def fetch(self, server_url, item_id):
+            await asyncio.sleep(0.2)
+            if item_id == "item1.html":
+                return Decimal(385)
+            return Decimal(1001)
+
+        def compare(self, latest_data_point, history):
+            return latest_data_point < history[-1]
+
+        async def wait(self):
+            self.waits += 1
+
+    class TestEngine(Engine):
+
+        def fetch(self, server_url, item_id):
+            return Decimal(385)
+
+        def compare(self, latest_data_point, history):
+            return latest_data_point < history[-1]
+
+        def wait(self):
+            pass
+
+    class TestNotifier(Notifier):
+
+        def __init__(self):
+            self.messages = []
+            self.notified = False
+
+        def add(self, item_id, latest_data_point):
+            self.messages.append(item_id)
+
+        def alert(self):
+            self.notified = True
+
+    def run_loop(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_async_engine(self):
+        """Tests that an agent updates histories and notifies with an asynchronous engine"""
+        data_store = self.FakeDataStore()
+        notifier = self.TestNotifier()
+        engine = self.TestAsyncEngine()
+
+        self.run_loop(AsyncAgent(data_store).execute(notifier, engine))
+
+        self.assertEqual(data_store.get_item_history("item1.html"), [Decimal(500), Decimal(385)])
+        self.assertEqual(data_store.get_item_history("item2.html"), [Decimal(1000), Decimal(1001)])
+        self.assertEqual(notifier.messages, ["item1.html"])
+        self.assertTrue(notifier.notified)
+        self.assertEqual(engine.waits, 1)
+
+    def test_sync_engine_adapter(self):
+        """Tests that synchronous engines keep working through the adapter"""
+        data_store = self.FakeDataStore()
+        notifier = self.TestNotifier()
+
+        self.run_loop(AsyncAgent(data_store).execute(notifier, self.TestEngine()))
+
+        self.assertEqual(data_store.get_item_history("item2.html"), [Decimal(1000), Decimal(385)])
+        self.assertEqual(notifier.messages, ["item1.html", "item2.html"])
+        self.assertTrue(isinstance(EngineAdapter(self.TestEngine()), AsyncEngine))
+
+    def test_sync_batch_engine_adapter(self):
+        """Tests that synchronous engines implementing fetch_many are used in batches"""
+
+        class LocalEngine(self.TestEngine):
+
+            def __init__(self):
+                self.batches = []
+
+            def fetch_many(self, server_url, item_ids):
+                self.batches.append(item_ids)
+                return [Decimal(1), Decimal(2)]
+
+        data_store = self.FakeDataStore()
+        engine = LocalEngine()
+
+        self.run_loop(AsyncAgent(data_store).execute(self.TestNotifier(), engine))
+
+        self.assertEqual(engine.batches, [["item1.html", "item2.html"]])
+        self.assertEqual(data_store.get_item_history("item2.html"), [Decimal(1000), Decimal(2)])
+
+    def test_tasks_share_the_loop(self):
+        """Tests that the fetches of several tasks are in flight at the same time"""
+        data_stores = [self.FakeDataStore("A", workers=2), self.FakeDataStore("B", workers=2)]
+        agents = [AsyncAgent(ds) for ds in data_stores]
+        notifiers = [self.TestNotifier(), self.TestNotifier()]
+        engines = [self.TestAsyncEngine(), self.TestAsyncEngine()]
+
+        start = time.monotonic()
+        self.run_loop(execute_all(agents, notifiers, engines))
+
+        # four fetches of 0.2 seconds each overlap
+        self.assertLess(time.monotonic() - start, 0.6)
+        for ds, n in zip(data_stores, notifiers):
+            self.assertEqual(ds.get_item_history("item1.html")[-1], Decimal(385))
+            self.assertTrue(n.notified)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import json
+import os
+import tempfile
+import unittest
+import urllib.request
+
+import benchmark
+
+class TestBenchmark(unittest.TestCase):
+    """Tests that the benchmark runs and writes its results"""
+
+    def test_percentile(self):
+        self.assertIsNone(benchmark.percentile([], 0.5))
+        self.assertEqual(benchmark.percentile([3, 1, 2], 0.5), 2)
+        self.assertEqual(benchmark.percentile(list(range(1, 101)), 0.99), 99)
+
+    def test_server_runs_in_its_own_process(self):
+        process, server_url = benchmark.start_server(0, 0)
+
+        try:
+            self.assertIsNone(process.poll())
+
+            with urllib.request.urlopen("http://" + server_url + "/item1") as response:
+                self.assertEqual(response.read(), b"127")
+        finally:
+            benchmark.stop_server(process)
+
+        self.assertIsNotNone(process.poll())
+
+    def test_results_are_written(self):
+        fd, output = tempfile.mkstemp()
+        os.close(fd)
+
+        benchmark.main(["--tasks", "2", "--items", "5", "--history", "3",
+                        "--workers", "2", "--output", output])
+
+        with open(output) as fp:
+            results = json.load(fp)
+        os.remove(output)
+
+        self.assertEqual(results["parameters"],
+                         {"tasks": 2, "items": 5, "history": 3, "workers": 2,
+                          "latency": 0, "jitter": 0})
+        self.assertEqual(results["results"]["items_fetched"], 10)
+        self.assertGreater(results["results"]["items_per_second"], 0)
+        self.assertLessEqual(results["results"]["fetch_latency_p50"],
+                             results["results"]["fetch_latency_p99"])
+
+if __name__ == '__main__':
+    unittest.main()
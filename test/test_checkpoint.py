@@ -0,0 +1,224 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from unittest import mock
+from main.checkpoint import Checkpoint
+from main.interfaces import Engine, Notifier
+from test.fixtures import SilentNotifier
+
+import horus
+from horus import load_config, save_config
+
+class CrashingEngine(Engine):
+    """Records the items it fetches and fails to compare the items of one task (or
+    only one of its items), like a run that dies halfway through"""
+
+    def __init__(self, fetched, crash_task=None, crash_item=None):
+        self.fetched = fetched
+        self.crash_task = crash_task
+        self.crash_item = crash_item
+        self.task_id = None
+
+    def fetch(self, server_url, item_id):
+        self.fetched.append((self.task_id, item_id))
+        return 100
+
+    def compare(self, latest_data_point, history):
+        if self.task_id == self.crash_task and \
+                self.crash_item in (None, self.fetched[-1][1]):
+            raise RuntimeError("Killed")
+        return latest_data_point < history[-1]
+
+    def wait(self):
+        pass
+
+class RecordingNotifier(Notifier):
+
+    def __init__(self, task_id, added):
+        self.task_id = task_id
+        self.added = added
+
+    def add(self, item_id, latest_data_point):
+        self.added.append((self.task_id, item_id, latest_data_point))
+
+    def alert(self):
+        pass
+
+class TestCheckpoint(unittest.TestCase):
+    """Tests the progress checkpoint of a run"""
+
+    deserialize = staticmethod(lambda task, data_str: int(data_str))
+    serialize = staticmethod(lambda task, data_pt: str(data_pt))
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = os.path.join(self.directory, "config.json")
+        self.checkpoint = os.path.join(self.directory, "run.checkpoint")
+        shutil.copy("./test/input_config.json", self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_exec(self, fetched, crash_task=None, crash_item=None, added=None):
+        def find_engine(task_id):
+            engine = CrashingEngine(fetched, crash_task, crash_item)
+            engine.task_id = task_id
+            return engine
+
+        def find_notifier(task_id):
+            if added is None:
+                return SilentNotifier()
+            return RecordingNotifier(task_id, added)
+
+        with mock.patch("horus.find_engine", find_engine), \
+             mock.patch("horus.find_notifier", find_notifier), \
+             mock.patch("horus.deserializer", self.deserialize), \
+             mock.patch("horus.serializer", self.serialize):
+            horus.exec(config_filename=self.config, checkpoint_filename=self.checkpoint,
+                       checkpoint_interval=1)
+
+    def test_resumed_run_skips_completed_items(self):
+        fetched = []
+
+        with self.assertRaises(RuntimeError):
+            self.run_exec(fetched, crash_task="TEST2")
+
+        # nothing was saved but the completed items are in the checkpoint
+        self.assertEqual(load_config(self.config, self.deserialize)[0].get_item_history("item1.html"), [500])
+        self.assertTrue(os.path.exists(self.checkpoint))
+
+        fetched = []
+        self.run_exec(fetched)
+
+        self.assertEqual(fetched, [("TEST2", "item1.html"), ("TEST2", "item2.html")])
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+        stores = load_config(self.config, self.deserialize)
+        self.assertEqual(stores[0].get_item_history("item1.html"), [500, 100])
+        self.assertEqual(stores[0].get_item_history("item2.html"), [560, 100])
+        self.assertEqual(stores[1].get_item_history("item1.html"), [120, 100])
+
+        # the next run starts over
+        fetched = []
+        self.run_exec(fetched)
+        self.assertEqual(len(fetched), 4)
+
+    def test_resumed_run_notifies_unalerted_items(self):
+        """Tests that the drops of a task that died before alerting are notified by
+        the resumed run, and those of a task that alerted aren't notified twice"""
+        added = []
+
+        with self.assertRaises(RuntimeError):
+            self.run_exec([], crash_task="TEST2", crash_item="item2.html", added=added)
+
+        self.assertEqual(added, [("TEST1", "item1.html", 100), ("TEST1", "item2.html", 100),
+                                 ("TEST2", "item1.html", 100)])
+
+        added = []
+        self.run_exec([], added=added)
+
+        self.assertEqual(added, [("TEST2", "item1.html", 100), ("TEST2", "item2.html", 100)])
+
+    def test_resume_restores_histories_and_states(self):
+        stores = load_config(self.config, self.deserialize)
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 10, [self.config])
+        self.assertEqual(checkpoint.resume(stores, self.deserialize), 0)
+
+        stores[0].append_item_history("item2.html", 400, 2)
+        stores[0].get_item_states()["item2.html"] = {"etag": "x"}
+        checkpoint.record(stores[0], "item2.html", 400)
+
+        # nothing is written before the interval is reached or the checkpoint closed
+        with open(self.checkpoint) as fp:
+            self.assertEqual(len(fp.readlines()), 1)
+
+        checkpoint.close()
+
+        stores = load_config(self.config, self.deserialize)
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 10, [self.config])
+        self.assertEqual(checkpoint.resume(stores, self.deserialize), 1)
+        checkpoint.close()
+
+        self.assertEqual(stores[0].get_item_history("item2.html"), [560, 400])
+        self.assertEqual(stores[0].get_item_states(), {"item2.html": {"etag": "x"}})
+        self.assertTrue(stores[0].modified)
+        self.assertTrue(checkpoint.is_done("TEST1", "item2.html"))
+        self.assertFalse(checkpoint.is_done("TEST1", "item1.html"))
+        self.assertFalse(checkpoint.is_done("TEST2", "item2.html"))
+
+    def test_incomplete_last_record_is_skipped(self):
+        stores = load_config(self.config, self.deserialize)
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 1, [self.config])
+        checkpoint.resume(stores, self.deserialize)
+        checkpoint.record(stores[0], "item1.html", 400)
+        checkpoint.close()
+
+        with open(self.checkpoint, "a") as fp:
+            fp.write('{"task": "TEST1", "item": "item2.h')
+
+        stores = load_config(self.config, self.deserialize)
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 1, [self.config])
+        self.assertEqual(checkpoint.resume(stores, self.deserialize), 1)
+        checkpoint.close()
+
+        self.assertEqual(stores[0].get_item_history("item1.html"), [500, 400])
+        self.assertEqual(stores[0].get_item_history("item2.html"), [560])
+
+        # the items completed after the crash are kept apart from the incomplete line
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 1, [self.config])
+        checkpoint.resume(load_config(self.config, self.deserialize), self.deserialize)
+        checkpoint.record(stores[0], "item2.html", 300)
+        checkpoint.close()
+
+        stores = load_config(self.config, self.deserialize)
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 1, [self.config])
+        self.assertEqual(checkpoint.resume(stores, self.deserialize), 2)
+        checkpoint.close()
+
+        self.assertEqual(stores[0].get_item_history("item2.html"), [560, 300])
+
+    def test_stale_checkpoint_is_discarded(self):
+        """Tests that a checkpoint isn't applied once the stores it belongs to were saved"""
+        stores = load_config(self.config, self.deserialize)
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 1, [self.config])
+        checkpoint.resume(stores, self.deserialize)
+        stores[0].append_item_history("item1.html", 400, 2)
+        checkpoint.record(stores[0], "item1.html", 400)
+        checkpoint.close()
+
+        save_config(stores, self.config, self.serialize)
+
+        stores = load_config(self.config, self.deserialize)
+        checkpoint = Checkpoint(self.checkpoint, self.serialize, 1, [self.config])
+        self.assertEqual(checkpoint.resume(stores, self.deserialize), 0)
+        checkpoint.finish()
+
+        self.assertEqual(stores[0].get_item_history("item1.html"), [500, 400])
+        self.assertFalse(checkpoint.is_done("TEST1", "item1.html"))
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_checkpoint_needs_positive_interval(self):
+        with self.assertRaises(RuntimeError):
+            Checkpoint(self.checkpoint, self.serialize, 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import asyncio
+import unittest
+
+from unittest import mock
+from main.agent import Agent
+from main.async_agent import AsyncAgent
+from main.circuit_breaker import CircuitBreaker, host_of
+from main.http_engine import HttpEngine
+from main.interfaces import AsyncEngine, Engine
+from test.fixtures import SilentNotifier, make_store
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class FailingEngine(Engine):
+    """Fails to fetch the items whose name starts with "bad", and advances a clock
+    by a second for every fetch"""
+
+    def __init__(self, clock=None):
+        self.clock = clock
+        self.fetched = []
+
+    def fetch(self, server_url, item_id):
+        self.fetched.append(item_id)
+
+        if self.clock is not None:
+            self.clock.now += 1
+        if item_id.startswith("bad"):
+            raise RuntimeError("Server error")
+
+        return 100
+
+    def compare(self, latest_data_point, history):
+        return False
+
+    def wait(self):
+        pass
+
+class SlowEngine(AsyncEngine):
+
+    async def fetch(self, server_url, item_id):
+        if item_id.startswith("slow"):
+            await asyncio.sleep(10)
+        return 100
+
+    def compare(self, latest_data_point, history):
+        return False
+
+    async def wait(self):
+        pass
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests the circuit breaker and the handling of failed and late fetches"""
+
+    def test_host_of(self):
+        self.assertEqual(host_of("localhost:8000/task1"), "localhost:8000")
+        self.assertEqual(host_of("https://example.com/shop"), "example.com")
+
+    def test_breaker_opens_and_closes(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(2, 10, clock)
+
+        breaker.failed("localhost/a")
+        self.assertTrue(breaker.allow("localhost/b"))
+
+        with self.assertLogs("horus", "WARNING"):
+            breaker.failed("localhost/b")
+        self.assertFalse(breaker.allow("localhost/a"))
+        self.assertTrue(breaker.is_open("localhost"))
+        self.assertTrue(breaker.allow("example.com"))
+
+        # a single trial once the cool off is over
+        clock.now = 10
+        self.assertTrue(breaker.allow("localhost"))
+        self.assertFalse(breaker.allow("localhost"))
+
+        breaker.failed("localhost")
+        clock.now = 15
+        self.assertFalse(breaker.allow("localhost"))
+
+        clock.now = 20
+        self.assertTrue(breaker.allow("localhost"))
+        breaker.succeeded("localhost")
+        self.assertTrue(breaker.allow("localhost"))
+        self.assertFalse(breaker.is_open("localhost"))
+
+    def test_failed_items_keep_their_history(self):
+        for workers in (1, 2):
+            data_store = make_store(["item1", "bad1", "item2"], workers=workers)
+
+            with self.assertLogs("horus", "WARNING"):
+                Agent(data_store).execute(SilentNotifier(), FailingEngine())
+
+            self.assertEqual(data_store.items, {"item1": [200, 100], "bad1": [200],
+                                                "item2": [200, 100]})
+
+    def test_open_breaker_skips_fetches(self):
+        breaker = CircuitBreaker(2, 300)
+        data_store = make_store(["bad1", "bad2", "item1"])
+        engine = FailingEngine()
+
+        with self.assertLogs("horus", "WARNING"):
+            Agent(data_store, breaker=breaker).execute(SilentNotifier(), engine)
+
+        self.assertEqual(engine.fetched, ["bad1", "bad2"])
+        self.assertEqual(data_store.items["item1"], [200])
+
+        # the breaker is shared by the tasks fetching from the same host
+        other = make_store(["item2"])
+        Agent(other, breaker=breaker).execute(SilentNotifier(), engine)
+        self.assertEqual(other.items["item2"], [200])
+
+    def test_deadline_stops_fetches(self):
+        clock = FakeClock()
+        data_store = make_store(["item1", "item2", "item3", "item4"], deadline=2)
+        engine = FailingEngine(clock)
+
+        with mock.patch("main.agent.time.monotonic", clock):
+            Agent(data_store).execute(SilentNotifier(), engine)
+
+        self.assertEqual(engine.fetched, ["item1", "item2"])
+        self.assertEqual(data_store.items["item3"], [200])
+
+        with self.assertRaises(RuntimeError):
+            Agent(make_store([], deadline=0)).execute(SilentNotifier(), engine)
+
+    def test_async_fetch_timeout(self):
+        data_store = make_store(["slow1", "item1"], fetch_timeout=0.05, workers=2)
+        loop = asyncio.new_event_loop()
+
+        try:
+            with self.assertLogs("horus", "WARNING"):
+                loop.run_until_complete(AsyncAgent(data_store).execute(SilentNotifier(),
+                                                                       SlowEngine()))
+        finally:
+            loop.close()
+
+        self.assertEqual(data_store.items, {"slow1": [200], "item1": [200, 100]})
+
+    def test_fetch_timeout_needs_engine_support(self):
+        engine = FailingEngine()
+
+        with self.assertRaises(RuntimeError):
+            Agent(make_store(["item1"], fetch_timeout=1)).execute(SilentNotifier(), engine)
+
+        self.assertEqual(engine.fetched, [])
+
+    def test_http_engine_timeout(self):
+        engine = HttpEngine(connect_timeout=5, read_timeout=30)
+        engine.use_timeout(10)
+        self.assertEqual(engine.timeout, (5, 10))
+
+if __name__ == '__main__':
+    unittest.main()
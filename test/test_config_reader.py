@@ -0,0 +1,62 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import collections
+import io
+import json
+
+from main.config_reader import iter_tasks
+
+class TestConfigReader(unittest.TestCase):
+    """Tests the streaming configuration file reader"""
+
+    def read(self, text, chunk_size):
+        return collections.OrderedDict(iter_tasks(io.StringIO(text), chunk_size))
+
+    def test_matches_json_load(self):
+        with open("./test/input_config.json", "r") as fp:
+            text = fp.read()
+
+        expected = json.loads(text, object_pairs_hook=collections.OrderedDict)
+
+        # small chunks split keys, strings and numbers
+        for chunk_size in (1, 2, 3, 7, 65536):
+            self.assertEqual(self.read(text, chunk_size), expected)
+
+    def test_numbers_across_chunks(self):
+        text = '{"T": {"max_history_length": 12345, "items": {"a": ["1", "2"]}, "x": [1.5e3]}}'
+
+        tasks = self.read(text, 4)
+
+        self.assertEqual(tasks["T"]["max_history_length"], 12345)
+        self.assertEqual(tasks["T"]["x"], [1500.0])
+        self.assertEqual(list(tasks["T"]), ["max_history_length", "items", "x"])
+
+    def test_empty_objects(self):
+        self.assertEqual(self.read('{}', 2), {})
+        self.assertEqual(self.read('{"T": {"items": {}}}', 2), {"T": {"items": {}}})
+
+    def test_invalid_file(self):
+        with self.assertRaises(ValueError):
+            self.read('{"T": {"items": {"a": ["1"]', 3)
+        with self.assertRaises(ValueError):
+            self.read('["T"]', 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
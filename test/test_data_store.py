@@ -18,6 +18,7 @@
 import unittest
 
 from main.data_store import DataStore
+from main.history import RingBuffer
 
 class TestDataStore(unittest.TestCase):
     """Tests that the DataStore class works as expected"""
@@ -76,6 +77,28 @@ class TestDataStore(unittest.TestCase):
 
         self.assertFalse(self.data_store.modified)
 
+    def test_append_to_list_history(self):
+        self.data_store.append_item_history("409", 5, 2)
+
+        self.assertEqual(self.data_store.get_item_history("409"), [4, 5])
+        self.assertTrue(self.data_store.modified)
+
+    def test_append_to_ring_buffer_in_place(self):
+        history = RingBuffer(2, [3, 4])
+        self.data_store.items["409"] = history
+
+        self.data_store.append_item_history("409", 5, 2)
+
+        self.assertTrue(self.data_store.get_item_history("409") is history)
+        self.assertEqual(history, [4, 5])
+        self.assertTrue(self.data_store.modified)
+
+    def test_throw_error_on_appending_wrong_history(self):
+        with self.assertRaises(KeyError):
+            self.data_store.append_item_history("547", 5, 2)
+
+        self.assertFalse(self.data_store.modified)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,105 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import threading
+
+from main.dispatch import Dispatcher
+from main.interfaces import Notifier
+
+class RecordingNotifier(Notifier):
+
+    def __init__(self):
+        self.calls = []
+        self.threads = set()
+
+    def add(self, item_id, latest_data_point):
+        self.calls.append(("add", item_id, latest_data_point))
+        self.threads.add(threading.current_thread())
+
+    def alert(self):
+        self.calls.append(("alert",))
+        self.threads.add(threading.current_thread())
+
+class TestDispatcher(unittest.TestCase):
+    """Tests the background delivery of notifications"""
+
+    def test_calls_are_delivered_in_order_on_the_worker(self):
+        first = RecordingNotifier()
+        second = RecordingNotifier()
+
+        with Dispatcher() as dispatcher:
+            notifier = dispatcher.notifier("TEST1", first)
+            notifier.add("item1", 1)
+            notifier.add("item2", 2)
+            notifier.alert()
+            dispatcher.notifier("TEST2", second).alert()
+
+        self.assertEqual(first.calls, [("add", "item1", 1), ("add", "item2", 2), ("alert",)])
+        self.assertEqual(second.calls, [("alert",)])
+        self.assertEqual(first.threads, {dispatcher.thread})
+
+    def test_digest_alerts_once_for_every_task(self):
+        digest = RecordingNotifier()
+
+        with Dispatcher(digest=digest) as dispatcher:
+            for task_id in ("TEST1", "TEST2"):
+                notifier = dispatcher.notifier(task_id)
+                notifier.add("item1", 1)
+                notifier.alert()
+
+        self.assertEqual(digest.calls, [("add", ("TEST1", "item1"), 1),
+                                        ("add", ("TEST2", "item1"), 1), ("alert",)])
+
+    def test_queue_is_bounded(self):
+        release = threading.Event()
+        notifier = RecordingNotifier()
+        notifier.alert = release.wait
+        dispatcher = Dispatcher(max_queued=1)
+        queued = dispatcher.notifier("TEST1", notifier)
+
+        # the worker blocks on the first call and the second fills the queue
+        queued.alert()
+        queued.alert()
+
+        third = threading.Thread(target=queued.alert)
+        third.start()
+        third.join(0.1)
+        self.assertTrue(third.is_alive())
+
+        release.set()
+        third.join()
+        dispatcher.close()
+
+    def test_failed_deliveries_are_skipped(self):
+        notifier = RecordingNotifier()
+
+        def fail():
+            raise RuntimeError("mail server down")
+
+        with self.assertLogs("horus", "ERROR"):
+            with Dispatcher() as dispatcher:
+                dispatcher.put(fail)
+                dispatcher.notifier("TEST1", notifier).alert()
+
+        self.assertEqual(notifier.calls, [("alert",)])
+
+        with self.assertRaises(RuntimeError):
+            dispatcher.put(fail)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import threading
+
+from main.fetch_cache import FetchCache, CachedEngine, CachedBatchEngine, cached
+from main.interfaces import Engine, NOT_MODIFIED, innermost
+from main.rate_limit import RateLimiter, limited
+
+class CountingEngine(Engine):
+
+    def __init__(self, data_point=100):
+        self.data_point = data_point
+        self.fetched = []
+        self.waits = 0
+
+    def fetch(self, server_url, item_id):
+        self.fetched.append(item_id)
+        return self.data_point
+
+    def compare(self, latest_data_point, history):
+        return False
+
+    def wait(self):
+        self.waits += 1
+
+class CountingBatchEngine(CountingEngine):
+
+    def fetch_many(self, server_url, item_ids):
+        self.fetched.append(list(item_ids))
+        return [self.data_point] * len(item_ids)
+
+class TestFetchCache(unittest.TestCase):
+    """Tests the cache shared by the engines of a run"""
+
+    def setUp(self):
+        self.now = 0
+        self.cache = FetchCache(10, clock=lambda: self.now)
+
+    def test_data_points_are_reused_until_they_expire(self):
+        engine = CountingEngine()
+        first = CachedEngine(engine, self.cache)
+        second = CachedEngine(CountingEngine(200), self.cache)
+
+        self.assertEqual(first.fetch("localhost", "item1"), 100)
+        self.assertEqual(second.fetch("localhost", "item1"), 100)
+        self.assertEqual(engine.fetched, ["item1"])
+
+        self.now = 10
+        self.assertEqual(second.fetch("localhost", "item1"), 200)
+
+    def test_keys_depend_on_server_and_engine_class(self):
+        engine = CountingEngine()
+        CachedEngine(engine, self.cache).fetch("localhost", "item1")
+        CachedEngine(engine, self.cache).fetch("example.com", "item1")
+        self.assertEqual(engine.fetched, ["item1", "item1"])
+
+        batch_engine = CountingBatchEngine(200)
+        self.assertEqual(cached(batch_engine, self.cache).fetch("localhost", "item1"), 200)
+
+    def test_keys_depend_on_rate_limited_engine_class(self):
+        """Tests that engines of different classes behind a rate limiter don't share
+        their data points"""
+        class OtherEngine(CountingEngine):
+
+            def fetch(self, server_url, item_id):
+                return super().fetch(server_url, item_id)
+
+        class OtherBatchEngine(CountingBatchEngine):
+
+            def fetch_many(self, server_url, item_ids):
+                return super().fetch_many(server_url, item_ids)
+
+        limiter = RateLimiter(100)
+        engines = [CountingEngine("price"), OtherEngine("stock"),
+                   CountingBatchEngine("price"), OtherBatchEngine("stock")]
+        wrapped = [cached(limited(engine, limiter), self.cache) for engine in engines]
+
+        self.assertEqual(wrapped[0].fetch("localhost", "item1"), "price")
+        self.assertEqual(wrapped[1].fetch("localhost", "item1"), "stock")
+        self.assertEqual(wrapped[2].fetch_many("localhost", ["item1"]), ["price"])
+        self.assertEqual(wrapped[3].fetch_many("localhost", ["item1"]), ["stock"])
+
+        self.assertEqual(innermost(wrapped[0]), engines[0])
+
+    def test_concurrent_fetches_are_coalesced(self):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fetch(keys):
+            calls.append(keys)
+            started.set()
+            release.wait()
+            return [42] * len(keys)
+
+        results = []
+        owner = threading.Thread(target=lambda: results.append(self.cache.get(["a"], fetch)))
+        owner.start()
+        started.wait()
+
+        waiters = [threading.Thread(target=lambda: results.append(self.cache.get(["a"], fetch)))
+                   for i in range(3)]
+        for t in waiters:
+            t.start()
+
+        release.set()
+        owner.join()
+        for t in waiters:
+            t.join()
+
+        self.assertEqual(calls, [["a"]])
+        self.assertEqual(sorted(results), [([42], [False])] * 3 + [([42], [True])])
+
+    def test_failed_fetches_are_not_cached(self):
+
+        def fail(keys):
+            raise RuntimeError("server down")
+
+        with self.assertRaises(RuntimeError):
+            self.cache.get(["a"], fail)
+
+        self.assertEqual(self.cache.get(["a"], lambda keys: [1]), ([1], [True]))
+
+    def test_batches_only_fetch_missing_items(self):
+        engine = CountingBatchEngine()
+        cached_engine = cached(engine, self.cache)
+        self.assertIsInstance(cached_engine, CachedBatchEngine)
+
+        cached_engine.fetch_many("localhost", ["item1", "item2"])
+        self.assertEqual(cached_engine.fetch_many("localhost", ["item2", "item3"]), [100, 100])
+        self.assertEqual(engine.fetched, [["item1", "item2"], ["item3"]])
+
+    def test_not_modified_is_refetched_by_other_engines(self):
+        first = CachedEngine(CountingEngine(NOT_MODIFIED), self.cache)
+        engine = CountingEngine()
+        second = CachedEngine(engine, self.cache)
+
+        self.assertIs(first.fetch("localhost", "item1"), NOT_MODIFIED)
+        self.assertEqual(second.fetch("localhost", "item1"), 100)
+        self.assertEqual(engine.fetched, ["item1"])
+
+    def test_wait_is_skipped_after_cache_hits(self):
+        engine = CountingEngine()
+        first = CachedEngine(engine, self.cache)
+        second = CachedEngine(engine, self.cache)
+
+        first.fetch("localhost", "item1")
+        first.wait()
+        second.fetch("localhost", "item1")
+        second.wait()
+
+        self.assertEqual(engine.waits, 1)
+
+if __name__ == '__main__':
+    unittest.main()
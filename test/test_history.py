@@ -0,0 +1,61 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+
+from main.history import RingBuffer
+
+class TestRingBuffer(unittest.TestCase):
+    """Tests the fixed capacity history buffer"""
+
+    def test_keeps_newest_data_points(self):
+        history = RingBuffer(3, [1, 2, 3, 4])
+
+        self.assertEqual(len(history), 3)
+        self.assertEqual(list(history), [2, 3, 4])
+
+        history.append(5)
+        history.append(6)
+
+        self.assertEqual(list(history), [4, 5, 6])
+        self.assertEqual(history[0], 4)
+        self.assertEqual(history[-1], 6)
+        self.assertEqual(history[-3], 4)
+        self.assertEqual(history[1:], [5, 6])
+
+    def test_index_out_of_range(self):
+        history = RingBuffer(3, [1])
+
+        with self.assertRaises(IndexError):
+            history[1]
+        with self.assertRaises(IndexError):
+            history[-2]
+
+    def test_compares_like_a_list(self):
+        self.assertEqual(RingBuffer(2, [1, 2]), [1, 2])
+        self.assertEqual([1, 2], RingBuffer(5, [1, 2]))
+        self.assertNotEqual(RingBuffer(2, [1, 2]), [1])
+        self.assertEqual(RingBuffer(2, [1]) + [3], [1, 3])
+        self.assertEqual({"item": RingBuffer(2, [7])}, {"item": [7]})
+
+    def test_invalid_capacity(self):
+        with self.assertRaises(RuntimeError):
+            RingBuffer(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -17,10 +17,32 @@
 
 import unittest
 import filecmp
+import multiprocessing
 import os
+import shutil
+import stat
+import tempfile
+import threading
 
+from unittest import mock
+from main.interfaces import Engine, Notifier
+from main.fetch_cache import FetchCache
+from test.fixtures import SilentNotifier
+
+import horus
 from horus import load_config, save_config
 
+class ConstantEngine(Engine):
+
+    def fetch(self, server_url, item_id):
+        return 100
+
+    def compare(self, latest_data_point, history):
+        return latest_data_point < history[-1]
+
+    def wait(self):
+        pass
+
 class TestHorus(unittest.TestCase):
     """Tests the runtime Horus methods that the user calls"""
 
@@ -56,6 +78,237 @@ class TestHorus(unittest.TestCase):
 
         self.assertEqual(stores, new_stores)
 
+    def test_item_states_are_saved(self):
+        deserialize = lambda task, data_str: int(data_str)
+        serialize = lambda task, data_pt: str(data_pt)
+
+        stores = load_config("./test/input_config.json", deserialize)
+        stores[0].get_item_states()["item1.html"] = {"etag": '"abc"'}
+        save_config(stores, "./test/output_config.json", serialize)
+        new_stores = load_config("./test/output_config.json", deserialize)
+        os.remove("./test/output_config.json")
+
+        self.assertEqual(new_stores[0].get_item_states(), {"item1.html": {"etag": '"abc"'}})
+        self.assertEqual(new_stores[1].get_item_states(), {})
+        self.assertEqual(new_stores[0].keys, stores[0].keys)
+        self.assertEqual(stores, new_stores)
+
+    def test_save_reuses_unmodified_stores(self):
+        """Tests that only modified stores are serialized again"""
+        deserialize = lambda task, data_str: int(data_str)
+
+        def serialize(task, data_pt):
+            if task == "TEST1":
+                raise RuntimeError("Unmodified task serialized")
+            return str(data_pt)
+
+        stores = load_config("./test/input_config.json", deserialize)
+        stores[1].append_item_history("item1.html", 99, 2)
+        save_config(stores, "./test/output_config.json", serialize)
+        new_stores = load_config("./test/output_config.json", deserialize)
+        os.remove("./test/output_config.json")
+
+        self.assertEqual(stores, new_stores)
+        self.assertFalse(stores[1].modified)
+        self.assertEqual(new_stores[1].get_item_history("item1.html"), [120, 99])
+
+    def test_failed_save_keeps_old_file(self):
+        """Tests that a save that fails halfway leaves the previous file in place"""
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        shutil.copy("./test/input_config.json", config)
+
+        def serialize(task, data_pt):
+            raise RuntimeError("Serialization failed")
+
+        stores = load_config(config, lambda task, data_str: int(data_str))
+        stores[0].append_item_history("item1.html", 99, 2)
+
+        with self.assertRaises(RuntimeError):
+            save_config(stores, config, serialize)
+
+        self.assertTrue(filecmp.cmp("./test/input_config.json", config, shallow=False))
+        self.assertEqual(os.listdir(directory), ["config.json"])
+        shutil.rmtree(directory)
+
+    def test_save_keeps_file_permissions(self):
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        shutil.copy("./test/input_config.json", config)
+        os.chmod(config, 0o644)
+
+        stores = load_config(config, lambda task, data_str: int(data_str))
+        stores[0].append_item_history("item1.html", 99, 2)
+        save_config(stores, config, lambda task, data_pt: str(data_pt))
+
+        mode = stat.S_IMODE(os.stat(config).st_mode)
+        shutil.rmtree(directory)
+        self.assertEqual(mode, 0o644)
+
+    def test_exec_skips_unchanged_stores(self):
+        """Tests that a run that changes nothing doesn't write the configuration"""
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        with open(config, "w") as fp:
+            fp.write('{"EMPTY": {"server_url": "localhost", "max_history_length": 2, "items": {}}}')
+
+        with mock.patch("horus.find_engine", lambda task_id: ConstantEngine()), \
+             mock.patch("horus.find_notifier", lambda task_id: SilentNotifier()), \
+             mock.patch("horus.save_config") as save:
+            horus.exec(config_filename=config)
+
+        shutil.rmtree(directory)
+        self.assertFalse(save.called)
+
+    def test_daemon_runs_tasks_on_their_intervals(self):
+        """Tests that the daemon runs each task on its own interval, keeps the engines
+        between runs and saves on shutdown"""
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        stores = load_config("./test/input_config.json", lambda task, data_str: int(data_str))
+        stores[0].keys["interval"] = 0.05
+        save_config(stores, config, lambda task, data_pt: str(data_pt))
+
+        engines = []
+        fetches = {"TEST1": 0, "TEST2": 0}
+
+        class CountingEngine(ConstantEngine):
+
+            def __init__(self, task_id):
+                self.task_id = task_id
+                engines.append(self)
+
+            def fetch(self, server_url, item_id):
+                fetches[self.task_id] += 1
+                return fetches[self.task_id]
+
+        stopped = threading.Event()
+        threading.Timer(0.3, stopped.set).start()
+
+        with mock.patch("horus.find_engine", CountingEngine), \
+             mock.patch("horus.find_notifier", lambda task_id: SilentNotifier()), \
+             mock.patch("horus.deserializer", lambda task, data_str: int(data_str)), \
+             mock.patch("horus.serializer", lambda task, data_pt: str(data_pt)):
+            horus.daemon(config_filename=config, default_interval=100, stopped=stopped)
+
+        stores = load_config(config, lambda task, data_str: int(data_str))
+        shutil.rmtree(directory)
+
+        self.assertEqual(len(engines), 2)
+        self.assertGreater(fetches["TEST1"], 4)
+        self.assertEqual(fetches["TEST2"], 2)
+        self.assertEqual(stores[0].get_item_history("item2.html"),
+                         [fetches["TEST1"] - 2, fetches["TEST1"]])
+        self.assertEqual(stores[1].get_item_history("item2.html"), [780, 2])
+
+    def test_tasks_share_cached_fetches(self):
+        """Tests that tasks watching the same items fetch each of them once"""
+        stores = load_config("./test/input_config.json", lambda task, data_str: int(data_str))
+        fetched = []
+
+        class RecordingEngine(ConstantEngine):
+
+            def fetch(self, server_url, item_id):
+                fetched.append(item_id)
+                return 100
+
+        with mock.patch("horus.find_engine", lambda task_id: RecordingEngine()), \
+             mock.patch("horus.find_notifier", lambda task_id: SilentNotifier()):
+            horus.execute_tasks(stores, fetch_cache=FetchCache(60))
+
+        self.assertEqual(fetched, ["item1.html", "item2.html"])
+        self.assertEqual(stores[1].items, {"item1.html": [120, 100], "item2.html": [780, 100]})
+
+    def test_exec_dispatches_a_digest(self):
+        """Tests that a dispatched run sends one digest for every task"""
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        shutil.copy("./test/input_config.json", config)
+
+        class DigestNotifier(Notifier):
+
+            def __init__(self):
+                self.added = []
+                self.alerts = 0
+
+            def add(self, item_id, latest_data_point):
+                self.added.append(item_id)
+
+            def alert(self):
+                self.alerts += 1
+
+        digest = DigestNotifier()
+
+        with mock.patch("horus.find_engine", lambda task_id: ConstantEngine()), \
+             mock.patch("horus.find_notifier", lambda task_id: SilentNotifier()), \
+             mock.patch("horus.find_digest_notifier", lambda: digest), \
+             mock.patch("horus.deserializer", lambda task, data_str: int(data_str)), \
+             mock.patch("horus.serializer", lambda task, data_pt: str(data_pt)):
+            horus.exec(config_filename=config, dispatch=True)
+
+        shutil.rmtree(directory)
+        self.assertEqual(digest.added, [("TEST1", "item1.html"), ("TEST1", "item2.html"),
+                                        ("TEST2", "item1.html"), ("TEST2", "item2.html")])
+        self.assertEqual(digest.alerts, 1)
+
+    def test_exec_with_configured_plugins(self):
+        """Tests that tasks run with the engine, notifier and codec they name"""
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        with open(config, "w") as fp:
+            fp.write('{"TEST": {"server_url": "localhost", "max_history_length": 2, '
+                     '"engine": "test.test_horus.ConstantEngine", '
+                     '"notifier": "test.test_horus.SilentNotifier", "codec": "int", '
+                     '"items": {"item1.html": ["500"]}}}')
+
+        horus.exec(config_filename=config)
+
+        stores = load_config(config, lambda task, data_str: int(data_str))
+        shutil.rmtree(directory)
+        self.assertEqual(stores[0].items, {"item1.html": [500, 100]})
+
+    def test_exec_writes_metrics(self):
+        """Tests that a run writes the timings and counts of its tasks"""
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        metrics = os.path.join(directory, "metrics.prom")
+        shutil.copy("./test/input_config.json", config)
+
+        with mock.patch("horus.find_engine", lambda task_id: ConstantEngine()), \
+             mock.patch("horus.find_notifier", lambda task_id: SilentNotifier()), \
+             mock.patch("horus.deserializer", lambda task, data_str: int(data_str)), \
+             mock.patch("horus.serializer", lambda task, data_pt: str(data_pt)):
+            horus.exec(config_filename=config, metrics_filename=metrics)
+
+        with open(metrics) as fp:
+            lines = fp.read().splitlines()
+        shutil.rmtree(directory)
+
+        self.assertIn('horus_phase_seconds_count{phase="fetch",task="TEST2"} 2', lines)
+        self.assertIn('horus_phase_seconds_count{phase="save"} 1', lines)
+        self.assertIn('horus_events_total{event="items",task="TEST1"} 2', lines)
+
+    @unittest.skipUnless(multiprocessing.get_start_method() == "fork",
+                         "patched task hooks only reach forked worker processes")
+    def test_exec_in_processes(self):
+        """Tests that tasks executed in worker processes are saved by the parent"""
+        directory = tempfile.mkdtemp()
+        config = os.path.join(directory, "config.json")
+        shutil.copy("./test/input_config.json", config)
+
+        with mock.patch("horus.find_engine", lambda task_id: ConstantEngine()), \
+             mock.patch("horus.find_notifier", lambda task_id: SilentNotifier()), \
+             mock.patch("horus.deserializer", lambda task, data_str: int(data_str)), \
+             mock.patch("horus.serializer", lambda task, data_pt: str(data_pt)):
+            horus.exec(processes=2, config_filename=config)
+
+        stores = load_config(config, lambda task, data_str: int(data_str))
+        shutil.rmtree(directory)
+
+        self.assertEqual([ds.task_id for ds in stores], ["TEST1", "TEST2"])
+        self.assertEqual(stores[0].items, {"item1.html": [500, 100], "item2.html": [560, 100]})
+        self.assertEqual(stores[1].items, {"item1.html": [120, 100], "item2.html": [780, 100]})
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
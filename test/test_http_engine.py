@@ -0,0 +1,139 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import http.server
+import threading
+
+import requests
+
+from decimal import Decimal
+from main.http_engine import HttpEngine
+from main.interfaces import NOT_MODIFIED
+from main.rate_limit import Throttled
+
+class TestHttpEngine(unittest.TestCase):
+    """Tests the pooled HTTP engine against a local keep-alive server"""
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            self.server.clients.add(self.client_address)
+
+            if self.path == "/missing":
+                self.send_error(404)
+                return
+
+            if self.path == "/busy":
+                self.send_response(429)
+                self.send_header("Retry-After", "2")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            body = self.path.strip("/").encode()
+            etag = '"' + body.decode() + '"'
+
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    class TestEngine(HttpEngine):
+
+        parsed = 0
+
+        def parse(self, response):
+            self.parsed += 1
+            return Decimal(response.text)
+
+        def compare(self, latest_data_point, history):
+            return latest_data_point < history[-1]
+
+    def setUp(self):
+        self.server = http.server.HTTPServer(("127.0.0.1", 0), self.Handler)
+        self.server.clients = set()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+        self.server_url = "127.0.0.1:" + str(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def test_connection_is_reused(self):
+        """Tests that every fetch goes through a single kept-alive connection"""
+        engine = self.TestEngine()
+
+        prices = [engine.fetch(self.server_url, str(p)) for p in range(100, 105)]
+        engine.close()
+
+        self.assertEqual(prices, [Decimal(p) for p in range(100, 105)])
+        self.assertEqual(len(self.server.clients), 1)
+
+    def test_conditional_requests(self):
+        """Tests that validators are kept in the item states and that unchanged
+        items are not parsed again"""
+        engine = self.TestEngine()
+        states = {}
+        engine.use_states(states)
+
+        self.assertEqual(engine.fetch(self.server_url, "370"), Decimal(370))
+        self.assertEqual(states, {"370": {"etag": '"370"'}})
+
+        self.assertTrue(engine.fetch(self.server_url, "370") is NOT_MODIFIED)
+        self.assertEqual(engine.parsed, 1)
+
+        # without validators, requests are plain
+        engine = self.TestEngine(conditional=False)
+        engine.use_states(states)
+        self.assertEqual(engine.fetch(self.server_url, "370"), Decimal(370))
+        engine.close()
+
+    def test_url(self):
+        engine = self.TestEngine()
+
+        self.assertEqual(engine.url("localhost:8000", "item1.html"), "http://localhost:8000/item1.html")
+        self.assertEqual(engine.url("https://example.com/", "7"), "https://example.com/7")
+
+    def test_error_status_raises(self):
+        engine = self.TestEngine(read_timeout=2)
+
+        with self.assertRaises(requests.HTTPError):
+            engine.fetch(self.server_url, "missing")
+
+        with self.assertRaises(Throttled) as context:
+            engine.fetch(self.server_url, "busy")
+        self.assertEqual(context.exception.retry_after, 2)
+
+        engine.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
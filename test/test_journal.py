@@ -0,0 +1,173 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import shutil
+import tempfile
+
+from unittest import mock
+from horus import load_config, save_changes, compact_config
+from main import journal
+
+class TestJournal(unittest.TestCase):
+    """Tests the append-only journal of data store changes"""
+
+    deserialize = staticmethod(lambda task, data_str: int(data_str))
+    serialize = staticmethod(lambda task, data_pt: str(data_pt))
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.config = os.path.join(self.directory, "config.json")
+        self.journal = os.path.join(self.directory, "config.journal")
+        shutil.copy("./test/input_config.json", self.config)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay_restores_changes(self):
+        stores = load_config(self.config, self.deserialize, self.journal)
+        stores[0].append_item_history("item1.html", 400, 2)
+        stores[0].get_item_states()["item1.html"] = {"etag": "x"}
+        stores[1].set_item_history("item2.html", [1, 2])
+
+        self.assertEqual(journal.append_changes(stores, self.journal, self.serialize), 2)
+
+        stores[1].append_item_history("item2.html", 3, 2)
+        self.assertEqual(journal.append_changes(stores, self.journal, self.serialize), 1)
+        self.assertEqual(journal.append_changes(stores, self.journal, self.serialize), 0)
+
+        new_stores = load_config(self.config, self.deserialize, self.journal)
+
+        self.assertEqual(new_stores, stores)
+        self.assertEqual(new_stores[0].get_item_history("item1.html"), [500, 400])
+        self.assertEqual(new_stores[1].get_item_history("item2.html"), [2, 3])
+        self.assertEqual(new_stores[0].get_item_states(), {"item1.html": {"etag": "x"}})
+        self.assertEqual(new_stores[0].pop_changes(), [])
+
+        # the snapshot itself is untouched
+        self.assertEqual(load_config(self.config, self.deserialize)[0].get_item_history("item1.html"), [500])
+
+    def test_incomplete_last_record_is_skipped(self):
+        stores = load_config(self.config, self.deserialize)
+        stores[0].append_item_history("item1.html", 400, 2)
+        journal.append_changes(stores, self.journal, self.serialize)
+
+        with open(self.journal, "a") as fp:
+            fp.write('{"task": "TEST1", "item": "item2.h')
+
+        new_stores = load_config(self.config, self.deserialize, self.journal)
+
+        self.assertEqual(new_stores[0].get_item_history("item1.html"), [500, 400])
+        self.assertEqual(new_stores[0].get_item_history("item2.html"), [560])
+
+    def test_append_after_incomplete_last_record(self):
+        """Tests that records appended after a crash don't run into the incomplete line"""
+        stores = load_config(self.config, self.deserialize)
+        stores[0].append_item_history("item1.html", 400, 2)
+        journal.append_changes(stores, self.journal, self.serialize)
+
+        with open(self.journal, "a") as fp:
+            fp.write('{"task": "TEST1", "item": "item2.h')
+
+        stores = load_config(self.config, self.deserialize, self.journal)
+        stores[1].append_item_history("item2.html", 3, 2)
+        self.assertEqual(journal.append_changes(stores, self.journal, self.serialize), 1)
+
+        stores[1].append_item_history("item1.html", 4, 2)
+        journal.append_changes(stores, self.journal, self.serialize)
+
+        new_stores = load_config(self.config, self.deserialize, self.journal)
+
+        self.assertEqual(new_stores[0].get_item_history("item1.html"), [500, 400])
+        self.assertEqual(new_stores[1].get_item_history("item2.html"), [780, 3])
+        self.assertEqual(new_stores[1].get_item_history("item1.html"), [120, 4])
+
+    def test_replay_leaves_stores_unmodified(self):
+        """Tests that replayed stores aren't saved again, but are once they change"""
+        stores = load_config(self.config, self.deserialize)
+        stores[0].append_item_history("item1.html", 400, 2)
+        journal.append_changes(stores, self.journal, self.serialize)
+
+        stores = load_config(self.config, self.deserialize, self.journal)
+        self.assertEqual([ds.modified for ds in stores], [False, False])
+
+        # compacting writes the replayed changes into the configuration file
+        stores[1].append_item_history("item2.html", 3, 2)
+        compact_config(stores, self.config, self.journal, self.serialize)
+
+        new_stores = load_config(self.config, self.deserialize)
+        self.assertEqual(new_stores[0].get_item_history("item1.html"), [500, 400])
+        self.assertEqual(new_stores[1].get_item_history("item2.html"), [780, 3])
+
+    def test_interrupted_compaction(self):
+        """Tests that a compaction that dies at any step leaves the changes of the
+        journal applied exactly once"""
+        for step in range(3):
+            shutil.copy("./test/input_config.json", self.config)
+
+            stores = load_config(self.config, self.deserialize, self.journal)
+            stores[0].append_item_history("item1.html", 400, 2)
+            journal.append_changes(stores, self.journal, self.serialize)
+            stores[0].append_item_history("item1.html", 300, 2)
+
+            # die before moving the journal aside, before replacing the
+            # configuration file, or before removing the old journal
+            calls = [os.replace, os.replace, os.remove]
+            target = ["os.replace", "os.replace", "os.remove"][step]
+            count = [0]
+
+            def crash(*args, original=calls[step]):
+                count[0] += 1
+                if count[0] == [2, 3, 1][step]:
+                    raise KeyboardInterrupt()
+                return original(*args)
+
+            with mock.patch(target, crash), self.assertRaises(KeyboardInterrupt):
+                compact_config(stores, self.config, self.journal, self.serialize)
+
+            new_stores = load_config(self.config, self.deserialize, self.journal)
+            expected = [500, 400] if step == 0 else [400, 300]
+            self.assertEqual(new_stores[0].get_item_history("item1.html"), expected)
+            self.assertEqual(sorted(os.listdir(self.directory)),
+                             ["config.journal", "config.json"] if step == 0 else ["config.json"])
+
+            if os.path.exists(self.journal):
+                os.remove(self.journal)
+
+    def test_compaction(self):
+        """Tests that the journal is compacted into the configuration file once it
+        grows larger than it"""
+        stores = load_config(self.config, self.deserialize, self.journal)
+
+        stores[0].append_item_history("item1.html", 0, 2)
+        save_changes(stores, self.config, self.journal, self.serialize)
+        self.assertTrue(os.path.exists(self.journal))
+
+        runs = 1
+        while os.path.exists(self.journal) and runs < 100:
+            stores[0].append_item_history("item1.html", runs, 2)
+            save_changes(stores, self.config, self.journal, self.serialize)
+            runs += 1
+
+        self.assertGreater(runs, 1)
+        self.assertFalse(os.path.exists(self.journal))
+        self.assertEqual(load_config(self.config, self.deserialize), stores)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import os
+
+from horus import load_config, save_config
+from main.lazy_items import LazyItems
+
+class TestLazyItems(unittest.TestCase):
+    """Tests the deferred deserialization of item histories"""
+
+    def test_histories_are_deserialized_on_access(self):
+        loaded = []
+
+        def deserialize(task, data_str):
+            loaded.append((task, data_str))
+            return int(data_str)
+
+        stores = load_config("./test/input_config.json", deserialize, lazy=True)
+
+        self.assertTrue(isinstance(stores[0].items, LazyItems))
+        self.assertEqual(stores[0].get_item_ids(), ["item1.html", "item2.html"])
+        self.assertEqual(loaded, [])
+
+        self.assertEqual(stores[0].get_item_history("item2.html"), [560])
+        self.assertEqual(loaded, [("TEST1", "560")])
+
+        with self.assertRaises(KeyError):
+            stores[0].get_item_history("item3.html")
+
+    def test_matches_eager_loading(self):
+        deserialize = lambda task, data_str: int(data_str)
+
+        self.assertEqual(load_config("./test/input_config.json", deserialize, lazy=True),
+                         load_config("./test/input_config.json", deserialize))
+
+    def test_untouched_histories_are_saved_as_loaded(self):
+        deserialize = lambda task, data_str: int(data_str)
+
+        def serialize(task, data_pt):
+            if data_pt == 500:
+                raise RuntimeError("Untouched history serialized")
+            return str(data_pt)
+
+        stores = load_config("./test/input_config.json", deserialize, lazy=True)
+        stores[0].append_item_history("item2.html", 600, 2)
+        save_config(stores, "./test/output_config.json", serialize)
+
+        new_stores = load_config("./test/output_config.json", deserialize)
+        os.remove("./test/output_config.json")
+
+        self.assertEqual(new_stores[0].get_item_history("item1.html"), [500])
+        self.assertEqual(new_stores[0].get_item_history("item2.html"), [560, 600])
+        self.assertEqual(new_stores, stores)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,186 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import collections
+import json
+import os
+import shutil
+import stat
+import struct
+import tempfile
+
+from decimal import Decimal
+from main.mapped_history import MappedHistoryTable, write_history_file, read_history_file, \
+    open_history_file, HEADER, HEADER_SIZES, MAGIC, VERSION
+from main.numeric_history import NumericHistoryTable
+
+import horus
+from horus import load_config, save_config
+
+class TestMappedHistory(unittest.TestCase):
+    """Tests the memory-mapped binary history file"""
+
+    deserialize = staticmethod(lambda task, data_str: Decimal(data_str))
+    serialize = staticmethod(lambda task, data_pt: str(data_pt))
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, "history.bin")
+        self.config = os.path.join(self.directory, "config.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_changes_are_kept_in_the_file(self):
+        table = NumericHistoryTable(3, "decimal")
+        table["a"] = [Decimal("1.5")]
+        table["b"] = [Decimal(1), Decimal(2), Decimal(3)]
+        write_history_file(self.filename, table)
+
+        mapped = MappedHistoryTable(self.filename)
+        self.assertEqual(list(mapped), ["a", "b"])
+        self.assertEqual(dict(mapped.items()), dict(table.items()))
+
+        mapped["a"].append(Decimal("2.5"))
+        mapped["b"].append(Decimal(4))
+        mapped.flush()
+        mapped.close()
+
+        table = read_history_file(self.filename)
+        self.assertEqual(table["a"], [Decimal("1.5"), Decimal("2.5")])
+        self.assertEqual(table["b"], [Decimal(2), Decimal(3), Decimal(4)])
+
+    def test_items_are_fixed(self):
+        table = NumericHistoryTable(2, "int")
+        table["a"] = [1]
+        write_history_file(self.filename, table)
+
+        mapped = MappedHistoryTable(self.filename)
+        with self.assertRaises(KeyError):
+            mapped["b"] = [2]
+        with self.assertRaises(RuntimeError):
+            del mapped["a"]
+        mapped.close()
+
+    def test_not_a_history_file(self):
+        with open(self.filename, "wb") as fp:
+            fp.write(b"\0" * 64)
+
+        with self.assertRaises(RuntimeError):
+            MappedHistoryTable(self.filename)
+
+    def test_rewritten_atomically(self):
+        """Tests that rewriting a history file replaces it, and keeps its permissions"""
+        table = NumericHistoryTable(2, "int")
+        table["a"] = [1]
+        write_history_file(self.filename, table)
+        os.chmod(self.filename, 0o600)
+
+        table["a"] = [1, 2]
+        write_history_file(self.filename, table)
+
+        self.assertEqual(stat.S_IMODE(os.stat(self.filename).st_mode), 0o600)
+        self.assertEqual(os.listdir(self.directory), ["history.bin"])
+        self.assertEqual(read_history_file(self.filename)["a"], [1, 2])
+
+    def test_arrays_are_aligned(self):
+        table = NumericHistoryTable(2, "int")
+        table["a"] = [1]
+        write_history_file(self.filename, table)
+
+        mapped = MappedHistoryTable(self.filename)
+        self.assertEqual(mapped.version, VERSION)
+        self.assertEqual(HEADER_SIZES[VERSION] % 8, 0)
+        mapped.close()
+
+    def test_version_1_file_is_upgraded(self):
+        """Tests that a file written without the header padding is still read, and
+        rewritten when it is opened for a task"""
+        identifiers = json.dumps(["item1.html"]).encode("utf-8")
+        identifiers += b" " * (-len(identifiers) % 8)
+
+        with open(self.filename, "wb") as fp:
+            fp.write(HEADER.pack(MAGIC, 1, 2, 1, b"int", len(identifiers)))
+            fp.write(identifiers)
+            fp.write(struct.pack("<qq", 0, 1))
+            fp.write(struct.pack("<2d", 500, 0))
+
+        self.assertEqual(read_history_file(self.filename)["item1.html"], [500])
+
+        mapped = open_history_file(self.filename, 2, "int", {"item1.html": []}, None)
+        self.assertEqual(mapped.version, VERSION)
+        self.assertEqual(mapped["item1.html"], [500])
+        mapped.close()
+
+    def write_config(self, items):
+        config = collections.OrderedDict()
+        config["TEST1"] = collections.OrderedDict([
+            ("server_url", "localhost"), ("max_history_length", 2),
+            ("numeric_history", "decimal"), ("history_file", "history.bin"),
+            ("items", items)])
+
+        with open(self.config, "w") as fp:
+            json.dump(config, fp)
+
+    def test_loaded_from_config(self):
+        """Tests that tasks with a history file keep their histories in it instead of
+        the configuration file"""
+        self.write_config({"item1.html": ["500"]})
+
+        stores = load_config(self.config, self.deserialize)
+        self.assertTrue(isinstance(stores[0].items, MappedHistoryTable))
+        stores[0].append_item_history("item1.html", Decimal(370), 2)
+        save_config(stores, self.config, self.serialize)
+        stores[0].items.close()
+
+        # the item ids stay in the configuration, the histories are in the file
+        with open(self.config, "r") as fp:
+            self.assertEqual(json.load(fp)["TEST1"]["items"], {"item1.html": []})
+
+        stores = load_config(self.config, self.deserialize)
+        self.assertEqual(stores[0].get_item_history("item1.html"), [Decimal(500), Decimal(370)])
+        stores[0].items.close()
+
+        # items added to the configuration are added to the file
+        self.write_config({"item1.html": [], "item2.html": ["10"]})
+
+        stores = load_config(self.config, self.deserialize)
+        self.assertEqual(stores[0].get_item_ids(), ["item1.html", "item2.html"])
+        self.assertEqual(stores[0].get_item_history("item1.html"), [Decimal(500), Decimal(370)])
+        self.assertEqual(stores[0].get_item_history("item2.html"), [Decimal(10)])
+        stores[0].items.close()
+
+        # and items removed from it are removed from the file
+        self.write_config({"item2.html": []})
+
+        stores = load_config(self.config, self.deserialize)
+        self.assertEqual(stores[0].get_item_ids(), ["item2.html"])
+        self.assertEqual(stores[0].get_item_history("item2.html"), [Decimal(10)])
+        stores[0].items.close()
+
+    def test_processes_are_rejected(self):
+        self.write_config({"item1.html": ["500"]})
+        stores = load_config(self.config, self.deserialize)
+
+        with self.assertRaises(RuntimeError):
+            horus.execute_tasks(stores, processes=2)
+        stores[0].items.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
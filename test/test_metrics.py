@@ -0,0 +1,204 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import os
+import json
+import asyncio
+import shutil
+import tempfile
+import unittest
+
+from unittest import mock
+
+from main.agent import Agent
+from main.async_agent import AsyncAgent
+from main.interfaces import AsyncEngine, Engine, Notifier, NOT_MODIFIED, implements
+from main.metrics import Metrics, instrumented
+from test.fixtures import make_store
+
+class FakeClock():
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+class PriceEngine(Engine):
+
+    def fetch(self, server_url, item_id):
+        if item_id == "missing":
+            raise RuntimeError("Item not found")
+        return NOT_MODIFIED if item_id == "same" else 100
+
+    def compare(self, latest_data_point, history):
+        return True
+
+    def wait(self):
+        pass
+
+class BatchEngine(PriceEngine):
+
+    def fetch_many(self, server_url, item_ids):
+        return [100] * len(item_ids)
+
+class AsyncPriceEngine(AsyncEngine):
+
+    async def fetch(self, server_url, item_id):
+        return 100
+
+    def compare(self, latest_data_point, history):
+        return True
+
+    async def wait(self):
+        pass
+
+class CountingNotifier(Notifier):
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, item_id, latest_data_point):
+        self.count += 1
+
+    def alert(self):
+        pass
+
+class TestMetrics(unittest.TestCase):
+    """Tests the timings and counts recorded for agent runs"""
+
+    def test_summaries_and_counts(self):
+        metrics = Metrics(clock=FakeClock())
+
+        with metrics.timer("fetch", "TEST"):
+            pass
+        metrics.observe("fetch", "TEST", 3)
+        metrics.count("items", "TEST", 2)
+
+        with self.assertRaises(KeyError):
+            with metrics.timer("save", None):
+                raise KeyError("failed")
+
+        self.assertEqual(metrics.timings[("fetch", "TEST")], [2, 4, 3])
+        self.assertEqual(metrics.events[("items", "TEST")], 2)
+        self.assertEqual(metrics.events[("save_errors", None)], 1)
+
+    def test_prometheus_format(self):
+        metrics = Metrics()
+        metrics.observe("fetch", 'a "quoted"\\task', 0.5)
+        metrics.observe("load", None, 0.25)
+        metrics.count("items", "TEST")
+
+        lines = metrics.to_prometheus().splitlines()
+
+        self.assertIn('horus_phase_seconds_count{phase="fetch",task="a \\"quoted\\"\\\\task"} 1',
+                      lines)
+        self.assertIn('horus_phase_seconds_sum{phase="load"} 0.25', lines)
+        self.assertIn('horus_events_total{event="items",task="TEST"} 1', lines)
+        self.assertIn("# TYPE horus_phase_seconds summary", lines)
+
+    def test_write_json(self):
+        metrics = Metrics()
+        metrics.observe("fetch", "TEST", 0.5)
+        fd, filename = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+
+        metrics.write(filename)
+
+        with open(filename) as fp:
+            data = json.load(fp)
+        os.remove(filename)
+
+        self.assertEqual(data["timings"], [{"phase": "fetch", "task": "TEST", "count": 1,
+                                            "seconds": 0.5, "max_seconds": 0.5}])
+
+    def test_write_replaces_the_file(self):
+        """Tests that a failed write leaves the previous metrics in place"""
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, "metrics.prom")
+
+        metrics = Metrics()
+        metrics.observe("fetch", "TEST", 0.5)
+        metrics.write(filename)
+
+        with open(filename) as fp:
+            written = fp.read()
+
+        with mock.patch.object(Metrics, "to_prometheus", side_effect=RuntimeError("Failed")):
+            with self.assertRaises(RuntimeError):
+                metrics.write(filename)
+
+        with open(filename) as fp:
+            self.assertEqual(fp.read(), written)
+        self.assertEqual(os.listdir(directory), ["metrics.prom"])
+        shutil.rmtree(directory)
+
+    def test_agent_runs_are_recorded(self):
+        metrics = Metrics()
+        data_store = make_store(["item1", "item2", "same"])
+
+        Agent(data_store, metrics).execute(CountingNotifier(), PriceEngine())
+
+        self.assertEqual(metrics.timings[("execute", "TEST")][0], 1)
+        self.assertEqual(metrics.timings[("fetch", "TEST")][0], 3)
+        self.assertEqual(metrics.timings[("compare", "TEST")][0], 3)
+        self.assertEqual(metrics.timings[("wait", "TEST")][0], 2)
+        self.assertEqual(metrics.timings[("alert", "TEST")][0], 1)
+        self.assertEqual(metrics.events[("items", "TEST")], 3)
+        self.assertEqual(metrics.events[("not_modified", "TEST")], 1)
+        self.assertEqual(metrics.events[("notifications", "TEST")], 3)
+
+    def test_errors_are_counted(self):
+        metrics = Metrics()
+
+        with self.assertLogs("horus", "WARNING"):
+            Agent(make_store(["missing", "item1"]), metrics).execute(CountingNotifier(),
+                                                                     PriceEngine())
+
+        self.assertEqual(metrics.events[("fetch_errors", "TEST")], 1)
+        self.assertEqual(metrics.events[("errors", "TEST")], 1)
+        self.assertEqual(metrics.events[("failed", "TEST")], 1)
+        self.assertEqual(metrics.events[("items", "TEST")], 1)
+
+    def test_optional_functions_are_kept(self):
+        metrics = Metrics()
+
+        self.assertFalse(implements(instrumented(PriceEngine(), metrics, "TEST"), "fetch_many"))
+        self.assertTrue(implements(instrumented(BatchEngine(), metrics, "TEST"), "fetch_many"))
+        self.assertIsInstance(instrumented(AsyncPriceEngine(), metrics, "TEST"), AsyncEngine)
+
+        data_store = make_store(["item1", "item2"])
+        Agent(data_store, metrics).execute(CountingNotifier(), BatchEngine())
+        self.assertEqual(metrics.timings[("fetch_many", "TEST")][0], 1)
+
+    def test_async_agent_runs_are_recorded(self):
+        metrics = Metrics()
+        data_store = make_store(["item1", "item2"])
+        loop = asyncio.new_event_loop()
+
+        try:
+            loop.run_until_complete(AsyncAgent(data_store, metrics).execute(
+                CountingNotifier(), AsyncPriceEngine()))
+        finally:
+            loop.close()
+
+        self.assertEqual(metrics.timings[("fetch", "TEST")][0], 2)
+        self.assertEqual(metrics.events[("items", "TEST")], 2)
+
+if __name__ == '__main__':
+    unittest.main()
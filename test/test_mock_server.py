@@ -0,0 +1,116 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import io
+import sys
+import unittest
+import subprocess
+import http.client
+import requests
+
+from unittest import mock
+
+from main.agent import Agent
+from main.data_store import DataStore
+from main.interfaces import NOT_MODIFIED
+from test.fixtures import PriceEngine, SilentNotifier
+from test.mock_server import MockServer, make_payload
+
+class TestMockServer(unittest.TestCase):
+    """Tests the mock server used by end to end and load tests"""
+
+    def test_payloads(self):
+        with MockServer() as server:
+            response = requests.get("http://" + server.url + "/any/item")
+            self.assertEqual(response.text, make_payload("/any/item"))
+
+        with MockServer(directory="./test/files") as server:
+            self.assertEqual(requests.get("http://" + server.url + "/item2.html").text, "345\n")
+            self.assertEqual(requests.get("http://" + server.url + "/none.html").status_code, 404)
+
+    def test_paths_outside_the_directory(self):
+        with MockServer(directory="./test/files") as server:
+            for path in ("/../mock_server.py", "/item1.html/../../mock_server.py",
+                         "//etc/passwd"):
+                connection = http.client.HTTPConnection(server.url)
+                connection.request("GET", path)
+                self.assertEqual(connection.getresponse().status, 404)
+                connection.close()
+
+    def test_clients_hanging_up_are_not_logged(self):
+        with MockServer() as server:
+            try:
+                raise BrokenPipeError()
+            except BrokenPipeError:
+                with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+                    server.server.handle_error(None, ("127.0.0.1", 0))
+
+        self.assertEqual(stderr.getvalue(), "")
+
+    def test_unchanged_items_are_not_modified(self):
+        engine = PriceEngine()
+        engine.use_states({})
+
+        with MockServer() as server:
+            self.assertEqual(engine.fetch(server.url, "item1"), int(make_payload("/item1")))
+            self.assertIs(engine.fetch(server.url, "item1"), NOT_MODIFIED)
+
+        engine.close()
+        self.assertEqual(server.statuses, {200: 1, 304: 1})
+
+    def test_errors_and_rate_limit(self):
+        with MockServer(error_rate=1) as server:
+            self.assertEqual(requests.get("http://" + server.url + "/item").status_code, 500)
+
+        with MockServer(rate_limit=1, retry_after=3) as server:
+            requests.get("http://" + server.url + "/item")
+            response = requests.get("http://" + server.url + "/item")
+
+        # unless the second request went out in the next second
+        if server.statuses[429] == 1:
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers["Retry-After"], "3")
+
+    def test_concurrent_fetches(self):
+        data_store = DataStore("TEST")
+        data_store.items = {"item" + str(i): [] for i in range(16)}
+
+        with MockServer(latency=0.05, jitter=0.01, seed=1) as server:
+            data_store.keys = {"server_url": server.url, "max_history_length": 2, "workers": 4}
+            engine = PriceEngine(pool_size=4)
+            Agent(data_store).execute(SilentNotifier(), engine)
+            engine.close()
+
+        self.assertEqual(server.statuses[200], 16)
+        self.assertGreater(server.max_in_flight, 1)
+        self.assertLessEqual(server.max_in_flight, 4)
+
+    def test_script_signals_readiness(self):
+        process = subprocess.Popen([sys.executable, "./test/mock_server.py", "0"],
+                                   stdout=subprocess.PIPE)
+        try:
+            ready, port = process.stdout.readline().decode().split()
+            self.assertEqual(ready, "READY")
+            response = requests.get("http://127.0.0.1:" + port + "/item")
+            self.assertEqual(response.text, make_payload("/item"))
+        finally:
+            process.terminate()
+            process.wait()
+            process.stdout.close()
+
+if __name__ == '__main__':
+    unittest.main()
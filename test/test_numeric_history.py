@@ -0,0 +1,105 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import os
+import pickle
+
+from decimal import Decimal
+from horus import load_config, save_config
+from main.numeric_history import NumericHistoryTable
+
+class TestNumericHistoryTable(unittest.TestCase):
+    """Tests the columnar numeric history storage"""
+
+    def test_rows_keep_newest_data_points(self):
+        table = NumericHistoryTable(3, "decimal")
+        table["a"] = [Decimal("1.5"), Decimal("2.25")]
+        table["b"] = [Decimal(1), Decimal(2), Decimal(3), Decimal(4)]
+
+        self.assertEqual(list(table), ["a", "b"])
+        self.assertEqual(table["a"], [Decimal("1.5"), Decimal("2.25")])
+        self.assertEqual(table["b"], [Decimal(2), Decimal(3), Decimal(4)])
+        self.assertTrue(isinstance(table["a"][-1], Decimal))
+        self.assertEqual(len(table.data_points), 6)
+
+        table["a"].append(Decimal("370.00"))
+        table["a"].append(Decimal("385.10"))
+
+        self.assertEqual(table["a"], [Decimal("2.25"), Decimal("370"), Decimal("385.1")])
+        self.assertEqual(table["a"][0], Decimal("2.25"))
+        self.assertEqual(table["b"], [Decimal(2), Decimal(3), Decimal(4)])
+
+    def test_delete_row(self):
+        table = NumericHistoryTable(2, "int")
+        table["a"] = [1]
+        table["b"] = [2, 3]
+        table["c"] = [4]
+
+        del table["a"]
+
+        self.assertEqual(dict(table.items()), {"b": [2, 3], "c": [4]})
+        self.assertEqual(list(table.values()), [[2, 3], [4]])
+        self.assertEqual(len(table.data_points), 4)
+
+    def test_inexact_data_points_are_rejected(self):
+        decimals = NumericHistoryTable(2, "decimal")
+        ints = NumericHistoryTable(2, "int")
+
+        with self.assertRaises(RuntimeError):
+            decimals["a"] = [Decimal("12345678901234567.89")]
+        with self.assertRaises(RuntimeError):
+            ints["a"] = [2 ** 60 + 1]
+
+        ints["a"] = [2 ** 53]
+        decimals["a"] = [Decimal("123456789012345"), Decimal("10.50")]
+
+        self.assertEqual(ints["a"], [2 ** 53])
+        self.assertEqual(str(decimals["a"][-1]), "10.5")
+
+    def test_invalid_type(self):
+        with self.assertRaises(RuntimeError):
+            NumericHistoryTable(2, "complex")
+
+    def test_pickles(self):
+        table = NumericHistoryTable(2, "float")
+        table["a"] = [1.0, 2.5]
+
+        self.assertEqual(pickle.loads(pickle.dumps(table))["a"], [1.0, 2.5])
+
+    def test_loaded_from_config(self):
+        """Tests that tasks setting 'numeric_history' are loaded into a table and
+        saved back like any other task"""
+        deserialize = lambda task, data_str: Decimal(data_str)
+        serialize = lambda task, data_pt: str(data_pt)
+
+        stores = load_config("./test/input_config.json", deserialize)
+        stores[0].keys["numeric_history"] = "decimal"
+        save_config(stores, "./test/output_config.json", serialize)
+        new_stores = load_config("./test/output_config.json", deserialize)
+        os.remove("./test/output_config.json")
+
+        self.assertTrue(isinstance(new_stores[0].items, NumericHistoryTable))
+        self.assertFalse(isinstance(new_stores[1].items, NumericHistoryTable))
+        self.assertEqual(stores, new_stores)
+
+        new_stores[0].append_item_history("item1.html", Decimal(370), 2)
+        self.assertEqual(new_stores[0].get_item_history("item1.html"), [Decimal(500), Decimal(370)])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,190 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import random
+import threading
+import unittest
+
+from main.agent import Agent
+from main.data_store import DataStore
+from main.interfaces import Engine, Notifier, NOT_MODIFIED
+from main.metrics import Metrics
+from test.fixtures import PriceEngine, make_store
+from test.mock_server import MockServer
+
+class RawEngine(Engine):
+    """Fetches raw strings and parses them into ints, sleeping for a while in both"""
+
+    def __init__(self, fetch_delay=0, parse_delay=0, jitter=0):
+        self.fetch_delay = fetch_delay
+        self.parse_delay = parse_delay
+        self.jitter = jitter
+        self.random = random.Random(0)
+        self.fetched = 0
+        self.lock = threading.Lock()
+
+    def sleep(self, delay):
+        with self.lock:
+            delay += self.random.uniform(0, self.jitter)
+        time.sleep(delay)
+
+    def fetch(self, server_url, item_id):
+        raw = self.fetch_raw(server_url, item_id)
+        return raw if raw is NOT_MODIFIED else self.parse_raw(item_id, raw)
+
+    def fetch_raw(self, server_url, item_id):
+        self.sleep(self.fetch_delay)
+        with self.lock:
+            self.fetched += 1
+
+        if item_id.startswith("same"):
+            return NOT_MODIFIED
+        if item_id.startswith("down"):
+            raise RuntimeError("Server error")
+
+        return item_id.split("-")[-1]
+
+    def parse_raw(self, item_id, raw):
+        self.sleep(self.parse_delay)
+        return int(raw)
+
+    def compare(self, latest_data_point, history):
+        return latest_data_point < history[-1]
+
+    def wait(self):
+        pass
+
+class BatchEngine(RawEngine):
+
+    def fetch_many(self, server_url, item_ids):
+        return [int(i.split("-")[-1]) for i in item_ids]
+
+class RecordingNotifier(Notifier):
+
+    def __init__(self):
+        self.added = []
+        self.alerts = 0
+
+    def add(self, item_id, latest_data_point):
+        self.added.append((item_id, latest_data_point))
+
+    def alert(self):
+        self.alerts += 1
+
+class CountingDataStore(DataStore):
+    """Records the most items fetched but not recorded yet"""
+
+    def __init__(self, engine):
+        super().__init__("TEST")
+        self.engine = engine
+        self.recorded = 0
+        self.max_pending = 0
+
+    def append_item_history(self, item_id, data_point, max_length):
+        self.max_pending = max(self.max_pending, self.engine.fetched - self.recorded)
+        self.recorded += 1
+        super().append_item_history(item_id, data_point, max_length)
+
+class TestPipeline(unittest.TestCase):
+    """Tests the staged pipeline of the agent"""
+
+    def test_same_results_as_the_serial_agent(self):
+        items = ["item" + str(i) + "-" + str(100 + 10 * i) for i in range(12)] + ["same-1"]
+        serial = make_store(items, [150])
+        pipelined = make_store(items, [150], pipeline=True, workers=3, parse_workers=2,
+                               compare_workers=2)
+        serial_notifier = RecordingNotifier()
+        notifier = RecordingNotifier()
+
+        Agent(serial).execute(serial_notifier, RawEngine())
+        Agent(pipelined).execute(notifier, RawEngine(0.001, 0.001, jitter=0.01))
+
+        self.assertEqual(pipelined.items, serial.items)
+        self.assertEqual(notifier.added, serial_notifier.added)
+        self.assertEqual(notifier.added[0], ("item0-100", 100))
+        self.assertEqual(notifier.alerts, 1)
+
+    def test_stages_overlap(self):
+        items = ["item" + str(i) + "-100" for i in range(10)]
+        start = time.monotonic()
+
+        Agent(make_store(items, [150], pipeline=True)).execute(RecordingNotifier(),
+                                                               RawEngine(0.05, 0.05))
+
+        # fetching and parsing one after the other would take a second
+        self.assertLess(time.monotonic() - start, 0.9)
+
+    def test_queue_size_bounds_the_items_in_flight(self):
+        engine = RawEngine(parse_delay=0.01)
+        items = ["item" + str(i) + "-100" for i in range(20)]
+        data_store = make_store(items, [150], CountingDataStore(engine), pipeline=True,
+                                workers=4, queue_size=3)
+
+        Agent(data_store).execute(RecordingNotifier(), engine)
+
+        self.assertEqual(data_store.recorded, 20)
+        self.assertLessEqual(data_store.max_pending, 3)
+
+    def test_failed_items_keep_their_history(self):
+        data_store = make_store(["item1-100", "down-1", "item2-x", "item3-200"], [150],
+                                pipeline=True, workers=2)
+
+        with self.assertLogs("horus", "WARNING"):
+            Agent(data_store).execute(RecordingNotifier(), RawEngine())
+
+        self.assertEqual(data_store.items, {"item1-100": [150, 100], "down-1": [150],
+                                            "item2-x": [150], "item3-200": [150, 200]})
+
+    def test_errors_stop_the_pipeline(self):
+        data_store = make_store(["item1-100", "same-1", "item2-100"], [150], pipeline=True)
+        data_store.items["same-1"] = []
+
+        with self.assertRaises(RuntimeError):
+            Agent(data_store).execute(RecordingNotifier(), RawEngine())
+
+        self.assertEqual(data_store.items["item1-100"], [150, 100])
+        self.assertEqual(data_store.items["item2-100"], [150])
+
+    def test_engines_without_raw_fetches(self):
+        data_store = make_store(["item1-100", "item2-200", "item3-300"], [150],
+                                pipeline=True, batch_size=2)
+
+        Agent(data_store).execute(RecordingNotifier(), BatchEngine())
+
+        self.assertEqual(data_store.items["item3-300"], [150, 300])
+
+    def test_http_engine(self):
+        metrics = Metrics()
+
+        with MockServer() as server:
+            data_store = make_store(["item1", "item2"], [150], pipeline=True,
+                                    server_url=server.url, workers=2)
+            engine = PriceEngine()
+            Agent(data_store, metrics).execute(RecordingNotifier(), engine)
+            engine.close()
+
+        self.assertEqual(len(data_store.items["item2"]), 2)
+        self.assertEqual(metrics.timings[("parse", "TEST")][0], 2)
+
+    def test_invalid_stage_workers(self):
+        with self.assertRaises(RuntimeError):
+            Agent(make_store([], pipeline=True, parse_workers=0)).execute(RecordingNotifier(),
+                                                                          RawEngine())
+
+if __name__ == '__main__':
+    unittest.main()
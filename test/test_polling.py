@@ -0,0 +1,102 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import collections
+
+from main.agent import Agent
+from main.data_store import DataStore
+from main.interfaces import Engine, Notifier
+from main.polling import AdaptivePolling
+
+class TestAdaptivePolling(unittest.TestCase):
+    """Tests the adaptive polling of items"""
+
+    class TestEngine(Engine):
+
+        def __init__(self):
+            self.fetched = []
+
+        def fetch(self, server_url, item_id):
+            self.fetched.append(item_id)
+            return 5 if item_id == "stable" else len(self.fetched)
+
+        def compare(self, latest_data_point, history):
+            return False
+
+        def wait(self):
+            pass
+
+    class TestNotifier(Notifier):
+
+        def add(self, item_id, latest_data_point):
+            pass
+
+        def alert(self):
+            pass
+
+    def test_interval(self):
+        polling = AdaptivePolling(8)
+
+        self.assertEqual(polling.interval([]), 1)
+        self.assertEqual(polling.interval([1]), 1)
+        self.assertEqual(polling.interval([1, 1, 1]), 8)
+        self.assertEqual(polling.interval([1, 2, 3]), 1)
+        self.assertEqual(polling.interval([1, 1, 1, 2, 2, 2, 3]), 3)
+
+        # histories are only iterated, not copied
+        self.assertEqual(polling.interval(iter([1, 1, 1, 2, 2, 2, 3])), 3)
+
+    def test_skipped_runs_count_down(self):
+        polling = AdaptivePolling(3)
+        state = {}
+
+        polling.polled(state, [1, 1, 1])
+        self.assertEqual(state, {"skip": 2})
+
+        self.assertFalse(polling.is_due(state))
+        self.assertFalse(polling.is_due(state))
+        self.assertEqual(state, {})
+        self.assertTrue(polling.is_due(state))
+
+    def test_invalid_interval(self):
+        with self.assertRaises(RuntimeError):
+            AdaptivePolling(0)
+
+    def test_agent_skips_stable_items(self):
+        """Tests that an agent polls items that don't change less often"""
+        ds = DataStore("POLLING_TEST")
+        ds.keys = {"server_url": "localhost", "max_history_length": 4, "max_poll_interval": 3}
+        ds.items = collections.OrderedDict([("stable", [5, 5, 5]), ("volatile", [1, 2, 3])])
+
+        engine = self.TestEngine()
+        runs = []
+
+        for run in range(7):
+            engine.fetched = []
+            Agent(ds).execute(self.TestNotifier(), engine)
+            runs.append(engine.fetched)
+
+        self.assertEqual(runs, [["stable", "volatile"], ["volatile"], ["volatile"],
+                                ["stable", "volatile"], ["volatile"], ["volatile"],
+                                ["stable", "volatile"]])
+        self.assertEqual(ds.get_item_history("stable"), [5, 5, 5, 5])
+        self.assertEqual(ds.get_item_states(), {"stable": {"skip": 2}})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import time
+import threading
+import unittest
+
+from main.agent import Agent
+from main.data_store import DataStore
+from main.interfaces import Engine, implements
+from main.rate_limit import RateLimiter, Throttled, limited, parse_retry_after
+from test.fixtures import PriceEngine, SilentNotifier
+from test.mock_server import MockServer
+
+class BusyEngine(Engine):
+    """Throttles the first fetches, then returns a data point"""
+
+    def __init__(self, throttled=0, retry_after=None):
+        self.throttled = throttled
+        self.retry_after = retry_after
+        self.fetches = 0
+        self.waits = 0
+
+    def fetch(self, server_url, item_id):
+        self.fetches += 1
+
+        if self.fetches <= self.throttled:
+            raise Throttled("429", self.retry_after)
+
+        return 100
+
+    def compare(self, latest_data_point, history):
+        return False
+
+    def wait(self):
+        self.waits += 1
+
+class BatchEngine(BusyEngine):
+
+    def fetch_many(self, server_url, item_ids):
+        return [100] * len(item_ids)
+
+class TestRateLimit(unittest.TestCase):
+    """Tests the adaptive rate limiter"""
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after("120"), 120)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after("soon"))
+        self.assertEqual(parse_retry_after("Wed, 21 Oct 2015 07:28:30 GMT",
+                                           now=1445412470), 40)
+
+    def test_hosts_are_shared(self):
+        limiter = RateLimiter()
+        self.assertIs(limiter.host("localhost:8000/task1"), limiter.host("localhost:8000/task2"))
+        self.assertIsNot(limiter.host("localhost:8000"), limiter.host("localhost:9000"))
+
+    def test_rate_adapts(self):
+        host = RateLimiter(rate=4, max_rate=5, max_concurrency=2).host("localhost")
+
+        for i in range(10):
+            host.acquire()
+            host.release(True)
+        self.assertEqual(host.rate, 5)
+        self.assertEqual(host.concurrency, 2)
+
+        host.acquire()
+        host.release(False)
+        self.assertEqual(host.rate, 5)
+
+        host.acquire()
+        host.release(False, True)
+        self.assertEqual(host.rate, 2.5)
+        self.assertEqual(host.concurrency, 1)
+
+    def test_requests_are_paced(self):
+        host = RateLimiter(rate=20, max_rate=20).host("localhost")
+        start = time.monotonic()
+
+        for i in range(5):
+            host.acquire()
+            host.release(True)
+
+        # one token is there at first, the others come every 50 ms
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+    def test_concurrency_is_limited(self):
+        host = RateLimiter(rate=100).host("localhost")
+        host.acquire()
+
+        second = threading.Thread(target=host.acquire)
+        second.start()
+        second.join(0.1)
+        self.assertTrue(second.is_alive())
+
+        host.release(True)
+        second.join()
+
+    def test_throttled_fetches_are_retried(self):
+        engine = BusyEngine(throttled=2, retry_after=0.05)
+        limiter = RateLimiter(rate=100)
+        limited_engine = limited(engine, limiter)
+
+        self.assertEqual(limited_engine.fetch("localhost", "item1"), 100)
+        self.assertEqual(engine.fetches, 3)
+        self.assertEqual(limiter.host("localhost").rate, 25.04)
+
+        limited_engine.wait()
+        self.assertEqual(engine.waits, 0)
+
+        with self.assertRaises(Throttled):
+            limited(BusyEngine(throttled=3), limiter).fetch("example.com", "item1")
+
+    def test_long_retry_after_fails_fast(self):
+        limiter = RateLimiter(rate=100, max_wait=1)
+        engine = limited(BusyEngine(throttled=1, retry_after=3600), limiter)
+
+        with self.assertRaises(Throttled):
+            engine.fetch("localhost", "item1")
+
+        # the other items of the host fail without a request
+        other = BusyEngine()
+        with self.assertRaises(Throttled):
+            limited(other, limiter).fetch("localhost", "item2")
+        self.assertEqual(other.fetches, 0)
+
+    def test_optional_functions_are_kept(self):
+        limiter = RateLimiter()
+        self.assertFalse(implements(limited(BusyEngine(), limiter), "fetch_many"))
+        self.assertEqual(limited(BatchEngine(), limiter).fetch_many("localhost", ["a", "b"]),
+                         [100, 100])
+
+    def test_agent_slows_down_for_the_server(self):
+        data_store = DataStore("TEST")
+        data_store.items = {"item" + str(i): [] for i in range(8)}
+
+        with MockServer(rate_limit=5, retry_after=1) as server:
+            data_store.keys = {"server_url": server.url, "max_history_length": 2,
+                               "workers": 4}
+            engine = PriceEngine(pool_size=4)
+            Agent(data_store).execute(SilentNotifier(), limited(engine, RateLimiter(rate=50)))
+            engine.close()
+
+        self.assertTrue(all(len(h) == 1 for h in data_store.items.values()))
+        self.assertEqual(server.statuses[200], 8)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import sys
+import decimal
+import unittest
+
+from unittest import mock
+from main.registry import Registry, load_plugin
+from main.http_engine import HttpEngine
+
+class ReversedCodec():
+
+    @staticmethod
+    def serialize(data):
+        return data[::-1]
+
+    @staticmethod
+    def deserialize(data):
+        return data[::-1]
+
+class TestRegistry(unittest.TestCase):
+    """Tests the lookup of the plugins named by tasks"""
+
+    def test_plugin_names(self):
+        self.assertIs(load_plugin("decimal.Decimal", "horus.codecs"), decimal.Decimal)
+        self.assertIs(load_plugin("main.http_engine:HttpEngine.parse", "horus.engines"),
+                      HttpEngine.parse)
+        self.assertIs(load_plugin("int", "horus.codecs"), int)
+
+        with self.assertRaises(RuntimeError):
+            load_plugin("no_such_plugin", "horus.codecs")
+        with self.assertRaises(RuntimeError):
+            load_plugin("decimal.NoSuchType", "horus.codecs")
+
+    def test_entry_points_come_first(self):
+        with mock.patch("main.registry.find_entry_point", lambda group, name: float):
+            self.assertIs(load_plugin("int", "horus.codecs"), float)
+
+    def test_plugins_are_imported_lazily_and_once(self):
+        registry = Registry()
+        registry.configure("TEST", {"engine": "test.test_registry_plugin.Engine"})
+        self.assertNotIn("test.test_registry_plugin", sys.modules)
+
+        with mock.patch("main.registry.importlib.import_module",
+                        return_value=mock.Mock(Engine=dict)) as import_module:
+            registry.configure("OTHER", {"engine": "test.test_registry_plugin.Engine",
+                                         "engine_options": {"delay": 1}})
+            self.assertEqual(registry.create("TEST", "engine"), {})
+            self.assertEqual(registry.create("OTHER", "engine"), {"delay": 1})
+
+        self.assertEqual(import_module.call_count, 1)
+
+    def test_same_name_in_several_groups(self):
+        registry = Registry()
+        registry.configure("TEST", {"engine": "shop", "notifier": "shop"})
+        plugins = {("horus.engines", "shop"): HttpEngine, ("horus.notifiers", "shop"): dict}
+
+        with mock.patch("main.registry.find_entry_point",
+                        lambda group, name: plugins.get((group, name))):
+            self.assertIs(registry.plugin("TEST", "engine"), HttpEngine)
+            self.assertIs(registry.plugin("TEST", "notifier"), dict)
+
+    def test_codecs(self):
+        registry = Registry()
+        registry.configure("DECIMAL", {"codec": "decimal.Decimal"})
+        registry.configure("REVERSED", {"codec": "test.test_registry.ReversedCodec"})
+
+        self.assertEqual(registry.deserialize("DECIMAL", "1.10"), decimal.Decimal("1.10"))
+        self.assertEqual(registry.serialize("DECIMAL", decimal.Decimal("1.10")), "1.10")
+        self.assertEqual(registry.deserialize("REVERSED", "abc"), "cba")
+        self.assertEqual(registry.serialize("REVERSED", "cba"), "abc")
+
+    def test_unconfigured_tasks(self):
+        registry = Registry()
+        registry.configure("TEST", {"engine": "main.http_engine.HttpEngine"})
+
+        self.assertTrue(registry.has("TEST", "engine"))
+        self.assertFalse(registry.has("TEST", "notifier"))
+
+        with self.assertRaises(RuntimeError):
+            registry.create("TEST", "notifier")
+        with self.assertRaises(RuntimeError):
+            registry.deserialize("OTHER", "1")
+
+if __name__ == '__main__':
+    unittest.main()
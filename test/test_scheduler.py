@@ -0,0 +1,75 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import threading
+
+from main.scheduler import Scheduler
+
+class TestScheduler(unittest.TestCase):
+    """Tests the per-task interval scheduler"""
+
+    def setUp(self):
+        self.now = 0
+        self.scheduler = Scheduler(clock=lambda: self.now)
+        self.calls = []
+
+    def test_functions_run_on_their_interval(self):
+        self.scheduler.add(10, lambda: self.calls.append("a"))
+        self.scheduler.add(25, lambda: self.calls.append("b"), delay=5)
+
+        self.assertEqual(self.scheduler.run_pending(), 5)
+        self.assertEqual(self.calls, ["a"])
+
+        self.now = 5
+        self.assertEqual(self.scheduler.run_pending(), 5)
+        self.now = 10
+        self.assertEqual(self.scheduler.run_pending(), 10)
+        self.now = 30
+        self.scheduler.run_pending()
+
+        self.assertEqual(self.calls, ["a", "b", "a", "a", "b"])
+
+    def test_late_runs_are_not_repeated(self):
+        self.scheduler.add(10, lambda: self.calls.append("a"))
+        self.scheduler.run_pending()
+
+        self.now = 95
+        self.assertEqual(self.scheduler.run_pending(), 10)
+        self.assertEqual(self.calls, ["a", "a"])
+
+    def test_invalid_interval(self):
+        with self.assertRaises(RuntimeError):
+            self.scheduler.add(0, lambda: None)
+
+    def test_run_until_stopped(self):
+        stopped = threading.Event()
+        scheduler = Scheduler()
+
+        def call():
+            self.calls.append("a")
+            if len(self.calls) == 3:
+                stopped.set()
+
+        scheduler.add(0.01, call)
+        scheduler.run(stopped)
+
+        self.assertEqual(len(self.calls), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+#     Copyright 2018-2019 Haresh Bhagchandani
+#
+#     This file is part of Horus.
+#
+#     Horus is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     Horus is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with Horus.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+import json
+import os
+import tempfile
+
+from horus import load_config
+from main import sqlite_data_store
+from main.agent import Agent
+from main.interfaces import Engine, NOT_MODIFIED
+from test.fixtures import SilentNotifier
+
+class TestSqliteDataStore(unittest.TestCase):
+    """Tests the data stores kept in a SQLite database"""
+
+    deserialize = staticmethod(lambda task, data_str: int(data_str))
+    serialize = staticmethod(lambda task, data_pt: str(data_pt))
+
+    def setUp(self):
+        fd, self.database = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.connection = sqlite_data_store.connect(self.database)
+        sqlite_data_store.import_config(self.connection, "./test/input_config.json")
+
+    def tearDown(self):
+        self.connection.close()
+        os.remove(self.database)
+
+    def load(self):
+        return sqlite_data_store.load_stores(self.connection, self.serialize, self.deserialize)
+
+    def test_import_matches_config(self):
+        stores = self.load()
+
+        self.assertEqual([ds.task_id for ds in stores], ["TEST1", "TEST2"])
+        self.assertEqual(stores, load_config("./test/input_config.json", self.deserialize))
+        self.assertEqual(stores[0].get_config_value("max_history_length"), 2)
+        self.assertFalse(stores[0].modified)
+
+        with self.assertRaises(KeyError):
+            stores[0].get_config_value("keyblade")
+
+    def test_history_updates_are_written(self):
+        stores = self.load()
+        stores[0].append_item_history("item1.html", 400, 2)
+        stores[0].append_item_history("item1.html", 300, 2)
+        stores[0].get_item_states()["item2.html"] = {"etag": "x"}
+        stores[0].set_item_history("item2.html", [1])
+
+        self.assertTrue(stores[0].modified)
+
+        # a new connection sees the changes
+        self.connection.close()
+        self.connection = sqlite_data_store.connect(self.database)
+        new_stores = self.load()
+
+        self.assertEqual(new_stores[0].get_item_history("item1.html"), [400, 300])
+        self.assertEqual(new_stores[0].get_item_history("item2.html"), [1])
+        self.assertEqual(new_stores[0].get_item_states(), {"item2.html": {"etag": "x"}})
+        self.assertEqual(new_stores[1].get_item_history("item1.html"), [120])
+
+    def test_item_states_are_written(self):
+        stores = self.load()
+        stores[0].set_item_state("item1.html", {"skip": 2})
+        stores[0].set_item_state("item2.html", {})
+
+        self.assertTrue(stores[0].modified)
+        self.assertEqual(self.load()[0].get_item_states(), {"item1.html": {"skip": 2}})
+
+        stores[0].set_item_state("item1.html", {})
+        self.assertEqual(self.load()[0].get_item_states(), {})
+
+    def set_keys(self, task_id, **values):
+        """Sets configuration keys of a task in the database"""
+        keys = json.loads(self.connection.execute("SELECT keys FROM tasks WHERE task_id = ?",
+                                                  (task_id,)).fetchone()[0])
+        keys.update(values)
+        with self.connection:
+            self.connection.execute("UPDATE tasks SET keys = ? WHERE task_id = ?",
+                                    (json.dumps(keys), task_id))
+
+    def test_adaptive_polling(self):
+        """Tests that the polling states of fetched and skipped items are kept"""
+        self.set_keys("TEST1", max_poll_interval=4)
+
+        class ConstantEngine(Engine):
+
+            def __init__(self):
+                self.fetched = []
+
+            def fetch(self, server_url, item_id):
+                self.fetched.append(item_id)
+                return {"item1.html": 500, "item2.html": 560}[item_id]
+
+            def compare(self, latest_data_point, history):
+                return False
+
+            def wait(self):
+                pass
+
+        engine = ConstantEngine()
+        for run in range(4):
+            Agent(self.load()[0]).execute(SilentNotifier(), engine)
+
+        # items that never change are fetched once every 4 runs
+        self.assertEqual(engine.fetched, ["item1.html", "item2.html"])
+        self.assertEqual(self.load()[0].get_item_history("item1.html"), [500, 500])
+
+    def test_pipeline(self):
+        """Tests that the stages of a pipeline running on other threads don't use the
+        connection, which only works on the thread that opened it"""
+        self.set_keys("TEST1", pipeline=True, workers=2, compare_workers=2)
+
+        class DropEngine(Engine):
+
+            def fetch(self, server_url, item_id):
+                return NOT_MODIFIED if item_id == "item2.html" else 400
+
+            def compare(self, latest_data_point, history):
+                return latest_data_point < history[-1]
+
+            def wait(self):
+                pass
+
+        class RecordingNotifier(SilentNotifier):
+
+            def __init__(self):
+                self.added = []
+
+            def add(self, item_id, latest_data_point):
+                self.added.append((item_id, latest_data_point))
+
+        notifier = RecordingNotifier()
+        Agent(self.load()[0]).execute(notifier, DropEngine())
+
+        self.assertEqual(notifier.added, [("item1.html", 400)])
+        self.assertEqual(self.load()[0].get_item_history("item1.html"), [500, 400])
+        self.assertEqual(self.load()[0].get_item_history("item2.html"), [560, 560])
+
+    def test_unknown_items(self):
+        ds = self.load()[0]
+
+        with self.assertRaises(KeyError):
+            ds.get_item_history("007")
+        with self.assertRaises(KeyError):
+            ds.set_item_history("007", [1])
+        with self.assertRaises(KeyError):
+            ds.set_item_state("007", {"skip": 1})
+
+        self.assertFalse(ds.modified)
+
+
+if __name__ == "__main__":
+    unittest.main()